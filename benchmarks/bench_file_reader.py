@@ -0,0 +1,86 @@
+"""
+Compares the read throughput of grasplog.file_reader.read_lines and read_line_blocks with the original text mode
+reader, and of read_event_blocks_from_glob with a line filter (--include, --exclude) accepting a quarter of the lines.
+
+Usage: python benchmarks/bench_file_reader.py [--lines N]
+"""
+import gzip
+import os
+import random
+import shutil
+import tempfile
+from argparse import ArgumentParser
+from typing import Iterator, Callable
+
+from grasplog.file_reader import read_lines, read_line_blocks, read_event_blocks_from_glob
+from grasplog.line_filter import LineFilter
+from grasplog.util import Timer
+
+
+def legacy_read_lines(path: str) -> Iterator[str]:
+    # Reader used before the bulk reader, one text mode readline() call per line
+    open_function = gzip.open if path.endswith(".gz") else open
+    with open_function(path, "rt") as handle:  # type:ignore
+        while line := handle.readline():
+            yield line
+
+
+def write_log(path: str, line_count: int) -> None:
+    random_generator = random.Random(42)
+    open_function = gzip.open if path.endswith(".gz") else open
+    with open_function(path, "wt") as handle:  # type:ignore
+        for i in range(line_count):
+            user = random_generator.choice(["alice", "bob", "charlie", "dave"])
+            handle.write(f"2022-05-0{i % 9 + 1} 12:{i % 60:02}:00 INFO User '{user}' request {i} took "
+                         f"{random_generator.randint(1, 999)} ms\n")
+
+
+def count_lines(path: str) -> int:
+    return sum(1 for _ in read_lines(path))
+
+
+def count_lines_in_blocks(path: str) -> int:
+    return sum(len(x) for x in read_line_blocks(path))
+
+
+def count_filtered_lines(line_filter: LineFilter) -> Callable[[str], int]:
+    return lambda path: sum(len(x[2]) for x in read_event_blocks_from_glob(path, [], line_filter=line_filter))
+
+
+def count_legacy_lines(path: str) -> int:
+    return sum(1 for _ in legacy_read_lines(path))
+
+
+def measure(name: str, line_counter: Callable[[str], int], path: str) -> float:
+    timer = Timer()
+    line_count = line_counter(path)
+    duration_s = max(timer.elapsed_ms(), 1) / 1000
+    size_mb = os.path.getsize(path) / 1024 / 1024
+    print(f"{name:<8} {os.path.basename(path):<12} lines={line_count} duration={duration_s:.3f}s "
+          f"throughput={line_count / duration_s:,.0f} lines/s ({size_mb / duration_s:.1f} MB/s on disk)")
+    return duration_s
+
+
+def main():
+    parser = ArgumentParser(description="Read throughput benchmark of the file reader")
+    parser.add_argument("--lines", type=int, default=2_000_000, help="Number of generated lines")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        for name in ["plain.log", "rotated.gz"]:
+            path = os.path.join(tmp_dir, name)
+            write_log(path, args.lines)
+            legacy_duration = measure("legacy", count_legacy_lines, path)
+            current_duration = measure("lines", count_lines, path)
+            blocks_duration = measure("blocks", count_lines_in_blocks, path)
+            print(f"speedup  {name:<12} lines={legacy_duration / current_duration:.2f}x "
+                  f"blocks={legacy_duration / blocks_duration:.2f}x")
+            measure("include", count_filtered_lines(LineFilter(["'dave'"], [])), path)
+            measure("exclude", count_filtered_lines(LineFilter([], ["'alice'|'bob'", "User 'c"])), path)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
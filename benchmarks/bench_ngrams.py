@@ -0,0 +1,75 @@
+"""
+Compares the feature building of unigrams with n-grams (--ngrams) computed from token ids by
+grasplog.ml.vectorizer.TokenVectorizer, and with n-grams joined into strings by NgramTokenStreamEnricher for
+reference. Events are analyzed beforehand, only deduplication into unique rows and building of the feature matrix
+are timed. The exit code is 1 if n-grams cost more than --max-ratio times the unigrams.
+
+Usage: python benchmarks/bench_ngrams.py [--lines N] [--ngrams 2,3] [--max-ratio RATIO] [--repeat N]
+"""
+import os
+import shutil
+import sys
+import tempfile
+from argparse import ArgumentParser
+from typing import List, Callable
+
+from grasplog.file_reader import read_events_from_glob
+from grasplog.ml.clustering import UniqueRows
+from grasplog.ml.text_processing import COMPILED_DEFAULT_ANALYZER, NgramTokenStreamEnricher
+from grasplog.util import Timer
+from log_generator import LogSpec, write_log
+
+
+def build_features(tokens_list: List[List[str]], ngram_sizes: List[int]) -> None:
+    unique_rows = UniqueRows(ngram_sizes)
+    for tokens in tokens_list:
+        unique_rows.add(tokens)
+    unique_rows.vectorizer.to_csr()
+
+
+def build_joined_features(tokens_list: List[List[str]], ngram_sizes: List[int]) -> None:
+    enricher = NgramTokenStreamEnricher(ngram_sizes)
+    build_features([enricher.filter(x) for x in tokens_list], [])
+
+
+def best_ms(function: Callable[[], None], repeat: int) -> float:
+    durations = []
+    for _ in range(repeat):
+        timer = Timer()
+        function()
+        durations.append(timer.elapsed_ms())
+    return min(durations)
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark of n-gram features")
+    parser.add_argument("--lines", type=int, default=LogSpec.lines, help="Number of generated lines")
+    parser.add_argument("--ngrams", default="2", help="Comma separated n-gram sizes. Default value: 2")
+    parser.add_argument("--max-ratio", type=float, default=1.5,
+                        help="Maximal duration of n-grams relative to unigrams. Default value: 1.5")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of every case, the fastest one counts")
+    args = parser.parse_args()
+    ngram_sizes = [int(x) for x in args.ngrams.split(",")]
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp_dir, "bench.log")
+        write_log(path, LogSpec(lines=args.lines))
+        tokens_list = [COMPILED_DEFAULT_ANALYZER.analyze(x.strip()) for x in read_events_from_glob(path)]
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    unigram_ms = best_ms(lambda: build_features(tokens_list, []), args.repeat)
+    ngram_ms = best_ms(lambda: build_features(tokens_list, ngram_sizes), args.repeat)
+    joined_ms = best_ms(lambda: build_joined_features(tokens_list, ngram_sizes), args.repeat)
+    for name, duration_ms in [("unigrams", unigram_ms), ("ngrams", ngram_ms), ("joined-ngrams", joined_ms)]:
+        print(f"{name:<14} duration={duration_ms:8.0f}ms throughput={args.lines / duration_ms * 1000:12,.0f} lines/s "
+              f"ratio={duration_ms / unigram_ms:.2f}")
+    if ngram_ms > unigram_ms * args.max_ratio:
+        print(f"OVER BUDGET n-grams cost {ngram_ms / unigram_ms:.2f}x the unigrams, budget {args.max_ratio:.2f}x")
+        sys.exit(1)
+    print("N-grams within the budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Times every stage of the clustering pipeline on synthetic logs: reading, text analysis, vectorization, DBSCAN and
+output of the results. Throughput and peak RSS are recorded for each stage, every input size runs in a fresh
+process so that the peak RSS of one size does not hide the next one.
+
+Results can be saved as a baseline and later runs compared with it, stages whose throughput dropped by more than
+the threshold are reported as regressions and the exit code is 1.
+
+Usage: python benchmarks/bench_pipeline.py [--sizes 10k,100k] [--formats plain,gz] [--save FILE]
+       [--baseline FILE] [--threshold RATIO] [generator options]
+
+The DBSCAN stage grows with the number of candidate pairs of unique rows sharing a rare token, up to quadratically,
+runs with 1M and 10M lines may need a low --cardinality (e.g. --sizes 1M,10M --cardinality 5) to finish in
+reasonable time.
+"""
+import contextlib
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Callable, TypeVar
+
+from grasplog.datamodel import ClusteringAccumulator, LogEvent, OutputFormat
+from grasplog.file_reader import read_events_from_glob
+from grasplog.ml.clustering import UniqueRows, MIN_SAMPLES
+from grasplog.ml.neighbors import fit_dbscan
+from grasplog.ml.text_processing import COMPILED_DEFAULT_ANALYZER
+from grasplog.util import Timer
+from log_generator import LogSpec, write_log
+
+STAGES = ["read", "analyze", "vectorize", "dbscan", "output"]
+MAX_DISTANCE = 2.1
+SAMPLES = 5
+T = TypeVar("T")
+
+
+def parse_size(size: str) -> int:
+    multipliers = {"k": 10 ** 3, "M": 10 ** 6}
+    if size[-1] in multipliers:
+        return int(float(size[:-1]) * multipliers[size[-1]])
+    return int(size)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+
+def run_case(path: str, line_count: int) -> Dict[str, Dict[str, float]]:
+    """
+    Runs all stages on the file at path, returns duration, throughput and peak RSS of every stage.
+    """
+    results: Dict[str, Dict[str, float]] = {}
+
+    def measure(stage: str, function: Callable[[], T]) -> T:
+        timer = Timer()
+        result = function()
+        duration_s = max(timer.elapsed_ms(), 1) / 1000
+        results[stage] = {
+            "durationS": duration_s,
+            "linesPerS": line_count / duration_s,
+            "peakRssMb": peak_rss_mb(),
+        }
+        return result
+
+    events = measure("read", lambda: [x.strip() for x in read_events_from_glob(path)])
+    tokens_list = measure("analyze", lambda: [COMPILED_DEFAULT_ANALYZER.analyze(x) for x in events])
+
+    def vectorize():
+        unique_rows = UniqueRows()
+        event_rows = [unique_rows.add(x) for x in tokens_list]
+        return unique_rows, event_rows, unique_rows.vectorizer.to_csr()
+
+    unique_rows, event_rows, features = measure("vectorize", vectorize)
+    clustering = measure("dbscan", lambda: fit_dbscan(features, unique_rows.counts, MAX_DISTANCE, MIN_SAMPLES))
+
+    def output():
+        labels = clustering.labels_.tolist()
+        accumulator = ClusteringAccumulator(SAMPLES, SAMPLES)
+        for line_nr, (event, row_id) in enumerate(zip(events, event_rows), 1):
+            if labels[row_id] >= 0:
+                accumulator.report_event(labels[row_id], LogEvent(line_nr, event))
+            else:
+                accumulator.report_noisy_event(LogEvent(line_nr, event))
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            accumulator.output(OutputFormat.json_format)
+
+    measure("output", output)
+    return results
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], threshold: float) -> List[str]:
+    """
+    Returns descriptions of stages whose throughput is lower than in the baseline by more than the threshold ratio.
+    """
+    baseline_cases = {(x["lines"], x["format"]): x for x in baseline}
+    regressions = []
+    for case in results:
+        baseline_case = baseline_cases.get((case["lines"], case["format"]))
+        if baseline_case is None:
+            continue
+        for stage, stage_result in case["stages"].items():
+            baseline_throughput = baseline_case["stages"].get(stage, {}).get("linesPerS")
+            if baseline_throughput and stage_result["linesPerS"] < baseline_throughput * (1 - threshold):
+                regressions.append(f"{stage} lines={case['lines']} format={case['format']}: "
+                                   f"{stage_result['linesPerS']:,.0f} lines/s, baseline {baseline_throughput:,.0f}")
+    return regressions
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark of the pipeline stages on synthetic logs")
+    parser.add_argument("--sizes", default="10k,100k", help="Comma separated line counts, k and M suffixes allowed")
+    parser.add_argument("--formats", default="plain,gz", help="Comma separated formats: plain, gz")
+    parser.add_argument("--save", metavar="FILE", help="Save results as JSON, e.g. as a new baseline")
+    parser.add_argument("--baseline", metavar="FILE", help="Compare results with a previously saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Throughput drop ratio reported as a regression. Default value: 0.1")
+    defaults = LogSpec()
+    parser.add_argument("--templates", type=int, default=defaults.templates)
+    parser.add_argument("--cardinality", type=int, default=defaults.cardinality)
+    parser.add_argument("--line-length", type=int, default=defaults.line_length)
+    parser.add_argument("--noise-rate", type=float, default=defaults.noise_rate)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    args = parser.parse_args()
+
+    results = []
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        for size in args.sizes.split(","):
+            for log_format in args.formats.split(","):
+                spec = LogSpec(parse_size(size), args.templates, args.cardinality, args.line_length,
+                               args.noise_rate, args.seed)
+                path = os.path.join(tmp_dir, "bench.log" + (".gz" if log_format == "gz" else ""))
+                write_log(path, spec)
+                with ProcessPoolExecutor(max_workers=1) as executor:
+                    stages = executor.submit(run_case, path, spec.lines).result()
+                os.remove(path)
+                for stage in STAGES:
+                    print(f"{stage:<10} lines={spec.lines:<9} format={log_format:<6} "
+                          f"duration={stages[stage]['durationS']:.3f}s "
+                          f"throughput={stages[stage]['linesPerS']:,.0f} lines/s "
+                          f"peak_rss={stages[stage]['peakRssMb']:.0f}MB")
+                results.append({"lines": spec.lines, "format": log_format, "spec": spec.to_dict(), "stages": stages})
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    if args.save:
+        with open(args.save, "wt") as handle:
+            json.dump(results, handle, indent=2)
+    if args.baseline:
+        with open(args.baseline, "rt") as handle:
+            regressions = compare(results, json.load(handle), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
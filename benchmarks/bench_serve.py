@@ -0,0 +1,76 @@
+"""
+Measures the latency of small batches clustered by a running 'grasplog serve' (sent by grasplog-client) compared to
+a command line run per batch, which is what a log shipping hook would do otherwise. Both cases read the batch from
+the standard input and write the json output, the median of the repetitions is printed.
+
+Usage: python benchmarks/bench_serve.py [--lines N] [--repeat N] [--jobs N]
+"""
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from typing import List
+
+from log_generator import LogSpec, write_log
+
+# Same as the console script entry points of the package
+CLI_ENTRY_POINT = "import sys; from grasplog.cli import main; sys.argv[0] = 'grasplog'; main()"
+CLIENT_ENTRY_POINT = "import sys; from grasplog.client import main; sys.argv[0] = 'grasplog-client'; main()"
+
+
+def median_ms(command: List[str], batch: bytes, repeat: int) -> float:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, input=batch, stdout=subprocess.DEVNULL, check=True)
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations) * 1000
+
+
+def wait_for(path: str, timeout_s: float = 60) -> None:
+    deadline = time.monotonic() + timeout_s
+    while not os.path.exists(path):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"The server did not create {path}")
+        time.sleep(0.1)
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark of batches clustered by grasplog serve")
+    parser.add_argument("--lines", type=int, default=1000, help="Lines of a batch. Default value: 1000")
+    parser.add_argument("--repeat", type=int, default=10, help="Runs of every case. Default value: 10")
+    parser.add_argument("--jobs", type=int, default=2, help="Worker processes of the server. Default value: 2")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    server = None
+    try:
+        log_path = os.path.join(tmp_dir, "batch.log")
+        write_log(log_path, LogSpec(lines=args.lines))
+        with open(log_path, "rb") as handle:
+            batch = handle.read()
+        socket_path = os.path.join(tmp_dir, "grasplog.sock")
+        server = subprocess.Popen([sys.executable, "-c", CLI_ENTRY_POINT, "serve", "--socket", socket_path,
+                                   "--jobs", str(args.jobs)])
+        wait_for(socket_path)
+
+        cli_ms = median_ms([sys.executable, "-c", CLI_ENTRY_POINT, "--output-format", "json", "-"], batch,
+                           args.repeat)
+        client_ms = median_ms([sys.executable, "-c", CLIENT_ENTRY_POINT, "--socket", socket_path], batch,
+                              args.repeat)
+        print(f"{'command line':<13} {cli_ms:8.1f}ms")
+        print(f"{'client':<13} {client_ms:8.1f}ms")
+        print(f"Speedup: {cli_ms / client_ms:.1f}x")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
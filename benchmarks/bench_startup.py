@@ -0,0 +1,68 @@
+"""
+Measures the wall time of command line runs that exit before any clustering: --version, --help and invalid
+arguments. These are the most frequent runs from cron jobs and hooks, they must not import scikit-learn, scipy or
+nltk. Every case runs in a fresh interpreter, the median of the repetitions is compared with the time budget and
+the exit code is 1 if any case exceeds it or if importing grasplog.cli pulls in any of the heavy modules.
+
+Usage: python benchmarks/bench_startup.py [--repeat N] [--budget-ms MS]
+"""
+import statistics
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+from typing import List
+
+CASES = {
+    "version": ["--version"],
+    "help": ["--help"],
+    "invalid-argument": ["--max-distance", "-1", "/var/log/syslog"],
+    "merge-help": ["merge", "--help"],
+    "classify-help": ["classify", "--help"],
+}
+# Same as the console script entry point of the package
+ENTRY_POINT = "import sys; from grasplog.cli import main; sys.argv[0] = 'grasplog'; main()"
+HEAVY_MODULES = ["sklearn", "scipy", "numpy", "nltk"]
+
+
+def median_ms(command: List[str], repeat: int) -> float:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations) * 1000
+
+
+def imported_heavy_modules() -> List[str]:
+    probe = f"import sys, grasplog.cli; print(*[x for x in {HEAVY_MODULES} if x in sys.modules])"
+    return subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True).stdout.split()
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark of the command line startup")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs of every case. Default value: 20")
+    parser.add_argument("--budget-ms", type=float, default=100,
+                        help="Maximal median wall time of a case in milliseconds. Default value: 100")
+    args = parser.parse_args()
+
+    failures = []
+    heavy_modules = imported_heavy_modules()
+    if heavy_modules:
+        failures.append(f"importing grasplog.cli imports {', '.join(heavy_modules)}")
+    # The interpreter startup alone is part of every case, it is printed for reference
+    print(f"{'interpreter':<17} {median_ms([sys.executable, '-c', 'pass'], args.repeat):7.1f}ms")
+    for name, case_args in CASES.items():
+        duration_ms = median_ms([sys.executable, "-c", ENTRY_POINT, *case_args], args.repeat)
+        print(f"{name:<17} {duration_ms:7.1f}ms")
+        if duration_ms > args.budget_ms:
+            failures.append(f"{name}: {duration_ms:.1f}ms, budget {args.budget_ms:.0f}ms")
+    for failure in failures:
+        print(f"OVER BUDGET {failure}")
+    if failures:
+        sys.exit(1)
+    print("All cases within the budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Seeded generator of synthetic logs for benchmarks. The same parameters always produce the same file.
+
+Usage: python benchmarks/log_generator.py OUTPUT [--lines N] [--templates N] [--cardinality N] [--line-length N]
+       [--noise-rate RATE] [--seed N]
+"""
+import gzip
+import random
+import string
+from argparse import ArgumentParser
+from dataclasses import dataclass, asdict
+from typing import List, Dict, Any
+
+LEVELS = ["DEBUG", "INFO", "INFO", "INFO", "WARN", "ERROR"]
+
+
+@dataclass
+class LogSpec:
+    lines: int = 100_000
+    templates: int = 50  # Number of distinct event templates
+    cardinality: int = 100  # Number of distinct values of every variable field
+    line_length: int = 120  # Approximate length of a line in characters
+    noise_rate: float = 0.01  # Ratio of random lines not following any template
+    seed: int = 42
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _word(random_generator: random.Random, min_length: int = 3, max_length: int = 10) -> str:
+    length = random_generator.randint(min_length, max_length)
+    return "".join(random_generator.choice(string.ascii_lowercase) for _ in range(length))
+
+
+def _create_templates(spec: LogSpec, random_generator: random.Random) -> List[str]:
+    # Templates are lists of words with 1-3 variable fields ("{}"), padded with constant words to the line length
+    templates = []
+    for _ in range(spec.templates):
+        words = [_word(random_generator) for _ in range(random_generator.randint(3, 8))]
+        for _ in range(random_generator.randint(1, 3)):
+            words.insert(random_generator.randint(1, len(words)), "{}")
+        while sum(len(x) + 1 for x in words) + 30 < spec.line_length:
+            words.append(_word(random_generator))
+        templates.append(" ".join(words))
+    return templates
+
+
+def _create_values(spec: LogSpec, random_generator: random.Random) -> List[str]:
+    values = []
+    for i in range(spec.cardinality):
+        kind = i % 3
+        if kind == 0:
+            values.append(_word(random_generator, 4, 8))
+        elif kind == 1:
+            values.append(str(random_generator.randint(0, 10 ** 6)))
+        else:
+            values.append(f"{random_generator.randint(0, 255)}.{random_generator.randint(0, 255)}.0.1")
+    return values
+
+
+def write_log(path: str, spec: LogSpec) -> None:
+    """
+    Writes a log following the spec, gzip compressed if the path ends with .gz.
+    """
+    random_generator = random.Random(spec.seed)
+    templates = _create_templates(spec, random_generator)
+    values = _create_values(spec, random_generator)
+    open_function = gzip.open if path.endswith(".gz") else open
+    with open_function(path, "wt") as handle:  # type:ignore
+        for i in range(spec.lines):
+            timestamp = f"2022-05-{i % 28 + 1:02} {i // 3600 % 24:02}:{i // 60 % 60:02}:{i % 60:02}"
+            level = random_generator.choice(LEVELS)
+            if random_generator.random() < spec.noise_rate:
+                words = [_word(random_generator) for _ in range(max(1, spec.line_length // 8))]
+                message = " ".join(words)
+            else:
+                template = random_generator.choice(templates)
+                message = template.format(*(random_generator.choice(values) for _ in range(template.count("{}"))))
+            handle.write(f"{timestamp} {level} {message}\n")
+
+
+def main():
+    parser = ArgumentParser(description="Generate a synthetic log file")
+    parser.add_argument("output", help="Output path, gzip compressed if it ends with .gz")
+    defaults = LogSpec()
+    parser.add_argument("--lines", type=int, default=defaults.lines)
+    parser.add_argument("--templates", type=int, default=defaults.templates)
+    parser.add_argument("--cardinality", type=int, default=defaults.cardinality)
+    parser.add_argument("--line-length", type=int, default=defaults.line_length)
+    parser.add_argument("--noise-rate", type=float, default=defaults.noise_rate)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    args = parser.parse_args()
+    write_log(args.output, LogSpec(args.lines, args.templates, args.cardinality, args.line_length, args.noise_rate,
+                                   args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,3 @@
-from importlib.metadata import version
-
-__version__ = version(__name__)
+# Kept in sync with pyproject.toml, looking the version up in the package metadata takes longer than the rest of the
+# command line startup
+__version__ = "1.0a1"
@@ -1,37 +1,57 @@
-import logging
+import os
+import re
 import sys
-from argparse import ArgumentParser
-from typing import List
-
-import grasplog.ml.clustering
-from grasplog import __version__
-from grasplog.datamodel import AppContext
-from grasplog.datamodel import OutputFormat
-from grasplog.exception import GraspLogException, InvalidCmdLineArgException
+from argparse import ArgumentParser, Action, SUPPRESS
+from typing import List, Optional, TYPE_CHECKING
+
+import grasplog
+from grasplog.engines import load_engine
+from grasplog.exception import GraspLogException, InvalidCmdLineArgException, GraspLogIOException
+from grasplog.options import OutputFormat, Engine, Partitioning, DEFAULT_MAX_DISTANCE, DEFAULT_PARTITION_BAND_WIDTH
+from grasplog.options import DEFAULT_CACHE_SIZE_MB, DEFAULT_DECODE_ERRORS, DECODE_ERRORS, AUTO_FORMAT, PROFILED_STAGES
+from grasplog.ml.masking import MASKED_FIELD_PATTERNS
 from grasplog.ui_helper import print_err
-from grasplog.file_reader import read_events_from_glob
 
+# Modules depending on scikit-learn, scipy or nltk are imported only by the functions using them, so that runs exiting
+# early (--help, --version, invalid arguments) don't wait for them. The same goes for the data model and file reading
+# modules, the argument parsers only need grasplog.options.
+if TYPE_CHECKING:
+    from grasplog.datamodel import AppContext, ClusteringAccumulator, MergeContext, ClassifyContext, ServeContext
+    from grasplog.feature_cache import FeatureCache
+    from grasplog.file_reader import InputFile
+    from grasplog.line_filter import LineFilter
+    from grasplog.ml.text_processing import EventAnalyzer
+    from grasplog.timestamps import TimeWindow
 
-def create_app_config(args: List[str]) -> AppContext:
-    parser = ArgumentParser(
-        description="Read log file(s) and organize similar log events into clusters for easier review."
-    )
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+MERGE_COMMAND = "merge"
+CLASSIFY_COMMAND = "classify"
+SERVE_COMMAND = "serve"
 
-    parser.add_argument(
-        "path_glob",
-        metavar="PATH",
-        help="Logs path, can be a file, directory or glob pattern. "
-             "Examples: 'syslog', './syslog.4.gz', '/var/log', '/var/log/syslog*', '/var/log/**/*'",
-    )
 
-    parser.add_argument(
-        "--max-distance",
-        metavar="MAX_DISTANCE",
-        type=float,
-        help=f"Max Manhattan distance between two log events to be considered as the same cluster. "
-             f"Default value: {AppContext.DEFAULT_MAX_DISTANCE}",
-        default=AppContext.DEFAULT_MAX_DISTANCE,
-    )
+class _VersionAction(Action):
+    """
+    Same as the "version" action of argparse, but the version is looked up only if the option is used.
+    """
+
+    def __init__(self, option_strings: List[str], dest: str = SUPPRESS, default: str = SUPPRESS):
+        super().__init__(option_strings, dest, nargs=0, default=default, help="show program's version number and exit")
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        print(grasplog.__version__)
+        parser.exit()
+
+
+def _add_output_arguments(parser: ArgumentParser, clustering: bool = True, output_files: bool = True) -> None:
+    if clustering:
+        parser.add_argument(
+            "--max-distance",
+            metavar="MAX_DISTANCE",
+            type=float,
+            help=f"Max Manhattan distance between two log events to be considered as the same cluster. "
+                 f"Default value: {DEFAULT_MAX_DISTANCE}",
+            default=DEFAULT_MAX_DISTANCE,
+        )
 
     parser.add_argument(
         "--max-samples-per-cluster",
@@ -48,12 +68,246 @@ def create_app_config(args: List[str]) -> AppContext:
         help="Number of noisy samples to be displayed. Defaults to MAX_SAMPLES_PER_CLUSTER",
     )
 
+    if not output_files:
+        return
+
     parser.add_argument(
         "--output-format",
         default=OutputFormat.pretty_format,
         type=OutputFormat,
         choices=list(OutputFormat),
-        help="Human readable output by default",
+        help="Human readable output by default. 'ndjson' writes one cluster per line",
+    )
+
+    parser.add_argument(
+        "--output",
+        metavar="OUTPUT_FILE",
+        help="Write the results to OUTPUT_FILE instead of the standard output",
+    )
+
+    if clustering:
+        parser.add_argument(
+            "--emit-summary",
+            metavar="SUMMARY_FILE",
+            help="Also write a summary of the clusters (prototypes, event counts and samples) to SUMMARY_FILE, "
+                 "gzip compressed if it ends with .gz. Only the most frequent distinct noisy events are kept, the "
+                 "others are just counted. "
+                 "Summaries of several runs can be combined with 'grasplog merge'",
+        )
+
+
+def _add_reading_arguments(parser: ArgumentParser) -> None:
+    parser.add_argument(
+        "--analysis-cache-size",
+        metavar="ANALYSIS_CACHE_SIZE",
+        type=int,
+        help="Number of distinct event shapes (events differing only in numbers) whose tokens are cached. "
+             "Disabled by default",
+        default=0,
+    )
+
+    parser.add_argument(
+        "--decode-errors",
+        default=DEFAULT_DECODE_ERRORS,
+        choices=DECODE_ERRORS,
+        help=f"How to handle bytes that are not valid in the system encoding. "
+             f"'strict' stops reading with an error. Default value: {DEFAULT_DECODE_ERRORS}",
+    )
+
+    parser.add_argument(
+        "--include",
+        metavar="INCLUDE",
+        action="append",
+        default=[],
+        help="Only read lines matching the regular expression INCLUDE anywhere in the line, can be used multiple "
+             "times. Lines are matched before they are decoded, plain text alternatives (e.g. 'ERROR|WARN') are "
+             "found by a fast substring search",
+    )
+
+    parser.add_argument(
+        "--exclude",
+        metavar="EXCLUDE",
+        action="append",
+        default=[],
+        help="Skip lines matching the regular expression EXCLUDE, can be used multiple times. Skipped lines are "
+             "counted in the summary",
+    )
+
+
+def _validate_output_arguments(
+        max_samples_per_cluster: int,
+        max_noisy_samples: int,
+        max_distance: Optional[float] = None,
+) -> None:
+    if max_distance is not None and max_distance <= 0:
+        raise InvalidCmdLineArgException(f"MAX_DISTANCE argument must be greater than 0, "
+                                         f"floating point numbers are allowed "
+                                         f"(e.g. '{DEFAULT_MAX_DISTANCE}')")
+    if max_samples_per_cluster < 1:
+        raise InvalidCmdLineArgException("MAX_SAMPLES_PER_CLUSTER argument must be an integer greater than 1")
+    if max_noisy_samples < 1:
+        raise InvalidCmdLineArgException("MAX_NOISY_SAMPLES argument must be an integer greater than 1")
+
+
+def create_app_config(args: List[str]) -> "AppContext":
+    parser = ArgumentParser(
+        description="Read log file(s) and organize similar log events into clusters for easier review.",
+        epilog=f"Run 'grasplog {MERGE_COMMAND} SUMMARY_FILE...' to combine summaries written by --emit-summary, "
+               f"'grasplog {CLASSIFY_COMMAND} MODEL_FILE PATH' to label events with clusters saved by --save-model, "
+               f"'grasplog {SERVE_COMMAND} --socket SOCKET' to cluster batches sent by grasplog-client",
+    )
+
+    parser.add_argument(
+        "path_glob",
+        metavar="PATH",
+        help="Logs path, can be a file, directory or glob pattern, '-' reads the standard input. "
+             "Plain, .gz, .bz2 and .xz files are supported. "
+             "Examples: 'syslog', './syslog.4.gz', '/var/log', '/var/log/syslog*', '/var/log/**/*'",
+    )
+
+    _add_output_arguments(parser)
+
+    parser.add_argument(
+        "--engine",
+        default=Engine.dbscan,
+        type=Engine,
+        choices=list(Engine),
+        help="Clustering engine. 'dbscan' (default) clusters all events at once, "
+             "'stream' assigns events to templates in a single pass with memory bounded by the number of templates. "
+             "Events of different token counts never share a template of the 'stream' engine",
+    )
+
+    parser.add_argument(
+        "--jobs",
+        metavar="JOBS",
+        type=int,
+        help="Number of processes reading and analyzing the matched files, and clustering partitions, in parallel. "
+             "Default value: 1",
+        default=1,
+    )
+
+    parser.add_argument(
+        "--sample",
+        metavar="SAMPLE_SIZE",
+        type=int,
+        help="Cluster only a random sample of SAMPLE_SIZE events and assign all other events to the nearest cluster "
+             "within MAX_DISTANCE, so that the clustering time stays roughly linear for very large inputs. "
+             "Only with the dbscan engine. Disabled by default",
+        default=0,
+    )
+
+    parser.add_argument(
+        "--partition",
+        type=Partitioning,
+        choices=list(Partitioning),
+        help="Cluster buckets of similar events separately (and in parallel with JOBS > 1). 'exact' splits events "
+             "only where their token counts are further apart than MAX_DISTANCE and gives the same clusters. "
+             "'token-count' uses token count bands of PARTITION_BAND_WIDTH, 'leading-token' also splits the bands "
+             "by the first token, events from different buckets never end up in the same cluster. Disabled by default",
+    )
+
+    parser.add_argument(
+        "--partition-band-width",
+        metavar="PARTITION_BAND_WIDTH",
+        type=int,
+        help=f"Width of the token count bands of the 'token-count' and 'leading-token' partitioning. "
+             f"Default value: {DEFAULT_PARTITION_BAND_WIDTH}",
+        default=DEFAULT_PARTITION_BAND_WIDTH,
+    )
+
+    parser.add_argument(
+        "--mask",
+        metavar="FIELDS",
+        help=f"Comma separated classes of variable fields replaced by a placeholder before the analysis, so that "
+             f"events differing only in them are considered the same. 'all' masks all of them. "
+             f"Supported classes: {', '.join(MASKED_FIELD_PATTERNS)}. Disabled by default",
+    )
+
+    parser.add_argument(
+        "--ngrams",
+        metavar="SIZES",
+        help="Comma separated sizes of n-grams of adjacent tokens added as features, e.g. 2,3. Word n-grams make "
+             "events with the same tokens in a different order distant. A single different token also adds 2 * N "
+             "to the distance for every size N, so MAX_DISTANCE has to be raised accordingly. Only unigrams are "
+             "used by default",
+    )
+
+    _add_reading_arguments(parser)
+
+    parser.add_argument(
+        "--cache-dir",
+        metavar="CACHE_DIR",
+        help="Keep the analyzed events of files not modified for an hour (e.g. rotated archives) in CACHE_DIR, so "
+             "that later runs don't have to read and analyze them again. Entries are keyed on the file content and "
+             "the analyzer configuration. Not used with a time window or INCLUDE and EXCLUDE patterns",
+    )
+
+    parser.add_argument(
+        "--cache-size",
+        metavar="CACHE_SIZE_MB",
+        type=int,
+        default=DEFAULT_CACHE_SIZE_MB,
+        help=f"Size limit of CACHE_DIR in megabytes, the least recently used entries are removed above it. "
+             f"Default value: {DEFAULT_CACHE_SIZE_MB}",
+    )
+
+    parser.add_argument(
+        "--since",
+        metavar="SINCE",
+        help="Only cluster events at or after SINCE, an ISO 8601 time (e.g. 2022-05-01T12:00:00, local time if no "
+             "time zone is given) or seconds since the epoch. Files are assumed to be ordered by time, files "
+             "entirely outside of the time window are skipped and plain files are searched for its start",
+    )
+
+    parser.add_argument(
+        "--until",
+        metavar="UNTIL",
+        help="Only cluster events at or before UNTIL, in the same format as SINCE. Files are read only up to it",
+    )
+
+    parser.add_argument(
+        "--timestamp-format",
+        default=AUTO_FORMAT,
+        help="Format of the timestamps at the beginning of the lines used by --since and --until, the name of a "
+             "registered format (e.g. 'iso8601', 'syslog' or 'epoch'). By default it is detected for every file. "
+             "Lines without a timestamp belong to the previous line",
+    )
+
+    parser.add_argument(
+        "--save-model",
+        metavar="MODEL_FILE",
+        help=f"Save the analyzer configuration and core samples of the detected clusters to MODEL_FILE, so that new "
+             f"events can be labeled by 'grasplog {CLASSIFY_COMMAND}' without clustering them again. Can't be used "
+             f"with STATE_FILE",
+    )
+
+    parser.add_argument(
+        "--labels-out",
+        metavar="LABELS_DIR",
+        help="Write the cluster id of every event (-1 if noisy) together with its file id and line number as "
+             "columns in the NumPy .npy format to LABELS_DIR, to be memory mapped by other tools. "
+             "Created if it does not exist",
+    )
+
+    parser.add_argument(
+        "--state-file",
+        metavar="STATE_FILE",
+        help="Incremental mode: only events appended since the previous run with the same STATE_FILE are read and "
+             "merged into the clusters found so far. Created if it does not exist, and updated only if the output "
+             "was written. Only the most frequent distinct noisy events are kept, without samples",
+    )
+
+    parser.add_argument(
+        "--profile",
+        metavar="PROFILE_FILE",
+        help="Write a JSON report with the duration of every stage, throughput of every file, peak memory and the "
+             "size of the clustering problem to PROFILE_FILE",
+    )
+
+    parser.add_argument(
+        "--profile-stage",
+        choices=PROFILED_STAGES,
+        help="Also write cProfile stats of the given stage to PROFILE_FILE.pstats",
     )
 
     parser.add_argument(
@@ -62,7 +316,7 @@ def create_app_config(args: List[str]) -> AppContext:
         help="Print verbose debug messages to stderr"
     )
 
-    parser.add_argument("--version", action="version", version=__version__)
+    parser.add_argument("--version", action=_VersionAction)
 
     parsed_args = parser.parse_args(args)
     path_glob: str = parsed_args.path_glob
@@ -70,16 +324,99 @@ def create_app_config(args: List[str]) -> AppContext:
     max_samples_per_cluster: int = parsed_args.max_samples_per_cluster
     max_noisy_samples: int = parsed_args.max_noisy_samples or max_samples_per_cluster
     output_format: OutputFormat = parsed_args.output_format
+    engine: Engine = parsed_args.engine
+    jobs: int = parsed_args.jobs
+    sample_size: int = parsed_args.sample
+    partitioning: Optional[Partitioning] = parsed_args.partition
+    partition_band_width: int = parsed_args.partition_band_width
+    analysis_cache_size: int = parsed_args.analysis_cache_size
+    masked_fields: List[str] = []
+    if parsed_args.mask == "all":
+        masked_fields = list(MASKED_FIELD_PATTERNS)
+    elif parsed_args.mask:
+        masked_fields = [x.strip() for x in parsed_args.mask.split(",")]
+    ngram_sizes: List[int] = []
+    if parsed_args.ngrams:
+        try:
+            ngram_sizes = [int(x) for x in parsed_args.ngrams.split(",")]
+        except ValueError:
+            raise InvalidCmdLineArgException("SIZES argument must be comma separated integers greater than 1")
+    state_file: Optional[str] = parsed_args.state_file
+    decode_errors: str = parsed_args.decode_errors
+    output_file: Optional[str] = parsed_args.output
+    summary_file: Optional[str] = parsed_args.emit_summary
+    model_file: Optional[str] = parsed_args.save_model
+    labels_dir: Optional[str] = parsed_args.labels_out
+    cache_dir: Optional[str] = parsed_args.cache_dir
+    cache_size_mb: int = parsed_args.cache_size
+    timestamp_format: str = parsed_args.timestamp_format
+    line_filter = _create_line_filter(parsed_args.include, parsed_args.exclude)
+    profile_file: Optional[str] = parsed_args.profile
+    profile_stage: Optional[str] = parsed_args.profile_stage
     debug_mode: bool = parsed_args.debug
 
-    if max_distance <= 0:
-        raise InvalidCmdLineArgException(f"MAX_DISTANCE argument must be greater than 0, "
-                                         f"floating point numbers are allowed "
-                                         f"(e.g. '{AppContext.DEFAULT_MAX_DISTANCE}')")
-    if max_samples_per_cluster < 1:
-        raise InvalidCmdLineArgException("MAX_SAMPLES_PER_CLUSTER argument must be an integer greater than 1")
-    if max_noisy_samples < 1:
-        raise InvalidCmdLineArgException("MAX_NOISY_SAMPLES argument must be an integer greater than 1")
+    _validate_output_arguments(max_samples_per_cluster, max_noisy_samples, max_distance)
+
+    # Imported only once the output arguments are valid, so that the most common mistakes are reported quickly
+    from grasplog.datamodel import AppContext
+    from grasplog.timestamps import TimeWindow, TIMESTAMP_PARSERS
+
+    time_window: Optional["TimeWindow"] = None
+    if parsed_args.since is not None or parsed_args.until is not None:
+        time_window = TimeWindow(
+            since=_parse_time(parsed_args.since, "SINCE"),
+            until=_parse_time(parsed_args.until, "UNTIL"),
+            timestamp_format=timestamp_format,
+        )
+    if jobs < 1:
+        raise InvalidCmdLineArgException("JOBS argument must be an integer greater than 0")
+    if sample_size < 0:
+        raise InvalidCmdLineArgException("SAMPLE_SIZE argument must be a non-negative integer")
+    if sample_size > 0 and engine != Engine.dbscan:
+        raise InvalidCmdLineArgException("SAMPLE_SIZE argument can only be used with the dbscan engine")
+    if partitioning is not None and engine != Engine.dbscan:
+        raise InvalidCmdLineArgException("PARTITION argument can only be used with the dbscan engine")
+    if partition_band_width < 1:
+        raise InvalidCmdLineArgException("PARTITION_BAND_WIDTH argument must be an integer greater than 0")
+    if timestamp_format != AUTO_FORMAT and timestamp_format not in TIMESTAMP_PARSERS:
+        raise InvalidCmdLineArgException(f"TIMESTAMP_FORMAT argument must be one of: "
+                                         f"{', '.join([AUTO_FORMAT, *TIMESTAMP_PARSERS])}")
+    if profile_stage is not None and profile_file is None:
+        raise InvalidCmdLineArgException("PROFILE_STAGE argument can only be used together with PROFILE_FILE")
+    unknown_fields = [x for x in masked_fields if x not in MASKED_FIELD_PATTERNS]
+    if unknown_fields:
+        raise InvalidCmdLineArgException(f"FIELDS argument contains unknown classes: {', '.join(unknown_fields)}")
+    if any(x < 2 for x in ngram_sizes):
+        raise InvalidCmdLineArgException("SIZES argument must be comma separated integers greater than 1")
+    if ngram_sizes and engine != Engine.dbscan:
+        raise InvalidCmdLineArgException("SIZES argument can only be used with the dbscan engine")
+    if ngram_sizes and (state_file is not None or summary_file is not None or model_file is not None):
+        # Prototypes keep only distinct tokens, n-grams of the original events can't be recovered from them
+        raise InvalidCmdLineArgException("SIZES argument can't be used together with STATE_FILE, SUMMARY_FILE "
+                                         "or MODEL_FILE")
+    if analysis_cache_size < 0:
+        raise InvalidCmdLineArgException("ANALYSIS_CACHE_SIZE argument must be a non-negative integer")
+    if summary_file is not None and engine != Engine.dbscan:
+        raise InvalidCmdLineArgException("SUMMARY_FILE argument can only be used with the dbscan engine")
+    if model_file is not None and engine != Engine.dbscan:
+        raise InvalidCmdLineArgException("MODEL_FILE argument can only be used with the dbscan engine")
+    if labels_dir is not None and engine != Engine.dbscan:
+        raise InvalidCmdLineArgException("LABELS_DIR argument can only be used with the dbscan engine")
+    if state_file is not None and (jobs > 1 or engine != Engine.dbscan):
+        raise InvalidCmdLineArgException("STATE_FILE argument can only be used with the dbscan engine and one job")
+    if time_window is not None and time_window.since is not None and time_window.until is not None and \
+            time_window.since > time_window.until:
+        raise InvalidCmdLineArgException("SINCE argument must not be later than UNTIL")
+    if time_window is not None and state_file is not None:
+        raise InvalidCmdLineArgException("SINCE and UNTIL arguments can't be used together with STATE_FILE")
+    if cache_size_mb < 1:
+        raise InvalidCmdLineArgException("CACHE_SIZE_MB argument must be an integer greater than 0")
+    if cache_dir is not None and state_file is not None:
+        # Incremental runs only read what was appended to the files
+        raise InvalidCmdLineArgException("CACHE_DIR argument can't be used together with STATE_FILE")
+    if model_file is not None and state_file is not None:
+        # Clusters of previous runs are represented only by their prototypes, their core samples are not kept
+        raise InvalidCmdLineArgException("MODEL_FILE argument can't be used together with STATE_FILE")
 
     return AppContext(
         path_glob=path_glob,
@@ -87,11 +424,202 @@ def create_app_config(args: List[str]) -> AppContext:
         max_samples_per_cluster=max_samples_per_cluster,
         max_noisy_samples=max_noisy_samples,
         output_format=output_format,
+        engine=engine,
+        jobs=jobs,
+        sample_size=sample_size,
+        partitioning=partitioning,
+        partition_band_width=partition_band_width,
+        analysis_cache_size=analysis_cache_size,
+        masked_fields=masked_fields,
+        ngram_sizes=ngram_sizes,
+        state_file=state_file,
+        decode_errors=decode_errors,
+        output_file=output_file,
+        summary_file=summary_file,
+        model_file=model_file,
+        labels_dir=labels_dir,
+        cache_dir=cache_dir,
+        cache_size_mb=cache_size_mb,
+        time_window=time_window,
+        line_filter=line_filter,
+        profile_file=profile_file,
+        profile_stage=profile_stage,
         debug_mode=debug_mode,
     )
 
 
+def _create_line_filter(includes: List[str], excludes: List[str]) -> Optional["LineFilter"]:
+    from grasplog.line_filter import LineFilter
+
+    if not includes and not excludes:
+        return None
+    for name, patterns in [("INCLUDE", includes), ("EXCLUDE", excludes)]:
+        for pattern in patterns:
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                raise InvalidCmdLineArgException(f"{name} argument must be a valid regular expression: {e}")
+    return LineFilter(includes, excludes)
+
+
+def _parse_time(value: Optional[str], name: str) -> Optional[float]:
+    from grasplog.timestamps import parse_time_argument
+
+    if value is None:
+        return None
+    result = parse_time_argument(value)
+    if result is None:
+        raise InvalidCmdLineArgException(f"{name} argument must be an ISO 8601 time or seconds since the epoch")
+    return result
+
+
+def create_merge_config(args: List[str]) -> "MergeContext":
+    parser = ArgumentParser(
+        prog=f"grasplog {MERGE_COMMAND}",
+        description="Combine summaries of several runs (e.g. on different hosts) written by --emit-summary, "
+                    "by clustering their prototypes again and summing up the event counts.",
+    )
+    parser.add_argument("summary_paths", metavar="SUMMARY_FILE", nargs="+", help="Summary files to be merged")
+    _add_output_arguments(parser)
+    parser.add_argument(
+        "--debug",
+        action="store_true",
+        help="Print verbose debug messages to stderr"
+    )
+
+    parsed_args = parser.parse_args(args)
+    from grasplog.datamodel import MergeContext
+
+    max_samples_per_cluster: int = parsed_args.max_samples_per_cluster
+    max_noisy_samples: int = parsed_args.max_noisy_samples or max_samples_per_cluster
+    _validate_output_arguments(max_samples_per_cluster, max_noisy_samples, parsed_args.max_distance)
+    return MergeContext(
+        summary_paths=parsed_args.summary_paths,
+        max_distance=parsed_args.max_distance,
+        max_samples_per_cluster=max_samples_per_cluster,
+        max_noisy_samples=max_noisy_samples,
+        output_format=parsed_args.output_format,
+        output_file=parsed_args.output,
+        summary_file=parsed_args.emit_summary,
+        debug_mode=parsed_args.debug,
+    )
+
+
+def create_classify_config(args: List[str]) -> "ClassifyContext":
+    parser = ArgumentParser(
+        prog=f"grasplog {CLASSIFY_COMMAND}",
+        description="Label log events with the cluster of the nearest core sample of a model saved by --save-model, "
+                    "events further than MAX_DISTANCE of the model from all core samples are reported as noisy.",
+    )
+    parser.add_argument("model_file", metavar="MODEL_FILE", help="Model saved by --save-model")
+    parser.add_argument(
+        "path_glob",
+        metavar="PATH",
+        help="Logs path, can be a file, directory or glob pattern, '-' reads the standard input",
+    )
+    _add_output_arguments(parser, clustering=False)
+    _add_reading_arguments(parser)
+    parser.add_argument(
+        "--debug",
+        action="store_true",
+        help="Print verbose debug messages to stderr"
+    )
+
+    parsed_args = parser.parse_args(args)
+    from grasplog.datamodel import ClassifyContext
+
+    max_samples_per_cluster: int = parsed_args.max_samples_per_cluster
+    max_noisy_samples: int = parsed_args.max_noisy_samples or max_samples_per_cluster
+    analysis_cache_size: int = parsed_args.analysis_cache_size
+    _validate_output_arguments(max_samples_per_cluster, max_noisy_samples)
+    if analysis_cache_size < 0:
+        raise InvalidCmdLineArgException("ANALYSIS_CACHE_SIZE argument must be a non-negative integer")
+    return ClassifyContext(
+        model_file=parsed_args.model_file,
+        path_glob=parsed_args.path_glob,
+        max_samples_per_cluster=max_samples_per_cluster,
+        max_noisy_samples=max_noisy_samples,
+        output_format=parsed_args.output_format,
+        output_file=parsed_args.output,
+        analysis_cache_size=analysis_cache_size,
+        decode_errors=parsed_args.decode_errors,
+        line_filter=_create_line_filter(parsed_args.include, parsed_args.exclude),
+        debug_mode=parsed_args.debug,
+    )
+
+
+def create_serve_config(args: List[str]) -> "ServeContext":
+    parser = ArgumentParser(
+        prog=f"grasplog {SERVE_COMMAND}",
+        description="Keep running and cluster batches of log events sent to SOCKET by grasplog-client, with the "
+                    "analyzer and the clustering loaded once. The JSON output of every batch is sent back.",
+    )
+    parser.add_argument("--socket", metavar="SOCKET", required=True, help="Path of the Unix domain socket to listen on")
+    parser.add_argument(
+        "--jobs",
+        metavar="JOBS",
+        type=int,
+        help="Number of worker processes, each of them processes one batch at a time. Default value: 1",
+        default=1,
+    )
+    parser.add_argument(
+        "--model",
+        metavar="MODEL_FILE",
+        help="Label events with the clusters of a model saved by --save-model instead of clustering every batch",
+    )
+    _add_output_arguments(parser, output_files=False)
+    _add_reading_arguments(parser)
+    parser.add_argument(
+        "--debug",
+        action="store_true",
+        help="Print verbose debug messages to stderr"
+    )
+
+    parsed_args = parser.parse_args(args)
+    from grasplog.datamodel import ServeContext
+
+    jobs: int = parsed_args.jobs
+    max_samples_per_cluster: int = parsed_args.max_samples_per_cluster
+    max_noisy_samples: int = parsed_args.max_noisy_samples or max_samples_per_cluster
+    analysis_cache_size: int = parsed_args.analysis_cache_size
+    _validate_output_arguments(max_samples_per_cluster, max_noisy_samples, parsed_args.max_distance)
+    if jobs < 1:
+        raise InvalidCmdLineArgException("JOBS argument must be an integer greater than 0")
+    if analysis_cache_size < 0:
+        raise InvalidCmdLineArgException("ANALYSIS_CACHE_SIZE argument must be a non-negative integer")
+    return ServeContext(
+        socket_path=parsed_args.socket,
+        jobs=jobs,
+        model_file=parsed_args.model,
+        max_distance=parsed_args.max_distance,
+        max_samples_per_cluster=max_samples_per_cluster,
+        max_noisy_samples=max_noisy_samples,
+        analysis_cache_size=analysis_cache_size,
+        decode_errors=parsed_args.decode_errors,
+        line_filter=_create_line_filter(parsed_args.include, parsed_args.exclude),
+        debug_mode=parsed_args.debug,
+    )
+
+
+def create_analyzer(app_config: "AppContext") -> "EventAnalyzer":
+    return build_analyzer(app_config.masked_fields, app_config.analysis_cache_size)
+
+
+def build_analyzer(masked_fields: List[str], analysis_cache_size: int) -> "EventAnalyzer":
+    from grasplog.ml.text_processing import CachingAnalyzer, CompiledAnalyzer, COMPILED_DEFAULT_ANALYZER, \
+        create_default_analyzer
+
+    analyzer = COMPILED_DEFAULT_ANALYZER
+    if masked_fields:
+        analyzer = create_default_analyzer(masked_fields).compile()
+    if analysis_cache_size > 0 and isinstance(analyzer, CompiledAnalyzer):
+        analyzer = CachingAnalyzer(analyzer, analysis_cache_size)
+    return analyzer
+
+
 def setup_loging(debug_mode: bool):
+    import logging
+
     log_level = logging.DEBUG if debug_mode else logging.INFO
     # All logs are going to stderr not to conflict with normal program output
     logging.basicConfig(stream=sys.stderr, level=log_level)
@@ -99,16 +627,182 @@ def setup_loging(debug_mode: bool):
 
 def main():
     try:
-        app_config = create_app_config(sys.argv[1:])
-        setup_loging(app_config.debug_mode)
-        event_iterator = read_events_from_glob(app_config.path_glob)
-        accumulator = grasplog.ml.clustering.process(
-            event_iterator=event_iterator,
+        if sys.argv[1:2] == [MERGE_COMMAND]:
+            merge(create_merge_config(sys.argv[2:]))
+        elif sys.argv[1:2] == [CLASSIFY_COMMAND]:
+            classify(create_classify_config(sys.argv[2:]))
+        elif sys.argv[1:2] == [SERVE_COMMAND]:
+            serve(create_serve_config(sys.argv[2:]))
+        else:
+            run(create_app_config(sys.argv[1:]))
+    except GraspLogException as e:
+        print_err(str(e))
+        sys.exit(1)
+
+
+def run(app_config: "AppContext") -> None:
+    from grasplog import profiling
+    from grasplog.ml.text_processing import CachingAnalyzer
+    from grasplog.model import save_model, create_model
+    from grasplog.state import process_incrementally, save_state
+    from grasplog.summary import save_summary, summarize
+
+    setup_loging(app_config.debug_mode)
+    analyzer = create_analyzer(app_config)
+    if app_config.profile_file is not None:
+        profiling.start(app_config.profile_stage)
+    state = None
+    if app_config.state_file is not None:
+        accumulator, state = process_incrementally(app_config, analyzer)
+    else:
+        accumulator = process(app_config, analyzer)
+    if isinstance(analyzer, CachingAnalyzer) and app_config.jobs == 1:
+        analyzer.log_statistics()
+    with profiling.stage("output"):
+        write_output(accumulator, app_config.output_format, app_config.output_file)
+        if app_config.summary_file is not None:
+            save_summary(app_config.summary_file, summarize(accumulator, app_config.max_distance))
+        if app_config.model_file is not None:
+            save_model(app_config.model_file, create_model(
+                accumulator, app_config.max_distance, app_config.masked_fields
+            ))
+    if app_config.state_file is not None and state is not None:
+        # Saved only once the output was written, so that the events of a failed run are read again by the next one
+        save_state(app_config.state_file, state)
+    if app_config.profile_file is not None:
+        profiling.record("events", accumulator.total_event_count())
+        profiling.record("clusters", len(accumulator.clusters))
+        profiling.record("noisyEvents", accumulator.noisy_events.total_event_count)
+        profiling.record("skippedLines", accumulator.skipped_line_count)
+        profiling.write(app_config.profile_file)
+
+
+def merge(merge_config: "MergeContext") -> None:
+    from grasplog.summary import save_summary, summarize, load_summary, merge_summaries
+
+    setup_loging(merge_config.debug_mode)
+    summaries = [load_summary(x) for x in merge_config.summary_paths]
+    accumulator = merge_summaries(
+        summaries,
+        max_samples_per_cluster=merge_config.max_samples_per_cluster,
+        max_noisy_samples=merge_config.max_noisy_samples,
+        max_distance=merge_config.max_distance,
+    )
+    write_output(accumulator, merge_config.output_format, merge_config.output_file)
+    if merge_config.summary_file is not None:
+        # Merged summaries can be merged again, e.g. per data center first and then globally
+        save_summary(merge_config.summary_file, summarize(accumulator, merge_config.max_distance))
+
+
+def classify(classify_config: "ClassifyContext") -> None:
+    from grasplog.file_reader import read_event_blocks_from_glob
+    from grasplog.ml.classification import classify_analyzed
+    from grasplog.ml.text_processing import CachingAnalyzer, analyze_event_blocks
+    from grasplog.model import load_model
+
+    setup_loging(classify_config.debug_mode)
+    model = load_model(classify_config.model_file)
+    # Events have to be analyzed exactly the same way as the events the model was created from
+    analyzer = build_analyzer(model.masked_fields, classify_config.analysis_cache_size)
+    input_files: List["InputFile"] = []
+    event_blocks = read_event_blocks_from_glob(
+        classify_config.path_glob, input_files, classify_config.decode_errors, line_filter=classify_config.line_filter
+    )
+    accumulator = classify_analyzed(
+        analyzed_events=analyze_event_blocks(event_blocks, analyzer),
+        clusters=model.clusters,
+        max_distance=model.max_distance,
+        max_samples_per_cluster=classify_config.max_samples_per_cluster,
+        max_noisy_samples=classify_config.max_noisy_samples,
+        input_files=input_files,
+    )
+    accumulator.skipped_line_count = sum(x.skipped_line_count for x in input_files)
+    if isinstance(analyzer, CachingAnalyzer):
+        analyzer.log_statistics()
+    write_output(accumulator, classify_config.output_format, classify_config.output_file)
+
+
+def serve(serve_config: "ServeContext") -> None:
+    from grasplog import server
+
+    setup_loging(serve_config.debug_mode)
+    server.serve(serve_config)
+
+
+def write_output(accumulator: "ClusteringAccumulator", output_format: OutputFormat, output_file: Optional[str]) -> None:
+    if output_file is None:
+        accumulator.output(output_format)
+        return
+    try:
+        with open(output_file, "wt", buffering=OUTPUT_BUFFER_SIZE) as handle:
+            accumulator.output(output_format, handle)
+    except OSError as e:
+        raise GraspLogIOException(f"Cannot write output file {output_file}: {e}")
+
+
+def process(app_config: "AppContext", analyzer: "EventAnalyzer") -> "ClusteringAccumulator":
+    from grasplog import profiling
+    from grasplog.file_reader import read_event_blocks_from_glob
+    from grasplog.ml.text_processing import analyze_event_blocks
+
+    engine = load_engine(app_config.engine)
+    input_files: List["InputFile"] = []
+    cache = create_feature_cache(app_config)
+    if app_config.jobs > 1 or cache is not None:
+        from grasplog.ml.parallel import analyze_events_from_glob
+
+        # Files are read and analyzed by the workers (or loaded from the cache), the read stage is the time spent
+        # waiting for them
+        analyzed_events = profiling.timed_iterator("read", analyze_events_from_glob(
+            app_config.path_glob, app_config.jobs, input_files, analyzer, app_config.decode_errors, cache,
+            app_config.time_window, app_config.line_filter,
+        ))
+    else:
+        event_blocks = read_event_blocks_from_glob(
+            app_config.path_glob, input_files, app_config.decode_errors, app_config.time_window, app_config.line_filter
+        )
+        analyzed_events = analyze_event_blocks(profiling.timed_iterator("read", event_blocks), analyzer)
+    analyzed_events = profiling.timed_files(analyzed_events, input_files)
+    if app_config.engine == Engine.stream:
+        accumulator = engine.process_analyzed(
+            analyzed_events=analyzed_events,
             max_samples_per_cluster=app_config.max_samples_per_cluster,
             max_noisy_samples=app_config.max_noisy_samples,
             max_distance=app_config.max_distance,
+            input_files=input_files,
         )
-        accumulator.output(app_config.output_format)
-    except GraspLogException as e:
-        print_err(str(e))
-        sys.exit(1)
+    else:
+        accumulator = engine.process_analyzed(
+            analyzed_events=analyzed_events,
+            max_samples_per_cluster=app_config.max_samples_per_cluster,
+            max_noisy_samples=app_config.max_noisy_samples,
+            max_distance=app_config.max_distance,
+            input_files=input_files,
+            sample_size=app_config.sample_size,
+            partitioning=app_config.partitioning,
+            partition_band_width=app_config.partition_band_width,
+            jobs=app_config.jobs,
+            labels_path=app_config.labels_dir,
+            ngram_sizes=app_config.ngram_sizes,
+            keep_core_samples=app_config.model_file is not None,
+        )
+    accumulator.skipped_line_count = sum(x.skipped_line_count for x in input_files)
+    if cache is not None:
+        cache.evict()
+    return accumulator
+
+
+def create_feature_cache(app_config: "AppContext") -> Optional["FeatureCache"]:
+    if app_config.cache_dir is None:
+        return None
+    import json
+
+    from grasplog.feature_cache import FeatureCache
+
+    try:
+        os.makedirs(app_config.cache_dir, exist_ok=True)
+    except OSError as e:
+        raise GraspLogIOException(f"Cannot create cache directory {app_config.cache_dir}: {e}")
+    # Tokens depend on the masked fields and on the analyzer implementation, which may change with the version
+    analyzer_key = json.dumps({"version": grasplog.__version__, "maskedFields": app_config.masked_fields})
+    return FeatureCache(app_config.cache_dir, app_config.cache_size_mb * 1024 * 1024, analyzer_key)
@@ -0,0 +1,53 @@
+"""
+Client of grasplog serve: sends a batch of log lines from the standard input (or a path glob read by the server) to
+the server's Unix domain socket and writes the JSON output to the standard output. Only a few standard library modules
+are imported, so the latency of a batch depends on its size rather than on the startup of the command line.
+"""
+import json
+import os
+import socket
+import sys
+from argparse import ArgumentParser
+
+BUFFER_SIZE = 1024 * 1024
+
+
+def main():
+    parser = ArgumentParser(
+        prog="grasplog-client",
+        description="Cluster a batch of log events by a running 'grasplog serve' and print the JSON output.",
+    )
+    parser.add_argument("--socket", metavar="SOCKET", required=True, help="Unix domain socket of the server")
+    parser.add_argument(
+        "path_glob",
+        metavar="PATH",
+        nargs="?",
+        default="-",
+        help="Logs path read by the server, can be a file, directory or glob pattern. By default, the lines of the "
+             "standard input are sent as the batch",
+    )
+    args = parser.parse_args()
+
+    header = {} if args.path_glob == "-" else {"pathGlob": os.path.abspath(args.path_glob)}
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.connect(args.socket)
+            connection.sendall(json.dumps(header).encode() + b"\n")
+            if args.path_glob == "-":
+                while chunk := sys.stdin.buffer.read(BUFFER_SIZE):
+                    connection.sendall(chunk)
+            connection.shutdown(socket.SHUT_WR)
+            with connection.makefile("rb") as response:
+                status = json.loads(response.readline() or b'{"error": "No response from the server"}')
+                if "error" in status:
+                    print(f"Error: {status['error']}", file=sys.stderr)
+                    sys.exit(1)
+                while chunk := response.read(BUFFER_SIZE):
+                    sys.stdout.buffer.write(chunk)
+    except OSError as e:
+        print(f"Error: Cannot send the batch to the server at {args.socket}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
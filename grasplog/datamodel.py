@@ -1,19 +1,15 @@
-import json
-from dataclasses import dataclass, asdict
-from enum import Enum
-from typing import List, Dict, ClassVar
-
-from grasplog.json_output import LogEventJson, ClusteringJson, ClusterInfoJson, NoisyEventsJson
-from grasplog.ui_helper import print_msg
+import sys
+from dataclasses import dataclass, field
+from typing import List, Dict, ClassVar, Optional, Iterator, TextIO
+
+from grasplog.line_filter import LineFilter
+from grasplog.options import OutputFormat, Engine, Partitioning, DEFAULT_MAX_DISTANCE
+from grasplog.json_output import LogEventJson, ClusterInfoJson, NoisyEventsJson, write_json, write_ndjson
+from grasplog.timestamps import TimeWindow
 from grasplog.util import Timer
 
 
-class OutputFormat(Enum):
-    pretty_format = "pretty"
-    json_format = "json"
-
-    def __str__(self) -> str:
-        return self.value
+MIN_SAMPLES = 3  # Minimum number of messages to form a cluster, shared by all engines
 
 
 @dataclass
@@ -23,17 +19,78 @@ class AppContext:
     max_samples_per_cluster: int
     max_noisy_samples: int
     output_format: OutputFormat
+    engine: Engine
+    jobs: int
+    sample_size: int
+    partitioning: Optional[Partitioning]
+    partition_band_width: int
+    analysis_cache_size: int
+    masked_fields: List[str]
+    ngram_sizes: List[int]
+    state_file: Optional[str]
+    decode_errors: str
+    output_file: Optional[str]
+    summary_file: Optional[str]
+    model_file: Optional[str]
+    labels_dir: Optional[str]
+    cache_dir: Optional[str]
+    cache_size_mb: int
+    time_window: Optional[TimeWindow]
+    line_filter: Optional[LineFilter]
+    profile_file: Optional[str]
+    profile_stage: Optional[str]
+    debug_mode: bool
+    DEFAULT_MAX_DISTANCE: ClassVar[float] = DEFAULT_MAX_DISTANCE
+
+
+@dataclass
+class MergeContext:
+    summary_paths: List[str]
+    max_distance: float
+    max_samples_per_cluster: int
+    max_noisy_samples: int
+    output_format: OutputFormat
+    output_file: Optional[str]
+    summary_file: Optional[str]
+    debug_mode: bool
+
+
+@dataclass
+class ClassifyContext:
+    model_file: str
+    path_glob: str
+    max_samples_per_cluster: int
+    max_noisy_samples: int
+    output_format: OutputFormat
+    output_file: Optional[str]
+    analysis_cache_size: int
+    decode_errors: str
+    line_filter: Optional[LineFilter]
+    debug_mode: bool
+
+
+@dataclass
+class ServeContext:
+    socket_path: str
+    jobs: int
+    model_file: Optional[str]
+    max_distance: float
+    max_samples_per_cluster: int
+    max_noisy_samples: int
+    analysis_cache_size: int
+    decode_errors: str
+    line_filter: Optional[LineFilter]
     debug_mode: bool
-    DEFAULT_MAX_DISTANCE: ClassVar[float] = 2.1
 
 
 @dataclass
 class LogEvent:
-    line_nr: int
-    message: str
+    line_nr: int  # Line number in the file the event was read from
+    message: Optional[str]  # None until the message is read from the file again
+    path: Optional[str] = None
 
     def to_json(self) -> LogEventJson:
-        return LogEventJson(self.line_nr, self.message)
+        return LogEventJson(self.line_nr, self.message or "", self.path)
 
 
 @dataclass
@@ -41,6 +98,10 @@ class ClusterInfo:
     cluster_id: int
     total_event_count: int
     samples: List[LogEvent]
+    # Tokens of the most frequent event in the cluster, representing the whole cluster in later runs
+    prototype: List[str] = field(default_factory=list)
+    # Tokens of the distinct core samples of DBSCAN, kept only for a model (--save-model)
+    core_samples: List[List[str]] = field(default_factory=list)
 
     def to_cluster_json(self) -> ClusterInfoJson:
         return ClusterInfoJson(self.cluster_id, [x.to_json() for x in self.samples], self.total_event_count)
@@ -53,6 +114,10 @@ class ClusteringAccumulator:
     def __init__(self, max_samples_per_cluster: int, max_noisy_samples: int):
         self.clusters: Dict[int, ClusterInfo] = {}
         self.noisy_events: ClusterInfo = ClusterInfo(-1, 0, [])
+        # Distinct noisy events with their prototypes, so that they can still form a cluster in later runs
+        self.noisy_rows: List[ClusterInfo] = []
+        # Lines rejected by the line filter (--include, --exclude), they are not counted as events
+        self.skipped_line_count = 0
         self.__max_samples_per_cluster = max_samples_per_cluster
         self.__max_noisy_samples = max_noisy_samples
 
@@ -70,54 +135,102 @@ class ClusteringAccumulator:
         if self.noisy_events.total_event_count < self.__max_noisy_samples:
             self.noisy_events.samples.append(event)
 
-    def output(self, output_format: OutputFormat):
+    def report_cluster(self, cluster_id: int, cluster: ClusterInfo) -> None:
+        """
+        Adds all events summarized by another cluster (e.g. from a previous run) to the given cluster.
+        """
+        current = self.clusters.get(cluster_id)
+        if current is None:
+            current = self.clusters[cluster_id] = ClusterInfo(cluster_id, 0, [])
+        current.total_event_count += cluster.total_event_count
+        missing_samples = max(0, self.__max_samples_per_cluster - len(current.samples))
+        current.samples.extend(cluster.samples[:missing_samples])
+
+    def report_noisy_cluster(self, cluster: ClusterInfo) -> None:
+        self.noisy_events.total_event_count += cluster.total_event_count
+        missing_samples = max(0, self.__max_noisy_samples - len(self.noisy_events.samples))
+        self.noisy_events.samples.extend(cluster.samples[:missing_samples])
+
+    def move_small_clusters_to_noise(self, min_event_count: int) -> None:
+        """
+        Reports all events of clusters with less than min_event_count events as noisy events and renumbers the
+        remaining clusters, so that the cluster ids are consecutive again.
+        """
+        noisy_samples = list(self.noisy_events.samples)
+        clusters: Dict[int, ClusterInfo] = {}
+        for cluster_info in self.clusters.values():
+            if cluster_info.total_event_count < min_event_count:
+                self.noisy_events.total_event_count += cluster_info.total_event_count
+                noisy_samples.extend(cluster_info.samples)
+            else:
+                cluster_info.cluster_id = len(clusters)
+                clusters[cluster_info.cluster_id] = cluster_info
+        self.noisy_events.samples = noisy_samples[:self.__max_noisy_samples]
+        self.clusters = clusters
+
+    def iter_samples(self) -> Iterator[LogEvent]:
+        for cluster_info in self.clusters.values():
+            yield from cluster_info.samples
+        yield from self.noisy_events.samples
+        for noisy_row in self.noisy_rows:
+            yield from noisy_row.samples
+
+    def total_event_count(self) -> int:
+        return sum(x.total_event_count for x in self.clusters.values()) + self.noisy_events.total_event_count
+
+    def output(self, output_format: OutputFormat, handle: Optional[TextIO] = None):
+        """
+        Writes the results to handle (standard output by default), flushing it only at the end.
+        """
+        handle = handle or sys.stdout
         if output_format == OutputFormat.pretty_format:
-            self.__output_human_readable()
+            self.__output_human_readable(handle)
         elif output_format == OutputFormat.json_format:
-            self.__output_json()
+            write_json(handle, self.__iter_clusters_json(), self.noisy_events.to_noisy_events_json())
+            handle.write("\n")
+        elif output_format == OutputFormat.ndjson_format:
+            write_ndjson(handle, self.__iter_clusters_json(), self.noisy_events.to_noisy_events_json())
+        handle.flush()
+
+    def __iter_clusters_json(self) -> Iterator[ClusterInfoJson]:
+        return (x.to_cluster_json() for x in self.clusters.values())
 
     @staticmethod
-    def __output_human_readable_event(event: LogEvent):
-        print_msg(f"\tL#{event.line_nr}: {event.message}")
+    def __output_human_readable_event(handle: TextIO, event: LogEvent):
+        if event.path is None:
+            handle.write(f"\tL#{event.line_nr}: {event.message}\n")
+        else:
+            handle.write(f"\t{event.path} L#{event.line_nr}: {event.message}\n")
 
-    def __output_human_readable(self) -> None:
-        categorized_events_count = sum([y.total_event_count for _, y in self.clusters.items()])
+    def __output_human_readable(self, handle: TextIO) -> None:
+        total_events_count = self.total_event_count()
         noisy_events_count = self.noisy_events.total_event_count
-        total_events_count = categorized_events_count + noisy_events_count
+        categorized_events_count = total_events_count - noisy_events_count
         categorized_events_perc = categorized_events_count / total_events_count * 100
 
         for cluster_id, cluster_info in self.clusters.items():
-            print_msg(f"Detected cluster {cluster_id}")
+            handle.write(f"Detected cluster {cluster_id}\n")
             for example in cluster_info.samples:
-                self.__output_human_readable_event(example)
+                self.__output_human_readable_event(handle, example)
             missing_count = cluster_info.total_event_count - self.__max_samples_per_cluster
             if missing_count > 0:
-                print_msg(
-                    f"\t(...and {missing_count} more similar event(s)...)"
-                )
-            print_msg("")
+                handle.write(f"\t(...and {missing_count} more similar event(s)...)\n")
+            handle.write("\n")
         if self.noisy_events.total_event_count > 0:
-            print_msg("Noisy events (not belonging to any cluster)")
+            handle.write("Noisy events (not belonging to any cluster)\n")
             for example in self.noisy_events.samples:
-                self.__output_human_readable_event(example)
+                self.__output_human_readable_event(handle, example)
             missing_count = self.noisy_events.total_event_count - self.__max_noisy_samples
             if missing_count > 0:
-                print_msg(
-                    f"\t(...and {missing_count} more event(s)...)"
-                )
-
-        print_msg("")
-        print_msg("---")
-        print_msg("")
-        print_msg(f"Detected clusters: {len(self.clusters)}")
-        print_msg(f"Total events: {categorized_events_count + noisy_events_count}")
-        print_msg(f"Noisy events: {self.noisy_events.total_event_count}")
-        print_msg(f"Categorized events: {categorized_events_count} ({categorized_events_perc:.2f}%)")
-
-    def __output_json(self) -> None:
-        result = ClusteringJson(
-            clusters=[x.to_cluster_json() for x in self.clusters.values()],
-            noisySamples=self.noisy_events.to_noisy_events_json()
-        )
-        result_dict = asdict(result)
-        print_msg(json.dumps(result_dict, indent=2))
+                handle.write(f"\t(...and {missing_count} more event(s)...)\n")
+
+        handle.write("\n")
+        handle.write("---\n")
+        handle.write("\n")
+        handle.write(f"Detected clusters: {len(self.clusters)}\n")
+        handle.write(f"Total events: {categorized_events_count + noisy_events_count}\n")
+        handle.write(f"Noisy events: {self.noisy_events.total_event_count}\n")
+        handle.write(f"Categorized events: {categorized_events_count} ({categorized_events_perc:.2f}%)\n")
+        if self.skipped_line_count > 0:
+            skipped_lines_perc = self.skipped_line_count / (self.skipped_line_count + total_events_count) * 100
+            handle.write(f"Skipped lines: {self.skipped_line_count} ({skipped_lines_perc:.2f}% of read lines)\n")
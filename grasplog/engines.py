@@ -0,0 +1,21 @@
+"""
+Registry of clustering engines. Engine modules depend on scikit-learn, scipy or nltk, which take long to import, so
+they are imported only once an engine is selected and runs that exit early (--help, --version, invalid arguments)
+start fast.
+"""
+import importlib
+from types import ModuleType
+from typing import Dict
+
+from grasplog.options import Engine
+
+# Every engine module provides process_analyzed(analyzed_events, max_samples_per_cluster, max_noisy_samples,
+# max_distance, ...) returning a ClusteringAccumulator
+ENGINE_MODULES: Dict[Engine, str] = {
+    Engine.dbscan: "grasplog.ml.clustering",
+    Engine.stream: "grasplog.ml.template_mining",
+}
+
+
+def load_engine(engine: Engine) -> ModuleType:
+    return importlib.import_module(ENGINE_MODULES[engine])
@@ -0,0 +1,72 @@
+from array import array
+from collections import defaultdict
+from typing import List, Optional, Dict, Iterable
+
+from grasplog.datamodel import LogEvent
+from grasplog.file_reader import InputFile
+from grasplog.ui_helper import print_err
+
+MISSING_LINE_MESSAGE = "<line no longer in the file>"
+
+
+class EventStore:
+    """
+    Compact storage of processed events: only the file id and the line number of every event are kept in array
+    columns, the text of the few events shown as samples is read from the file again (see load_missing_messages).
+    Texts are kept in memory only for events that can't be read again (standard input or events without a file).
+    """
+
+    def __init__(self, input_files: Optional[List[InputFile]]):
+        self.__input_files = input_files
+        self.file_ids = array("I")
+        self.line_nrs = array("Q")
+        self.__messages: Dict[int, Optional[str]] = {}
+        self.__last_file_id = -1
+        self.__keep_message = True
+
+    def append(self, file_id: int, line_nr: int, message: Optional[str]) -> None:
+        if file_id != self.__last_file_id:
+            self.__last_file_id = file_id
+            self.__keep_message = self.__input_files is None or not self.__input_files[file_id].is_rereadable()
+        if self.__keep_message:
+            self.__messages[len(self.line_nrs)] = message
+        self.file_ids.append(file_id)
+        self.line_nrs.append(line_nr)
+
+    def event(self, index: int) -> LogEvent:
+        """
+        Returns the event with the given index. Its message is None if it has to be read from the file again.
+        """
+        path = None
+        if self.__input_files is not None:
+            path = self.__input_files[self.file_ids[index]].path
+        return LogEvent(self.line_nrs[index], self.__messages.get(index), path)
+
+    def __len__(self) -> int:
+        return len(self.line_nrs)
+
+
+def load_missing_messages(events: Iterable[LogEvent], input_files: List[InputFile]) -> None:
+    """
+    Reads messages of the given events from their files, at most once per file. Lines no longer in a file (e.g. it
+    was truncated or rotated in the meantime) get the MISSING_LINE_MESSAGE placeholder. Line numbers of events read
+    from a time window are then made absolute, see InputFile.absolute_line_nr.
+    """
+    events = list(events)
+    # Events without a path always keep their messages, see EventStore
+    events_by_path: Dict[str, List[LogEvent]] = defaultdict(list)
+    for event in events:
+        if event.message is None and event.path is not None:
+            events_by_path[event.path].append(event)
+    input_files_by_path = {x.path: x for x in input_files}
+    for path, path_events in events_by_path.items():
+        lines = input_files_by_path[path].read_selected_lines(x.line_nr for x in path_events)
+        if len(lines) < len({x.line_nr for x in path_events}):
+            print_err(f"File '{path}' changed since it was read, some samples are missing")
+        for event in path_events:
+            line = lines.get(event.line_nr)
+            event.message = line.strip() if line is not None else MISSING_LINE_MESSAGE
+    for event in events:
+        input_file = input_files_by_path.get(event.path) if event.path is not None else None
+        if input_file is not None and input_file.window_offset > 0:
+            event.line_nr = input_file.absolute_line_nr(event.line_nr)
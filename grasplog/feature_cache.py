@@ -0,0 +1,154 @@
+"""
+On-disk cache of analyzed files (--cache-dir), so that rotated archives which never change are neither decompressed
+nor analyzed again in later runs. An entry is keyed on the content of the file (not its name, a rotated file renamed
+from syslog.1.gz to syslog.2.gz is still found), the decoding of invalid characters and the analyzer configuration.
+Every entry is a directory of arrays in the NumPy .npy format:
+
+- vocabulary.json: {"version": 1, "tokens": [token 0, token 1, ...]}
+- row_indptr.npy, row_indices.npy: distinct token lists of the file as a CSR matrix of token ids
+- rows.npy: uint32, index of the token list of every line
+- block_offsets.npy, block_line_nrs.npy: uint64, block index of the file used to read samples again, see InputFile
+
+Only files not modified for at least MIN_FILE_AGE_S are cached, more recent ones are most likely still being written.
+The least recently used entries are evicted once the total size exceeds the limit.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from array import array
+from dataclasses import dataclass
+from typing import Optional, List, Tuple, Dict
+
+import numpy as np
+
+from grasplog.file_reader import InputFile, STDIN_PATH
+from grasplog.ml.parallel import AnalyzedFile
+
+CACHE_VERSION = 1
+MIN_FILE_AGE_S = 3600
+HASH_CHUNK_SIZE = 1024 * 1024
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class FeatureCache:
+    directory: str
+    max_bytes: int
+    analyzer_key: str  # Identifies the analyzer configuration, entries of other configurations are never used
+
+    def key(self, path: str, decode_errors: str) -> Optional[str]:
+        """
+        Returns the key of the entry of the file at path, None if the file should not be cached.
+        """
+        if path == STDIN_PATH:
+            return None
+        try:
+            if time.time() - os.stat(path).st_mtime < MIN_FILE_AGE_S:
+                return None
+            # The raw (compressed) content is hashed, which is much cheaper than decompressing it
+            content_hash = hashlib.blake2b(digest_size=20)
+            with open(path, "rb") as handle:
+                while chunk := handle.read(HASH_CHUNK_SIZE):
+                    content_hash.update(chunk)
+        except OSError:
+            # The file is reported when it is read
+            return None
+        key = hashlib.blake2b(digest_size=20)
+        key.update(f"{CACHE_VERSION}\0{self.analyzer_key}\0{decode_errors}\0".encode())
+        key.update(content_hash.digest())
+        return key.hexdigest()
+
+    def load(self, key: str, path: str, decode_errors: str) -> Optional[AnalyzedFile]:
+        entry_path = os.path.join(self.directory, key)
+        if not os.path.isdir(entry_path):
+            return None
+        try:
+            with open(os.path.join(entry_path, "vocabulary.json"), "rt") as handle:
+                vocabulary_dict = json.load(handle)
+            if vocabulary_dict["version"] != CACHE_VERSION:
+                return None
+            tokens: List[str] = vocabulary_dict["tokens"]
+            row_indptr = _load_array(entry_path, "row_indptr.npy", "q").tolist()
+            row_indices = [tokens[x] for x in _load_array(entry_path, "row_indices.npy", "i")]
+            input_file = InputFile(
+                path, decode_errors,
+                _load_array(entry_path, "block_offsets.npy", "Q"), _load_array(entry_path, "block_line_nrs.npy", "Q"),
+            )
+            rows = _load_array(entry_path, "rows.npy", "I")
+            # Access time of the entry for the eviction, file systems are often mounted with noatime
+            os.utime(entry_path)
+        except (OSError, ValueError, KeyError, TypeError, IndexError) as e:
+            LOGGER.warning(f"Ignoring corrupted feature cache entry {entry_path}: {e}")
+            return None
+        unique_tokens: List[Tuple[str, ...]] = [
+            tuple(row_indices[start:end]) for start, end in zip(row_indptr, row_indptr[1:])
+        ]
+        LOGGER.debug(f"Feature cache hit path={path} key={key} events={len(rows)}")
+        return AnalyzedFile(input_file, unique_tokens, rows)
+
+    def store(self, key: str, analyzed_file: AnalyzedFile) -> None:
+        vocabulary: Dict[str, int] = {}
+        row_indptr = array("q", [0])
+        row_indices = array("i")
+        for tokens in analyzed_file.unique_tokens:
+            row_indices.extend(vocabulary.setdefault(x, len(vocabulary)) for x in tokens)
+            row_indptr.append(len(row_indices))
+        columns: Dict[str, np.ndarray] = {
+            "row_indptr.npy": np.frombuffer(row_indptr, dtype=np.int64),
+            "row_indices.npy": np.frombuffer(row_indices, dtype=np.int32),
+            "rows.npy": np.frombuffer(analyzed_file.rows, dtype=np.uint32),
+            "block_offsets.npy": np.frombuffer(analyzed_file.input_file.block_offsets, dtype=np.uint64),
+            "block_line_nrs.npy": np.frombuffer(analyzed_file.input_file.block_line_nrs, dtype=np.uint64),
+        }
+        entry_path = os.path.join(self.directory, key)
+        # Entries are written under a temporary name and renamed at once, so that a concurrent run or an interrupted
+        # one never sees an incomplete entry
+        tmp_path = f"{entry_path}.tmp{os.getpid()}"
+        try:
+            os.makedirs(tmp_path, exist_ok=True)
+            for file_name, column in columns.items():
+                np.save(os.path.join(tmp_path, file_name), column, allow_pickle=False)
+            with open(os.path.join(tmp_path, "vocabulary.json"), "wt") as handle:
+                json.dump({"version": CACHE_VERSION, "tokens": list(vocabulary)}, handle)
+            os.rename(tmp_path, entry_path)
+            LOGGER.debug(f"Feature cache entry stored path={analyzed_file.input_file.path} key={key}")
+        except OSError as e:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            if not os.path.isdir(entry_path):
+                LOGGER.warning(f"Cannot write feature cache entry {entry_path}: {e}")
+
+    def evict(self) -> None:
+        """
+        Removes the least recently used entries until the total size of the cache is within max_bytes.
+        """
+        try:
+            entries = []
+            for name in os.listdir(self.directory):
+                entry_path = os.path.join(self.directory, name)
+                # Entries being written by a concurrent run are left alone
+                if os.path.isdir(entry_path) and ".tmp" not in name:
+                    size = sum(x.stat().st_size for x in os.scandir(entry_path))
+                    entries.append((os.stat(entry_path).st_mtime, size, entry_path))
+        except OSError as e:
+            LOGGER.warning(f"Cannot list feature cache {self.directory}: {e}")
+            return
+        total_size = sum(x[1] for x in entries)
+        for _, size, entry_path in sorted(entries):
+            if total_size <= self.max_bytes:
+                break
+            shutil.rmtree(entry_path, ignore_errors=True)
+            total_size -= size
+            LOGGER.debug(f"Feature cache entry evicted path={entry_path} size={size}")
+
+
+def _load_array(entry_path: str, file_name: str, typecode: str) -> array:
+    # Arrays are read in bulk, without parsing, straight into the typed buffers used by the rest of the pipeline
+    column = np.load(os.path.join(entry_path, file_name), mmap_mode="r", allow_pickle=False)
+    result = array(typecode)
+    if column.dtype.itemsize != result.itemsize or column.ndim != 1:
+        raise ValueError(f"unexpected array {file_name}")
+    result.frombytes(column.tobytes())
+    return result
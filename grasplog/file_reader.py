@@ -1,46 +1,682 @@
+import bz2
 import glob
+import hashlib
+import io
+import itertools
+import locale
+import lzma
 import os
-import gzip
-from typing import Iterator, TextIO
+import stat
+import sys
+import zlib
+from array import array
+from bisect import bisect_right
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Callable, Dict, Protocol, Tuple, BinaryIO, Union, Iterable
 
 from grasplog.exception import GraspLogException, GraspLogIOException
+from grasplog.line_filter import LineFilter
+from grasplog.options import DEFAULT_DECODE_ERRORS
+from grasplog.timestamps import TimeWindow, TimestampParser, first_timestamp, last_timestamp
 from grasplog.ui_helper import print_err
 
+STDIN_PATH = "-"
+HEAD_SIZE = 1024  # Number of leading bytes identifying the content of a file
+CHUNK_SIZE = 1024 * 1024  # Approximate size of the content decoded and split into lines at once
+COMPRESSED_CHUNK_SIZE = 256 * 1024  # Size of the compressed input passed to a decompressor at once
+PROBE_SIZE = 64 * 1024  # Number of bytes whose lines are checked for a timestamp at a position of a file
+MTIME_SLACK_S = 86400  # Covers any difference between the time zone of timestamps and the local time
 
-def read_events_from_glob(glob_path: str) -> Iterator[str]:
-    file_count = 0
+
+# Part of a file content, either a copy or a view of a read buffer, which is only valid until the next chunk is read
+Chunk = Union[bytes, memoryview]
+
+
+class Decompressor(Protocol):
+    # Read-only, like the attributes of the zlib, bz2 and lzma decompressor objects
+    @property
+    def eof(self) -> bool:
+        ...
+
+    @property
+    def unused_data(self) -> bytes:
+        ...
+
+    def decompress(self, data: bytes) -> bytes:
+        ...
+
+
+# Decompressors by file extension, further formats can be added with register_decompressor
+DECOMPRESSORS: Dict[str, Callable[[], Decompressor]] = {
+    ".gz": lambda: zlib.decompressobj(16 + zlib.MAX_WBITS),
+    ".gzip": lambda: zlib.decompressobj(16 + zlib.MAX_WBITS),
+    ".bz2": bz2.BZ2Decompressor,
+    ".xz": lzma.LZMADecompressor,
+}
+
+
+def register_decompressor(extension: str, factory: Callable[[], Decompressor]) -> None:
+    DECOMPRESSORS[extension] = factory
+
+
+@dataclass
+class FileState:
+    """
+    Position up to which a file has been read, together with the checksum of its leading bytes, which identifies
+    the file even after it has been renamed by log rotation.
+    """
+    path: str
+    inode: int
+    head_length: int
+    head_checksum: str
+    offset: int  # Position in the (decompressed) content right after the last complete line read
+    line_count: int  # Number of lines before the offset
+
+
+@dataclass
+class InputFile:
+    """
+    File that events were read from. The byte offset and the number of the first line of every block of lines
+    decoded at once are recorded, so that single lines can be read again later without keeping them in memory.
+    With a line filter, every run of consecutive accepted lines is a block. Lines read from the start of a time window
+    are numbered from there, the lines before it are only counted when absolute line numbers are needed.
+    """
+    path: str
+    decode_errors: str = DEFAULT_DECODE_ERRORS
+    block_offsets: array = field(default_factory=lambda: array("Q"))
+    block_line_nrs: array = field(default_factory=lambda: array("Q"))
+    skipped_line_count: int = 0  # Number of lines rejected by the line filter
+    window_offset: int = 0  # Position of the line numbered 1, the start of a time window or 0
+    window_line_count: Optional[int] = None  # Number of lines before window_offset, None until counted
+
+    def is_rereadable(self) -> bool:
+        return self.path != STDIN_PATH
+
+    def absolute_line_nr(self, line_nr: int) -> int:
+        """
+        Converts the number of a line read from this file to its number from the beginning of the file.
+        """
+        if self.window_line_count is None:
+            self.window_line_count = _count_lines(self.path, self.window_offset) if self.window_offset > 0 else 0
+        return line_nr + self.window_line_count
+
+    def read_selected_lines(self, line_nrs: Iterable[int]) -> Dict[int, str]:
+        """
+        Reads lines with the given numbers (starting at 1) again. Only blocks containing any of the lines are read
+        in plain files, compressed files are decompressed once up to the last requested line. Only the requested
+        lines are decoded, lines rejected by a line filter may not be decodable.
+        """
+        wanted_line_nrs = sorted(set(line_nrs))
+        result: Dict[int, str] = {}
+        if not wanted_line_nrs:
+            return result
+        encoding = locale.getpreferredencoding(False)
+        with _handle_read_errors(self.path):
+            if _find_decompressor(self.path) is not None or not self.block_offsets:
+                blocks = self.__read_raw_blocks_from(0, 1)
+            else:
+                blocks = self.__read_indexed_raw_blocks(wanted_line_nrs)
+            for first_line_nr, lines in blocks:
+                for line_nr in wanted_line_nrs:
+                    if first_line_nr <= line_nr < first_line_nr + len(lines):
+                        result[line_nr] = str(lines[line_nr - first_line_nr], encoding, self.decode_errors)
+                if first_line_nr + len(lines) > wanted_line_nrs[-1]:
+                    break
+        return result
+
+    def __read_indexed_raw_blocks(self, wanted_line_nrs: List[int]) -> Iterator[Tuple[int, List[bytes]]]:
+        block_ids = sorted({bisect_right(self.block_line_nrs, x) - 1 for x in wanted_line_nrs})
+        for block_id in block_ids:
+            yield from itertools.islice(
+                self.__read_raw_blocks_from(self.block_offsets[block_id], self.block_line_nrs[block_id]), 1
+            )
+
+    def __read_raw_blocks_from(self, offset: int, first_line_nr: int) -> Iterator[Tuple[int, List[bytes]]]:
+        for chunk in _read_chunks(self.path, offset):
+            if len(chunk) == 0:
+                continue
+            lines = bytes(chunk).split(b"\n")
+            if chunk[-1:] == b"\n":
+                lines.pop()  # Empty string after the last line ending
+            yield first_line_nr, lines
+            first_line_nr += len(lines)
+
+
+def read_event_blocks_from_glob(
+        glob_path: str,
+        input_files: List[InputFile],
+        decode_errors: str = DEFAULT_DECODE_ERRORS,
+        time_window: Optional[TimeWindow] = None,
+        line_filter: Optional[LineFilter] = None,
+) -> Iterator[Tuple[int, int, List[str]]]:
+    """
+    Yields blocks of lines as (file id, number of the first line in the file, lines). Every read file is appended to
+    input_files, the file id is its index there. With a time window, only lines within it are yielded. With a line
+    filter, only accepted lines are yielded, in blocks of consecutive lines.
+    """
+    line_count = 0
+    for path in find_readable_files(glob_path):
+        file_id = len(input_files)
+        input_file = InputFile(path, decode_errors)
+        input_files.append(input_file)
+        for first_line_nr, lines in read_indexed_line_blocks(input_file, time_window, line_filter):
+            line_count += len(lines)
+            yield file_id, first_line_nr, lines
+    check_not_empty(line_count, time_window, line_filter)
+
+
+def read_indexed_line_blocks(
+        input_file: InputFile,
+        time_window: Optional[TimeWindow] = None,
+        line_filter: Optional[LineFilter] = None,
+) -> Iterator[Tuple[int, List[str]]]:
+    """
+    Yields blocks of lines with the number of their first line and records them in the block index of the file.
+    With a time window, only the contiguous range of lines within it is yielded, see _read_time_window.
+    """
+    with _handle_read_errors(input_file.path):
+        if time_window is None:
+            yield from _read_indexed_blocks_from(input_file, 0, 1, line_filter)
+        else:
+            yield from _read_time_window(input_file, time_window, line_filter)
+
+
+def read_event_blocks_from_content(
+        content: bytes,
+        input_files: List[InputFile],
+        decode_errors: str = DEFAULT_DECODE_ERRORS,
+        line_filter: Optional[LineFilter] = None,
+) -> Iterator[Tuple[int, int, List[str]]]:
+    """
+    Yields blocks of lines of content that does not come from a file (e.g. a batch received by grasplog serve) the same
+    way as read_event_blocks_from_glob. The content is appended to input_files as the standard input, which can't be
+    read again, and may be empty.
+    """
+    file_id = len(input_files)
+    input_file = InputFile(STDIN_PATH, decode_errors)
+    input_files.append(input_file)
+    chunks = _align_to_lines(content[x:x + CHUNK_SIZE] for x in range(0, len(content), CHUNK_SIZE))
+    with _handle_read_errors(input_file.path):
+        for first_line_nr, lines in _index_blocks(input_file, chunks, 0, 1, line_filter):
+            yield file_id, first_line_nr, lines
+
+
+def _read_indexed_blocks_from(
+        input_file: InputFile,
+        offset: int,
+        line_nr: int,
+        line_filter: Optional[LineFilter] = None,
+) -> Iterator[Tuple[int, List[str]]]:
+    yield from _index_blocks(input_file, _read_chunks(input_file.path, offset), offset, line_nr, line_filter)
+
+
+def _index_blocks(
+        input_file: InputFile,
+        chunks: Iterator[Chunk],
+        offset: int,
+        line_nr: int,
+        line_filter: Optional[LineFilter],
+) -> Iterator[Tuple[int, List[str]]]:
+    for runs, length, line_count in _split_line_runs(chunks, input_file.decode_errors, True, line_filter):
+        input_file.skipped_line_count += line_count - sum(len(x[2]) for x in runs)
+        for run_offset, line_index, lines in runs:
+            input_file.block_offsets.append(offset + run_offset)
+            input_file.block_line_nrs.append(line_nr + line_index)
+            yield line_nr + line_index, lines
+        offset += length
+        line_nr += line_count
+
+
+def _read_time_window(
+        input_file: InputFile,
+        time_window: TimeWindow,
+        line_filter: Optional[LineFilter],
+) -> Iterator[Tuple[int, List[str]]]:
+    """
+    Skips files entirely outside of the window by their first and last timestamp. In plain files, the last timestamp
+    is read from the end and the start of the window is found by a binary search, so the lines before it are neither
+    read nor decoded. Their lines are numbered from the start of the window, see InputFile.absolute_line_nr.
+    Compressed files and streams are read from the beginning, but archives last modified long before the window are
+    skipped without being decompressed. Reading stops at the end of the window.
+    """
+    path = input_file.path
+    if path != STDIN_PATH and _find_decompressor(path) is None:
+        with open(path, "rb") as handle:
+            file_stat = os.fstat(handle.fileno())
+            window = None
+            if stat.S_ISREG(file_stat.st_mode) and file_stat.st_size > 0:
+                window = _find_plain_window(input_file, handle, file_stat.st_size, time_window)
+        if window is not None:
+            parser, offset = window
+            if parser is not None:
+                input_file.window_offset = offset
+                blocks = _read_indexed_blocks_from(input_file, offset, 1, line_filter)
+                yield from time_window.filter_blocks(blocks, parser)
+            return
+    if path != STDIN_PATH and time_window.since is not None and \
+            os.stat(path).st_mtime < time_window.since - MTIME_SLACK_S:
+        return
+    blocks = _read_indexed_blocks_from(input_file, 0, 1, line_filter)
+    first_block = next(blocks, None)
+    if first_block is None:
+        return
+    parser = _find_timestamp_parser(path, first_block[1], time_window)
+    if parser is None or time_window.excludes(first_timestamp(first_block[1], parser), None):
+        return
+    yield from time_window.filter_blocks(itertools.chain([first_block], blocks), parser)
+
+
+def _find_plain_window(
+        input_file: InputFile,
+        handle: BinaryIO,
+        size: int,
+        time_window: TimeWindow,
+) -> Tuple[Optional[TimestampParser], int]:
+    """
+    Returns the timestamp parser of a plain file and the position to read the window from, or no parser if the file
+    has no timestamps or no line in the window.
+    """
+    decode_errors = input_file.decode_errors
+    head_lines = _probe_lines(handle, 0, decode_errors)
+    parser = _find_timestamp_parser(input_file.path, head_lines, time_window)
+    if parser is None:
+        return None, 0
+    tail_start = max(0, size - PROBE_SIZE)
+    handle.seek(tail_start)
+    tail = handle.read()
+    if tail_start > 0:
+        # Skips the incomplete line the tail starts in
+        tail = tail[tail.find(b"\n") + 1:] if b"\n" in tail else b""
+    tail_lines = str(tail, locale.getpreferredencoding(False), decode_errors).splitlines()
+    if time_window.excludes(first_timestamp(head_lines, parser), last_timestamp(tail_lines, parser)):
+        return None, 0
+    if time_window.since is None:
+        return parser, 0
+    return parser, _find_window_start(handle, size, parser, time_window.since, decode_errors)
+
+
+def _find_window_start(handle: BinaryIO, size: int, parser: TimestampParser, since: float, decode_errors: str) -> int:
+    """
+    Returns the start of a line at most CHUNK_SIZE bytes before the first line at or after since, assuming the lines
+    are ordered by time. Positions without any timestamp nearby are treated as being after since, so the result is
+    never past the window.
+    """
+    low = 0
+    high = size
+    while high - low > CHUNK_SIZE:
+        middle = (low + high) // 2
+        handle.seek(middle)
+        line_start = middle + handle.read(PROBE_SIZE).find(b"\n") + 1
+        timestamp = None
+        if middle < line_start < high:
+            timestamp = first_timestamp(_probe_lines(handle, line_start, decode_errors), parser)
+        if timestamp is None or timestamp >= since:
+            high = middle
+        else:
+            low = line_start
+    return low
+
+
+def _probe_lines(handle: BinaryIO, start: int, decode_errors: str) -> List[str]:
+    """
+    Returns the complete lines within PROBE_SIZE bytes from start, or all of them if there is no line end.
+    """
+    handle.seek(start)
+    content = handle.read(PROBE_SIZE)
+    end = content.rfind(b"\n") + 1 or len(content)
+    return str(content[:end], locale.getpreferredencoding(False), decode_errors).splitlines()
+
+
+def _count_lines(path: str, length: int) -> int:
+    """
+    Counts the line ends within the first length bytes of a plain file.
+    """
+    line_count = 0
+    with _handle_read_errors(path), open(path, "rb") as handle:
+        while length > 0:
+            content = handle.read(min(CHUNK_SIZE, length))
+            if not content:
+                break
+            line_count += content.count(b"\n")
+            length -= len(content)
+    return line_count
+
+
+def _find_timestamp_parser(path: str, lines: List[str], time_window: TimeWindow) -> Optional[TimestampParser]:
+    parser = time_window.parser_for(lines)
+    if parser is None:
+        print_err(f"Skipping file '{path}' - no timestamps found")
+    return parser
+
+
+def read_events_from_glob(glob_path: str, decode_errors: str = DEFAULT_DECODE_ERRORS) -> Iterator[str]:
     line_count = 0
+    for path in find_readable_files(glob_path):
+        for lines in read_line_blocks(path, decode_errors):
+            line_count += len(lines)
+            yield from lines
+    check_not_empty(line_count)
+
+
+def find_readable_files(glob_path: str) -> List[str]:
+    if glob_path == STDIN_PATH:
+        return [STDIN_PATH]
+    paths = []
     for path in glob.iglob(glob_path, recursive=True):
         if (not os.path.exists(path)) or os.path.isdir(path):
             continue
         if not os.access(path, os.R_OK):
             print_err(f"Skipping file '{path}' - no read permissions")
             continue
-        for line in _read_lines(path):
-            line_count += 1
-            yield line
-        file_count += 1
-    if file_count == 0:
+        paths.append(path)
+    if not paths:
         raise GraspLogException("No readable files detected. "
                                 "To read multiple files, use glob patterns: 'dir/*' or 'dir/**/*.log'")
+    return paths
+
+
+def check_not_empty(
+        line_count: int,
+        time_window: Optional[TimeWindow] = None,
+        line_filter: Optional[LineFilter] = None,
+) -> None:
+    if line_count == 0 and line_filter is not None:
+        raise GraspLogException("No events match the INCLUDE and EXCLUDE patterns"
+                                + (" in the time window" if time_window is not None else ""))
+    if line_count == 0 and time_window is not None:
+        raise GraspLogException("No events found in the time window")
     if line_count == 0:
         raise GraspLogException("All files are empty")
 
 
-def _open_file(path: str) -> TextIO:
-    if path.endswith(".gz") or path.endswith(".gzip"):
-        return gzip.open(path, "rt")
+def read_lines(path: str, decode_errors: str = DEFAULT_DECODE_ERRORS) -> Iterator[str]:
+    """
+    Reads lines (without line endings) of a plain or compressed file, or of the standard input if path is '-'.
+    """
+    for lines in read_line_blocks(path, decode_errors):
+        yield from lines
+
+
+def read_line_blocks(path: str, decode_errors: str = DEFAULT_DECODE_ERRORS) -> Iterator[List[str]]:
+    """
+    Same as read_lines, but returns whole blocks of lines decoded at once.
+    """
+    with _handle_read_errors(path):
+        for lines, _ in _split_lines(_read_chunks(path), decode_errors, include_incomplete_line=True):
+            yield lines
+
+
+def _read_chunks(path: str, offset: int = 0) -> Iterator[Chunk]:
+    """
+    Yields the (decompressed) content of a file starting at the given offset in big chunks. Every chunk ends with
+    a line end, except for the last one, which may contain just an incomplete last line.
+    """
+    decompressor_factory = _find_decompressor(path)
+    if path == STDIN_PATH:
+        yield from _align_to_lines(_skip(_read_stream_chunks(sys.stdin.buffer, None), offset))
+    elif decompressor_factory is not None:
+        yield from _align_to_lines(_skip(_read_compressed_chunks(path, decompressor_factory), offset))
     else:
-        return open(path, "rt")
+        yield from _read_plain_chunks(path, offset)
+
+
+def _skip(chunks: Iterator[bytes], length: int) -> Iterator[bytes]:
+    # Compressed content and streams can't be seeked, the content before the offset has to be read
+    for chunk in chunks:
+        if length >= len(chunk):
+            length -= len(chunk)
+            continue
+        yield chunk[length:] if length > 0 else chunk
+        length = 0
+
+
+def _align_to_lines(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    remainder = b""
+    for chunk in chunks:
+        if remainder:
+            chunk = remainder + chunk
+        end = chunk.rfind(b"\n") + 1
+        remainder = chunk[end:]
+        if end > 0:
+            yield chunk[:end]
+    if remainder:
+        yield remainder
+
+
+def _find_decompressor(path: str) -> Optional[Callable[[], Decompressor]]:
+    _, extension = os.path.splitext(path)
+    return DECOMPRESSORS.get(extension)
+
+
+def _read_plain_chunks(path: str, offset: int) -> Iterator[Chunk]:
+    with open(path, "rb") as handle:
+        file_stat = os.fstat(handle.fileno())
+        # Pipes and files of pseudo file systems (e.g. /proc) report no size and may not be seekable
+        if not stat.S_ISREG(file_stat.st_mode) or file_stat.st_size == 0:
+            yield from _align_to_lines(_skip(_read_stream_chunks(handle, None), offset))
+            return
+        handle.seek(offset)
+        yield from _read_buffered_chunks(handle)
+
 
+def _read_buffered_chunks(handle: io.BufferedIOBase) -> Iterator[Chunk]:
+    """
+    Reads a file into a buffer reused for all chunks, which are views of it ending with a line end. Files are not
+    memory mapped, reading a mapping of a log file truncated meanwhile (e.g. by logrotate with copytruncate) kills
+    the process with SIGBUS, while a read just ends early.
+    """
+    buffer = bytearray(CHUNK_SIZE)
+    view = memoryview(buffer)
+    length = 0
+    while True:
+        if length == len(buffer):
+            # Line longer than the buffer, earlier chunks may still reference the old one
+            buffer = bytearray(2 * len(buffer))
+            buffer[:length] = view
+            view = memoryview(buffer)
+        read_length = handle.readinto(view[length:])
+        if not read_length:
+            break
+        length += read_length
+        end = buffer.rfind(b"\n", 0, length) + 1
+        if end > 0:
+            yield view[:end]
+            # The incomplete line at the end is moved to the beginning for the next chunk
+            buffer[:length - end] = bytes(view[end:length])
+            length -= end
+    if length > 0:
+        yield view[:length]
 
-def _read_lines(path: str) -> Iterator[str]:
+
+def _read_compressed_chunks(path: str, decompressor_factory: Callable[[], Decompressor]) -> Iterator[bytes]:
+    with open(path, "rb") as handle:
+        yield from _read_stream_chunks(handle, decompressor_factory)
+
+
+def _read_stream_chunks(
+        handle: BinaryIO,
+        decompressor_factory: Optional[Callable[[], Decompressor]],
+) -> Iterator[bytes]:
+    if decompressor_factory is None:
+        while chunk := handle.read(CHUNK_SIZE):
+            yield chunk
+        return
+    decompressor = decompressor_factory()
+    has_pending_data = False
+    while data := handle.read(COMPRESSED_CHUNK_SIZE):
+        while data:
+            has_pending_data = True
+            chunk = decompressor.decompress(data)
+            if chunk:
+                yield chunk
+            data = b""
+            # Concatenated archives (e.g. multi-member gzip) continue with a new decompressor
+            if decompressor.eof:
+                data = decompressor.unused_data
+                decompressor = decompressor_factory()
+                has_pending_data = False
+    if has_pending_data:
+        raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+
+
+def _split_lines(
+        chunks: Iterator[Chunk],
+        decode_errors: str,
+        include_incomplete_line: bool,
+) -> Iterator[Tuple[List[str], int]]:
+    """
+    Decodes chunks aligned to line ends and splits them into lines without line endings. Yields the lines of every
+    chunk together with the number of bytes they took, including the line endings.
+    """
+    encoding = locale.getpreferredencoding(False)
+    for chunk in chunks:
+        if len(chunk) == 0:
+            continue
+        if chunk[-1:] != b"\n":
+            # Incomplete last line
+            if include_incomplete_line:
+                yield [str(chunk, encoding, decode_errors)], len(chunk)
+            continue
+        lines = str(chunk, encoding, decode_errors).split("\n")
+        lines.pop()  # Empty string after the last line ending
+        yield lines, len(chunk)
+
+
+def _split_line_runs(
+        chunks: Iterator[Chunk],
+        decode_errors: str,
+        include_incomplete_line: bool,
+        line_filter: Optional[LineFilter],
+) -> Iterator[Tuple[List[Tuple[int, int, List[str]]], int, int]]:
+    """
+    Same as _split_lines, but only lines accepted by the line filter are decoded. Yields for every chunk the runs of
+    consecutive accepted lines as (offset in the chunk, index of the first line in the chunk, lines), together with
+    the number of bytes and the number of lines of the whole chunk.
+    """
+    if line_filter is None:
+        for lines, length in _split_lines(chunks, decode_errors, include_incomplete_line):
+            yield [(0, 0, lines)], length, len(lines)
+        return
+    encoding = locale.getpreferredencoding(False)
+    for chunk in chunks:
+        # The filter searches the raw content, a view of the read buffer is copied for it
+        data = bytes(chunk)
+        if len(data) == 0 or (data[-1:] != b"\n" and not include_incomplete_line):
+            continue
+        accepted_runs = list(line_filter.accepted_runs(data))
+        # Accepted lines of the whole chunk are decoded at once, runs are often just a single line
+        lines = str(b"".join(data[start:end] for start, end in accepted_runs), encoding, decode_errors).split("\n")
+        runs = []
+        line_index = 0
+        position = 0
+        decoded_count = 0
+        for start, end in accepted_runs:
+            line_index += data.count(b"\n", position, start)
+            run_line_count = data.count(b"\n", start, end) + (data[end - 1:end] != b"\n")
+            runs.append((start, line_index, lines[decoded_count:decoded_count + run_line_count]))
+            decoded_count += run_line_count
+            line_index += run_line_count
+            position = end
+        yield runs, len(data), data.count(b"\n") + (data[-1:] != b"\n")
+
+
+@contextmanager
+def _handle_read_errors(path: str) -> Iterator[None]:
     try:
-        with _open_file(path) as handle:
-            while line := handle.readline():
-                yield line
+        yield
     except UnicodeDecodeError:
-        raise GraspLogIOException(f"Cannot read log events from file {path}. "
-                                  f"Only plain and rotated (.gz) logs are currently supported.")
-    except gzip.BadGzipFile:
-        raise GraspLogException(f"File {path} is not a valid gzip archive.")
+        raise GraspLogIOException(f"Cannot decode log events from file {path}. "
+                                  f"Use --decode-errors to replace or ignore invalid characters.")
+    except (zlib.error, lzma.LZMAError, OSError, EOFError) as e:
+        if _find_decompressor(path) is None:
+            raise GraspLogIOException(f"Cannot read file {path}: {e}")
+        _, extension = os.path.splitext(path)
+        raise GraspLogException(f"File {path} is not a valid {extension} archive.")
+
+
+def read_new_event_blocks_from_glob(
+        glob_path: str,
+        previous_files: List[FileState],
+        current_files: List[FileState],
+        input_files: List[InputFile],
+        decode_errors: str = DEFAULT_DECODE_ERRORS,
+        line_filter: Optional[LineFilter] = None,
+) -> Iterator[Tuple[int, int, List[str]]]:
+    """
+    Reads only the complete lines appended since the positions recorded in previous_files. Files are matched with
+    their previous state by the checksum of their leading bytes, so a rotated (renamed) file continues from where its
+    previous name was read. Files whose content does not start with a previously read content, or which are shorter
+    than the recorded position (truncated), are read from the beginning. The new positions are appended to
+    current_files once a file is fully read. Blocks of lines are yielded the same way as by read_event_blocks_from_glob.
+    """
+    unclaimed_files = [x for x in previous_files if x.offset > 0]
+    for path in find_readable_files(glob_path):
+        if path == STDIN_PATH:
+            raise GraspLogException("Standard input can't be read incrementally")
+        inode = os.stat(path).st_ino
+        file_id = len(input_files)
+        input_file = InputFile(path, decode_errors)
+        input_files.append(input_file)
+        with _handle_read_errors(path):
+            head = _read_head(path)
+            previous_file = _find_previous_file_state(path, inode, head, unclaimed_files)
+            offset = 0
+            line_count = 0
+            chunks = None
+            if previous_file is not None:
+                unclaimed_files.remove(previous_file)
+                # The byte before the recorded position must be the end of the last line read, otherwise the file
+                # is shorter than the position
+                chunks = _read_chunks(path, previous_file.offset - 1)
+                first_chunk = next(chunks, b"")
+                if first_chunk[:1] == b"\n":
+                    offset = previous_file.offset
+                    line_count = previous_file.line_count
+                    chunks = itertools.chain([first_chunk[1:]], chunks)
+                else:
+                    print_err(f"File '{path}' was truncated, reading it from the beginning")
+                    chunks = None
+            if chunks is None:
+                chunks = _read_chunks(path)
+            # An incomplete last line might still be being written, it is read in the next run
+            for runs, length, chunk_line_count in _split_line_runs(chunks, decode_errors, False, line_filter):
+                input_file.skipped_line_count += chunk_line_count - sum(len(x[2]) for x in runs)
+                for run_offset, line_index, lines in runs:
+                    input_file.block_offsets.append(offset + run_offset)
+                    input_file.block_line_nrs.append(line_count + line_index + 1)
+                    yield file_id, line_count + line_index + 1, lines
+                offset += length
+                line_count += chunk_line_count
+        head_length = min(len(head), offset)
+        current_files.append(FileState(path, inode, head_length, _checksum(head[:head_length]), offset, line_count))
+
+
+def _read_head(path: str) -> bytes:
+    if _find_decompressor(path) is None:
+        with open(path, "rb") as handle:
+            return handle.read(HEAD_SIZE)
+    head = b""
+    for chunk in _read_chunks(path):
+        head += chunk[:HEAD_SIZE - len(head)]
+        if len(head) >= HEAD_SIZE:
+            break
+    return head
+
+
+def _checksum(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+def _find_previous_file_state(
+        path: str,
+        inode: int,
+        head: bytes,
+        candidates: List[FileState],
+) -> Optional[FileState]:
+    matching = [x for x in candidates if x.head_length <= len(head) and
+                _checksum(head[:x.head_length]) == x.head_checksum]
+    for preferred in [x for x in matching if x.path == path], [x for x in matching if x.inode == inode], matching:
+        if preferred:
+            return preferred[0]
+    return None
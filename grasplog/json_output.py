@@ -1,6 +1,8 @@
+import io
 import json
-from dataclasses import dataclass, asdict
-from typing import List
+from dataclasses import dataclass
+from json.encoder import encode_basestring_ascii as _encode_string  # type:ignore
+from typing import List, Optional, Any, Dict, TextIO, Iterable
 
 
 # These classes represent user-facing API and must remain backward compatible.
@@ -8,6 +10,7 @@ from typing import List
 class LogEventJson:
     lineNumber: int
     event: str
+    path: Optional[str] = None
 
 
 @dataclass
@@ -29,7 +32,64 @@ class ClusteringJson:
     noisySamples: NoisyEventsJson
 
 
-def serialize(output: ClusteringJson) -> str:
-    d = asdict(output)
-    result = json.dumps(d, indent=2)
+def _event_to_dict(event: LogEventJson) -> Dict[str, Any]:
+    # Optional fields are left out, so that the output stays the same for consumers not knowing them
+    result: Dict[str, Any] = {"lineNumber": event.lineNumber, "event": event.event}
+    if event.path is not None:
+        result["path"] = event.path
     return result
+
+
+def _cluster_to_dict(cluster: ClusterInfoJson) -> Dict[str, Any]:
+    return {"id": cluster.id, "samples": [_event_to_dict(x) for x in cluster.samples], "totalCount": cluster.totalCount}
+
+
+def _noisy_events_to_dict(noisy_events: NoisyEventsJson) -> Dict[str, Any]:
+    return {"samples": [_event_to_dict(x) for x in noisy_events.samples], "totalCount": noisy_events.totalCount}
+
+
+def _format_samples(samples: List[LogEventJson], indent: str) -> str:
+    # Same layout as json.dumps(indent=2) produces. json.dumps falls back to a slow pure Python encoder when
+    # indenting, so the known structure is laid out here and only strings are encoded by the C encoder.
+    if not samples:
+        return "[]"
+    items = []
+    for sample in samples:
+        path = f',\n{indent}    "path": {_encode_string(sample.path)}' if sample.path is not None else ""
+        items.append(f'{indent}  {{\n{indent}    "lineNumber": {sample.lineNumber},\n'
+                     f'{indent}    "event": {_encode_string(sample.event)}{path}\n{indent}  }}')
+    return "[\n" + ",\n".join(items) + f"\n{indent}]"
+
+
+def write_json(handle: TextIO, clusters: Iterable[ClusterInfoJson], noisy_events: NoisyEventsJson) -> None:
+    """
+    Writes the same document as serialize(ClusteringJson(clusters, noisy_events)), one cluster at a time, so that
+    the whole document never has to be kept in memory.
+    """
+    handle.write('{\n  "clusters": [')
+    separator = "\n    "
+    for cluster in clusters:
+        handle.write(f'{separator}{{\n      "id": {cluster.id},\n'
+                     f'      "samples": {_format_samples(cluster.samples, "      ")},\n'
+                     f'      "totalCount": {cluster.totalCount}\n    }}')
+        separator = ",\n    "
+    handle.write("],\n" if separator == "\n    " else "\n  ],\n")
+    handle.write(f'  "noisySamples": {{\n    "samples": {_format_samples(noisy_events.samples, "    ")},\n'
+                 f'    "totalCount": {noisy_events.totalCount}\n  }}\n}}')
+
+
+def write_ndjson(handle: TextIO, clusters: Iterable[ClusterInfoJson], noisy_events: NoisyEventsJson) -> None:
+    """
+    Writes one cluster object per line, followed by a line with the noisySamples object.
+    """
+    for cluster in clusters:
+        handle.write(json.dumps(_cluster_to_dict(cluster)))
+        handle.write("\n")
+    handle.write(json.dumps({"noisySamples": _noisy_events_to_dict(noisy_events)}))
+    handle.write("\n")
+
+
+def serialize(output: ClusteringJson) -> str:
+    buffer = io.StringIO()
+    write_json(buffer, output.clusters, output.noisySamples)
+    return buffer.getvalue()
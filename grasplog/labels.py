@@ -0,0 +1,55 @@
+"""
+Export of the cluster of every event (--labels-out) as a directory of fixed-width binary columns in the NumPy .npy
+format, which can be memory mapped with np.load(path, mmap_mode="r"):
+
+- labels.npy: int32, cluster id of every event, -1 for noisy events
+- file_ids.npy: uint32, index of the file the event was read from into the table of files
+- line_numbers.npy: uint64, line number of the event in its file, starting at 1
+- files.json: table of files, {"version": 1, "files": [path of file id 0, path of file id 1, ...]}
+
+All columns have one item per event, in the order the events were read.
+"""
+import json
+import os
+from typing import Sequence, List, Optional, Dict
+
+import numpy as np
+
+from grasplog.exception import GraspLogIOException
+from grasplog.file_reader import InputFile
+
+LABELS_VERSION = 1
+
+
+def write_labels(
+        path: str,
+        event_labels: np.ndarray,
+        file_ids: Sequence[int],
+        line_nrs: Sequence[int],
+        input_files: Optional[List[InputFile]],
+) -> None:
+    """
+    Writes the columns to the directory at path, created if it does not exist. Sequences supporting the buffer
+    protocol (such as array.array) are written without copying them, unless lines of a file were numbered from the
+    start of a time window (see InputFile.absolute_line_nr).
+    """
+    columns: Dict[str, np.ndarray] = {
+        "labels.npy": np.asarray(event_labels, dtype=np.int32),
+        "file_ids.npy": np.asarray(file_ids, dtype=np.uint32),
+        "line_numbers.npy": np.asarray(line_nrs, dtype=np.uint64),
+    }
+    window_files = [(i, x) for i, x in enumerate(input_files or []) if x.window_offset > 0]
+    if window_files:
+        line_nrs_column = columns["line_numbers.npy"].copy()
+        for file_id, input_file in window_files:
+            line_nrs_column[columns["file_ids.npy"] == file_id] += np.uint64(input_file.absolute_line_nr(0))
+        columns["line_numbers.npy"] = line_nrs_column
+    files = [x.path for x in input_files] if input_files is not None else []
+    try:
+        os.makedirs(path, exist_ok=True)
+        for file_name, column in columns.items():
+            np.save(os.path.join(path, file_name), column, allow_pickle=False)
+        with open(os.path.join(path, "files.json"), "wt") as handle:
+            json.dump({"version": LABELS_VERSION, "files": files}, handle)
+    except OSError as e:
+        raise GraspLogIOException(f"Cannot write labels to {path}: {e}")
@@ -0,0 +1,109 @@
+"""
+Prefilter of lines by patterns (--include, --exclude), applied to the raw content of a file before it is decoded, so
+that rejected lines are neither decoded nor analyzed. A line is accepted if it matches any include pattern (or there
+are none) and no exclude pattern.
+
+Patterns are encoded in the system encoding (the one the content is decoded with) and searched in whole chunks of
+lines at once. Plain text patterns, optionally separated by '|' (e.g. 'ERROR|WARN'), are found by a substring search,
+other patterns are compiled as regular expressions, in which '^' and '$' match at the beginning and end of a line.
+"""
+import heapq
+import locale
+import re
+from typing import List, Iterator, Tuple, Union, Optional
+
+# Characters with a special meaning in regular expressions, patterns without them are searched as plain text
+_METACHARACTERS = frozenset(".^$*+?{}[]\\|()\n")
+
+# Plain text or a compiled regular expression
+Searcher = Union[bytes, re.Pattern]
+
+
+class LineFilter:
+    def __init__(self, includes: List[str], excludes: List[str]):
+        """
+        Raises re.error if a pattern is not a valid regular expression.
+        """
+        encoding = locale.getpreferredencoding(False)
+        self.includes = [x for pattern in includes for x in _compile(pattern, encoding)]
+        self.excludes = [x for pattern in excludes for x in _compile(pattern, encoding)]
+
+    def accepted_runs(self, data: bytes) -> Iterator[Tuple[int, int]]:
+        """
+        Yields (start, end) of the runs of consecutive accepted lines in data, which consists of whole lines except
+        for a possibly incomplete last one. The end is right after the line ending of the last line of a run.
+        """
+        size = len(data)
+        if not self.includes:
+            position = 0
+            for start, end in _matching_lines(data, self.excludes):
+                if start > position:
+                    yield position, start
+                position = min(end + 1, size)
+            if position < size:
+                yield position, size
+            return
+        lines = _matching_lines(data, self.includes)
+        if self.excludes:
+            lines = (x for x in lines if not any(_search(data, y, *x) for y in self.excludes))
+        run: Optional[Tuple[int, int]] = None
+        for start, end in lines:
+            if run is not None and run[1] != start:
+                yield run
+                run = None
+            run = (start if run is None else run[0], min(end + 1, size))
+        if run is not None:
+            yield run
+
+
+def _compile(pattern: str, encoding: str) -> List[Searcher]:
+    alternatives = pattern.split("|")
+    if not any(x in _METACHARACTERS for x in pattern.replace("|", "")):
+        return [x.encode(encoding) for x in alternatives]
+    return [re.compile(pattern.encode(encoding), re.MULTILINE)]
+
+
+def _matching_lines(data: bytes, searchers: List[Searcher]) -> Iterator[Tuple[int, int]]:
+    """
+    Yields (start, end) of the lines matching any of the searchers in ascending order, the end is the position of the
+    line ending.
+    """
+    if len(searchers) == 1:
+        yield from _lines_matching(data, searchers[0])
+        return
+    previous_start = -1
+    for start, end in heapq.merge(*(_lines_matching(data, x) for x in searchers)):
+        if start != previous_start:
+            yield start, end
+            previous_start = start
+
+
+def _lines_matching(data: bytes, searcher: Searcher) -> Iterator[Tuple[int, int]]:
+    size = len(data)
+    position = 0
+    while position < size:
+        if isinstance(searcher, bytes):
+            match_start = data.find(searcher, position)
+            match_end = match_start + len(searcher)
+        else:
+            match = searcher.search(data, position)
+            match_start, match_end = (match.start(), match.end()) if match is not None else (-1, -1)
+        if match_start < 0:
+            return
+        start = data.rfind(b"\n", 0, match_start) + 1
+        if start >= size:
+            # Empty match after the last line ending
+            return
+        end = data.find(b"\n", match_start)
+        if end < 0:
+            end = size
+        # A regular expression may match across line endings, the line itself is checked again then
+        if match_end <= end or _search(data, searcher, start, end):
+            yield start, end
+        position = end + 1
+
+
+def _search(data: bytes, searcher: Searcher, start: int, end: int) -> bool:
+    if isinstance(searcher, bytes):
+        return data.find(searcher, start, end) >= 0
+    return searcher.search(data, start, end) is not None
@@ -0,0 +1,118 @@
+import logging
+from itertools import islice
+from typing import Iterable, List, Sequence, Tuple, Dict, Optional
+
+import numpy as np
+from scipy.sparse import csr_matrix  # type:ignore
+
+from grasplog.datamodel import ClusteringAccumulator, ClusterInfo, LogEvent
+from grasplog.file_reader import InputFile
+from grasplog.ml.text_processing import AnalyzedEvent
+from grasplog.ml.vectorizer import TokenVectorizer
+
+CHUNK_SIZE = 65536  # Number of events whose new rows are looked up at once
+LOGGER = logging.getLogger(__name__)
+
+
+class PrototypeIndex:
+    """
+    Nearest prototype lookup for token rows. Prototypes are indexed by their tokens, so the overlap of a row with every
+    prototype sharing a token with it is a single sparse product, and since rows are binary, the Manhattan distance
+    follows from the overlap as |a| + |b| - 2 * |a & b|. Prototypes sharing no token with a row are at distance
+    |a| + |b|, the shortest of them is the only candidate.
+    """
+
+    def __init__(self, prototypes: Sequence[List[str]]):
+        vectorizer = TokenVectorizer()
+        for prototype in prototypes:
+            vectorizer.append(vectorizer.token_ids(prototype))
+        self.__vocabulary = vectorizer.vocabulary
+        self.__lengths = vectorizer.row_lengths()
+        self.__index = vectorizer.to_csr().T.tocsr()  # Tokens x prototypes
+        self.__shortest = int(np.argmin(self.__lengths)) if len(prototypes) > 0 else -1
+
+    def nearest(self, rows: Sequence[Sequence[str]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the index of the nearest prototype of every row and the distance to it, ties are broken by the lower
+        prototype index. The index is -1 if there are no prototypes.
+        """
+        if self.__shortest < 0:
+            return np.full(len(rows), -1), np.full(len(rows), np.inf)
+        vocabulary = self.__vocabulary
+        indptr = [0]
+        indices: List[int] = []
+        lengths = []
+        for tokens in rows:
+            distinct_tokens = set(tokens)
+            lengths.append(len(distinct_tokens))
+            # Tokens unknown to the prototypes only add to the distance
+            indices.extend(x for x in map(vocabulary.get, distinct_tokens) if x is not None)
+            indptr.append(len(indices))
+        features = csr_matrix(
+            (np.ones(len(indices), dtype=np.float32), indices, indptr), shape=(len(rows), self.__index.shape[0])
+        )
+        overlaps = (features @ self.__index).tocsr()
+        overlaps.sort_indices()
+        row_lengths = np.asarray(lengths)
+        nearest = np.full(len(rows), self.__shortest)
+        distances = (row_lengths + self.__lengths[self.__shortest]).astype(np.float64)
+        if overlaps.nnz == 0:
+            return nearest, distances
+
+        entry_counts = np.diff(overlaps.indptr)
+        entry_rows = np.repeat(np.arange(len(rows)), entry_counts)
+        entry_distances = row_lengths[entry_rows] + self.__lengths[overlaps.indices] - 2 * overlaps.data
+        non_empty = entry_counts > 0
+        row_minimums = np.minimum.reduceat(entry_distances, overlaps.indptr[:-1][non_empty])
+        # Entries of every row are sorted by prototype, so the first one with the minimal distance is the nearest
+        minimal_entries = np.flatnonzero(entry_distances == np.repeat(row_minimums, entry_counts[non_empty]))
+        firsts = minimal_entries[np.unique(entry_rows[minimal_entries], return_index=True)[1]]
+        first_rows = entry_rows[firsts]
+        first_distances = entry_distances[firsts]
+        first_prototypes = overlaps.indices[firsts]
+        better = (first_distances < distances[first_rows]) | (
+            (first_distances == distances[first_rows]) & (first_prototypes < nearest[first_rows])
+        )
+        nearest[first_rows[better]] = first_prototypes[better]
+        distances[first_rows[better]] = first_distances[better]
+        return nearest, distances
+
+
+def classify_analyzed(
+        analyzed_events: Iterable[AnalyzedEvent],
+        clusters: Sequence[ClusterInfo],
+        max_distance: float,
+        max_samples_per_cluster: int,
+        max_noisy_samples: int,
+        input_files: Optional[List[InputFile]] = None,
+) -> ClusteringAccumulator:
+    """
+    Assigns every event to the known cluster of the nearest core sample within max_distance (the prototype of a
+    cluster without core samples), or marks it as noisy. Events are processed in chunks, only rows not seen before are
+    looked up, so no clustering is involved and the memory is bounded by the number of distinct rows.
+    """
+    core_samples = [(x.cluster_id, row) for x in clusters for row in x.core_samples or [x.prototype]]
+    index = PrototypeIndex([x[1] for x in core_samples])
+    cluster_ids = [x[0] for x in core_samples]
+    labels: Dict[Tuple[str, ...], int] = {}
+    accumulator = ClusteringAccumulator(max_samples_per_cluster, max_noisy_samples)
+    events = iter(analyzed_events)
+    while True:
+        chunk = list(islice(events, CHUNK_SIZE))
+        if not chunk:
+            break
+        keys = [tuple(x[3]) for x in chunk]
+        new_keys = [x for x in dict.fromkeys(keys) if x not in labels]
+        if new_keys:
+            nearest, distances = index.nearest(new_keys)
+            for key, prototype_id, distance in zip(new_keys, nearest.tolist(), distances.tolist()):
+                labels[key] = cluster_ids[prototype_id] if distance <= max_distance else -1
+        for (file_id, line_nr, event, _), key in zip(chunk, keys):
+            path = input_files[file_id].path if input_files is not None else None
+            cluster_id = labels[key]
+            if cluster_id >= 0:
+                accumulator.report_event(cluster_id, LogEvent(line_nr, event, path))
+            else:
+                accumulator.report_noisy_event(LogEvent(line_nr, event, path))
+    LOGGER.debug(f"Classification completed events={accumulator.total_event_count()} distinct_rows={len(labels)}")
+    return accumulator
@@ -1,49 +1,275 @@
 import logging
-from typing import Iterator
+from array import array
+from collections import defaultdict, Counter
+from functools import partial
+from random import Random
+from typing import Iterable, List, Dict, Tuple, Sequence, Optional, Callable
 
-from nltk.tokenize import wordpunct_tokenize  # type:ignore
-from nltk.util import ngrams  # type:ignore
-from sklearn.cluster import DBSCAN, OPTICS  # type:ignore
-from sklearn.feature_extraction import FeatureHasher  # type:ignore
-from sklearn.feature_extraction import FeatureHasher  # type:ignore
-from sklearn.pipeline import Pipeline  # type:ignore
+import numpy as np
+from sklearn.metrics import pairwise_distances_argmin_min  # type:ignore
 
-from grasplog.datamodel import ClusteringAccumulator, LogEvent
-from grasplog.ml.text_processing import DEFAULT_ANALYZER
+from grasplog import profiling
+from grasplog.datamodel import ClusteringAccumulator, LogEvent, ClusterInfo, Partitioning, MIN_SAMPLES
+from grasplog.event_store import EventStore, load_missing_messages
+from grasplog.file_reader import InputFile
+from grasplog.labels import write_labels
+from grasplog.ml.neighbors import fit_dbscan
+from grasplog.ml.partitioning import partition_keys, cluster_partitioned, DEFAULT_PARTITION_BAND_WIDTH
+from grasplog.ml.text_processing import AnalyzedEvent, analyze_events
+from grasplog.ml.vectorizer import TokenVectorizer
 from grasplog.util import Timer
 
-N_FEATURES = 2 ** 24
-MIN_SAMPLES = 3  # Minimum number of messages to form a cluster
+SAMPLE_SEED = 0  # Sampling is repeatable, the same input gives the same clusters
 LOGGER = logging.getLogger(__name__)
 
 
+class UniqueRows:
+    """
+    Collapses events with identical analyzer output into a single row. Every unique row is stored once in a
+    TokenVectorizer, together with the number of events it represents, so that the clustering only has to deal with
+    unique rows.
+
+    With n-grams (see TokenVectorizer), the row of a token sequence is also cached by the sequence itself, so that
+    n-grams are only computed once per distinct sequence.
+    """
+
+    def __init__(self, ngram_sizes: Sequence[int] = ()):
+        self.__row_ids: Dict[Tuple[int, ...], int] = {}
+        self.__sequence_row_ids: Optional[Dict[Tuple[str, ...], int]] = {} if ngram_sizes else None
+        self.vectorizer = TokenVectorizer(ngram_sizes)
+        self.counts: List[int] = []
+
+    def add(self, tokens: List[str], count: int = 1) -> int:
+        if self.__sequence_row_ids is None:
+            return self.__add(tokens, count)
+        sequence = tuple(tokens)
+        row_id = self.__sequence_row_ids.get(sequence)
+        if row_id is None:
+            row_id = self.__sequence_row_ids[sequence] = self.__add(tokens, count)
+        else:
+            self.counts[row_id] += count
+        return row_id
+
+    def __add(self, tokens: List[str], count: int) -> int:
+        key = self.vectorizer.token_ids(tokens)
+        row_id = self.__row_ids.get(key)
+        if row_id is None:
+            row_id = self.vectorizer.append(key)
+            self.__row_ids[key] = row_id
+            self.counts.append(count)
+        else:
+            self.counts[row_id] += count
+        return row_id
+
+    def tokens(self, row_id: int) -> List[str]:
+        return self.vectorizer.tokens(row_id)
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+
 def process(
-        event_iterator: Iterator[str],
+        event_iterator: Iterable[str],
+        max_samples_per_cluster: int,
+        max_noisy_samples: int,
+        max_distance: float,
+) -> ClusteringAccumulator:
+    return process_analyzed(analyze_events(event_iterator), max_samples_per_cluster, max_noisy_samples, max_distance)
+
+
+def process_analyzed(
+        analyzed_events: Iterable[AnalyzedEvent],
         max_samples_per_cluster: int,
         max_noisy_samples: int,
         max_distance: float,
+        previous_clusters: Sequence[ClusterInfo] = (),
+        input_files: Optional[List[InputFile]] = None,
+        sample_size: int = 0,
+        partitioning: Optional[Partitioning] = None,
+        partition_band_width: int = DEFAULT_PARTITION_BAND_WIDTH,
+        jobs: int = 1,
+        labels_path: Optional[str] = None,
+        ngram_sizes: Sequence[int] = (),
+        keep_core_samples: bool = False,
 ) -> ClusteringAccumulator:
-    events_original = []
-    tokens_list = []
+    """
+    Clusters the analyzed events. Clusters and noisy rows of a previous run can be passed in previous_clusters, their
+    prototypes are then clustered together with the new events, weighted by the number of events they represent.
+    If the events were read from input_files, only their locations are kept and the samples are read again at the end.
+    If sample_size is set, only a random sample of that many events is clustered, see _cluster_sample.
+    With partitioning, rows are split into buckets clustered separately in a pool of `jobs` processes, see
+    grasplog.ml.partitioning. The cluster of every event is written to labels_path if set, see grasplog.labels.
+    Rows also get a feature for every n-gram of their tokens of the sizes in ngram_sizes, see TokenVectorizer.
+    With keep_core_samples, the tokens of the core samples of every cluster are kept for a model, see grasplog.model.
+    """
+    events = EventStore(input_files)
+    event_rows = array("I")
+    unique_rows = UniqueRows(ngram_sizes)
+    previous_rows = [(unique_rows.add(x.prototype, x.total_event_count), x) for x in previous_clusters]
 
     analysis_timer = Timer()
-    for event in event_iterator:
-        event = event.strip()
-        events_original.append(event)
-        tokens_list.append(DEFAULT_ANALYZER.analyze(event))
+    with profiling.stage("analysis"):
+        for file_id, line_nr, event, tokens in analyzed_events:
+            events.append(file_id, line_nr, event)
+            event_rows.append(unique_rows.add(tokens))
+    profiling.record("uniqueRows", len(unique_rows))
+    profiling.record("uniqueTokens", len(unique_rows.vectorizer.vocabulary))
     LOGGER.debug(f"Text analysis completed duration={analysis_timer.elapsed_ms()}ms")
+    if len(events) > 0:
+        LOGGER.debug(f"Deduplication completed events={len(events)} unique_rows={len(unique_rows)} "
+                     f"ratio={len(events) / len(unique_rows):.2f}")
 
-    feature_hasher = FeatureHasher(input_type="string", n_features=N_FEATURES)
-    sparse_matrix = feature_hasher.transform(tokens_list)
+    accumulator = ClusteringAccumulator(max_samples_per_cluster, max_noisy_samples)
+    if len(unique_rows) == 0:
+        return accumulator
 
     clustering_timer = Timer()
-    clustering = DBSCAN(min_samples=MIN_SAMPLES, eps=max_distance, metric="l1").fit(sparse_matrix)
+    cluster_rows = partial(
+        _cluster_rows, unique_rows.vectorizer, max_distance=max_distance, partitioning=partitioning,
+        partition_band_width=partition_band_width, jobs=jobs,
+    )
+    if 0 < sample_size < len(event_rows):
+        seeded_row_ids = [row_id for row_id, _ in previous_rows]
+        labels, core_row_ids = _cluster_sample(
+            unique_rows, event_rows, seeded_row_ids, sample_size, max_distance, cluster_rows
+        )
+    else:
+        labels, core_row_ids = cluster_rows(None, unique_rows.counts)
     LOGGER.debug(f"Clustering completed duration={clustering_timer.elapsed_ms()}ms")
-    accumulator = ClusteringAccumulator(max_samples_per_cluster, max_noisy_samples)
-    for cluster_id, line_nr, event in zip(clustering.labels_, range(1, len(events_original) + 1), events_original):
-        event2 = LogEvent(line_nr, event)
+    with profiling.stage("accumulation"):
+        _report_events(accumulator, unique_rows, events, event_rows, labels, previous_rows)
+        if keep_core_samples:
+            for row_id in core_row_ids:
+                accumulator.clusters[labels[row_id]].core_samples.append(unique_rows.tokens(row_id))
+    if labels_path is not None:
+        with profiling.stage("labels"):
+            event_labels = np.asarray(labels, dtype=np.int32)[np.asarray(event_rows)]
+            write_labels(labels_path, event_labels, events.file_ids, events.line_nrs, input_files)
+    if input_files is not None:
+        with profiling.stage("sampleReading"):
+            load_missing_messages(accumulator.iter_samples(), input_files)
+    return accumulator
+
+
+def _report_events(
+        accumulator: ClusteringAccumulator,
+        unique_rows: UniqueRows,
+        events: EventStore,
+        event_rows: Sequence[int],
+        labels: Sequence[int],
+        previous_rows: List[Tuple[int, ClusterInfo]],
+) -> None:
+    noisy_row_samples: Dict[int, List[LogEvent]] = defaultdict(list)
+    for row_id, previous_cluster in previous_rows:
+        cluster_id = labels[row_id]
         if cluster_id >= 0:
-            accumulator.report_event(int(cluster_id), event2)
+            accumulator.report_cluster(cluster_id, previous_cluster)
         else:
-            accumulator.report_noisy_event(event2)
-    return accumulator
+            accumulator.report_noisy_cluster(previous_cluster)
+            noisy_row_samples[row_id].extend(previous_cluster.samples)
+    for index, row_id in enumerate(event_rows):
+        cluster_id = labels[row_id]
+        log_event = events.event(index)
+        if cluster_id >= 0:
+            accumulator.report_event(cluster_id, log_event)
+        else:
+            accumulator.report_noisy_event(log_event)
+            noisy_row_samples[row_id].append(log_event)
+    _assign_prototypes(accumulator, unique_rows, labels, noisy_row_samples)
+
+
+def _cluster_rows(
+        vectorizer: TokenVectorizer,
+        row_ids: Optional[Sequence[int]],
+        counts: Sequence[int],
+        max_distance: float,
+        partitioning: Optional[Partitioning],
+        partition_band_width: int,
+        jobs: int,
+) -> Tuple[List[int], List[int]]:
+    """
+    Clusters the given rows of the vectorizer (all rows if row_ids is None), counts are their numbers of events.
+    Returns the labels of the rows and the sorted indices of the core samples among them.
+    """
+    with profiling.stage("vectorization"):
+        features = vectorizer.to_csr(row_ids)
+    profiling.record("matrixShape", list(features.shape))
+    profiling.record("matrixNnz", features.nnz)
+    with profiling.stage("clustering"):
+        if partitioning is None:
+            # Duplicated events are at distance 0 from each other, so weighting a unique row by its number of
+            # occurrences gives the same core samples as clustering every single event.
+            clustering = fit_dbscan(features, counts, max_distance, MIN_SAMPLES)
+            return clustering.labels_.tolist(), clustering.core_sample_indices_.tolist()
+        keys = partition_keys(vectorizer, row_ids, partitioning, max_distance, partition_band_width)
+        return cluster_partitioned(features, counts, keys, max_distance, MIN_SAMPLES, jobs)
+
+
+def _cluster_sample(
+        unique_rows: UniqueRows,
+        event_rows: Sequence[int],
+        seeded_row_ids: List[int],
+        sample_size: int,
+        max_distance: float,
+        cluster_rows: Callable[[Optional[Sequence[int]], Sequence[int]], Tuple[List[int], List[int]]],
+) -> Tuple[List[int], List[int]]:
+    """
+    Clusters rows of a uniform random sample of events, seeded rows (clusters of a previous run) are always part of
+    it. The most frequent row of every sampled cluster becomes its prototype and each row outside of the sample is
+    assigned to the cluster of the nearest prototype within max_distance, or marked as noisy. Only the sample goes
+    through the neighbor search of DBSCAN, the rest costs one distance per prototype. Returns the labels of all rows
+    and the ids of the core rows of the sample.
+    """
+    random = Random(SAMPLE_SEED)
+    sample_counts = Counter(event_rows[x] for x in random.sample(range(len(event_rows)), sample_size))
+    for row_id in seeded_row_ids:
+        sample_counts[row_id] = unique_rows.counts[row_id]
+    sample_row_ids = list(sample_counts)
+    sample_labels, sample_core_samples = cluster_rows(sample_row_ids, [sample_counts[x] for x in sample_row_ids])
+    core_row_ids = [sample_row_ids[x] for x in sample_core_samples]
+
+    labels = [-1] * len(unique_rows)
+    prototype_row_ids: Dict[int, int] = {}
+    for row_id, cluster_id in zip(sample_row_ids, sample_labels):
+        labels[row_id] = cluster_id
+        if cluster_id < 0:
+            continue
+        prototype_row_id = prototype_row_ids.get(cluster_id)
+        if prototype_row_id is None or sample_counts[row_id] > sample_counts[prototype_row_id]:
+            prototype_row_ids[cluster_id] = row_id
+    remaining_row_ids = [x for x in range(len(unique_rows)) if x not in sample_counts]
+    LOGGER.debug(f"Sample clustered sample_rows={len(sample_row_ids)} clusters={len(prototype_row_ids)} "
+                 f"remaining_rows={len(remaining_row_ids)}")
+    if not prototype_row_ids or not remaining_row_ids:
+        return labels, core_row_ids
+
+    cluster_ids = list(prototype_row_ids)
+    with profiling.stage("vectorization"):
+        remaining_features = unique_rows.vectorizer.to_csr(remaining_row_ids)
+        prototype_features = unique_rows.vectorizer.to_csr([prototype_row_ids[x] for x in cluster_ids])
+    with profiling.stage("clustering"):
+        nearest, distances = pairwise_distances_argmin_min(remaining_features, prototype_features, metric="manhattan")
+    for row_id, prototype_id, distance in zip(remaining_row_ids, nearest.tolist(), distances.tolist()):
+        if distance <= max_distance:
+            labels[row_id] = cluster_ids[prototype_id]
+    return labels, core_row_ids
+
+
+def _assign_prototypes(
+        accumulator: ClusteringAccumulator,
+        unique_rows: UniqueRows,
+        labels: Sequence[int],
+        noisy_row_samples: Dict[int, List[LogEvent]],
+) -> None:
+    # The most frequent row of every cluster represents the cluster
+    prototype_counts: Dict[int, int] = {}
+    for row_id, (cluster_id, count) in enumerate(zip(labels, unique_rows.counts)):
+        if cluster_id < 0:
+            # Noisy rows have less than MIN_SAMPLES events, otherwise they would be core samples (unless they were
+            # left out of a clustered sample)
+            accumulator.noisy_rows.append(
+                ClusterInfo(-1, count, noisy_row_samples[row_id][:MIN_SAMPLES], unique_rows.tokens(row_id))
+            )
+        elif count > prototype_counts.get(cluster_id, 0):
+            prototype_counts[cluster_id] = count
+            accumulator.clusters[cluster_id].prototype = unique_rows.tokens(row_id)
@@ -0,0 +1,49 @@
+"""
+Masking of variable fields, kept apart from grasplog.ml.text_processing so that the command line can list the
+supported field classes without importing nltk.
+"""
+import re
+from typing import Iterable
+
+# Variable field classes masked by MaskingCharFilter, in the order of precedence. Fields are only matched where no
+# word character, dot, colon or slash precedes them (see MaskingCharFilter) and case insensitively, so the filter can
+# be used both before and after LowerCasingFilter.
+MASKED_FIELD_PATTERNS = {
+    "timestamp": "\\d{4}-\\d{2}-\\d{2}(?:[t ]\\d{2}:\\d{2}(?::\\d{2}(?:[.,]\\d+)?)?)?(?:z|[+-]\\d{2}:?\\d{2}(?!\\d))?",
+    "uuid": "[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}(?!\\w)",
+    "ip": "(?:\\d{1,3}\\.){3}\\d{1,3}(?![\\w.])"
+          "|(?:[0-9a-f]{1,4}:){7}[0-9a-f]{1,4}(?![\\w:])"
+          "|(?=[0-9a-f:]*[0-9a-f])(?:[0-9a-f]{1,4}(?::[0-9a-f]{1,4})*)?::(?:[0-9a-f]{1,4}(?::[0-9a-f]{1,4})*)?"
+          "(?![\\w:])",
+    "hex": "(?:0x[0-9a-f]+|(?=[0-9a-f]*\\d)(?=[0-9a-f]*[a-f])[0-9a-f]{8,})(?!\\w)",
+    "path": "(?:/[\\w.-]+){2,}/?|[a-z]:\\\\[\\w.\\\\-]*",
+}
+
+
+class MaskingCharFilter:
+    """
+    Replaces variable fields (timestamps, UUIDs, IP addresses, hexadecimal ids and paths) with a placeholder token
+    of their class, such as _ip_, in a single scan of the event. Events differing only in these fields then produce
+    the same tokens.
+    """
+
+    def __init__(self, fields: Iterable[str] = tuple(MASKED_FIELD_PATTERNS)):
+        fields = set(fields)
+        unknown_fields = fields - MASKED_FIELD_PATTERNS.keys()
+        if unknown_fields:
+            raise ValueError(f"Unknown masked fields: {', '.join(sorted(unknown_fields))}")
+        self.fields = [x for x in MASKED_FIELD_PATTERNS if x in fields]
+        # Checking the preceding character first skips positions inside of words without trying any field pattern
+        self.__pattern = re.compile(
+            "(?<![\\w.:/])(?:" + "|".join(f"(?P<{x}>{MASKED_FIELD_PATTERNS[x]})" for x in self.fields) + ")",
+            re.IGNORECASE,
+        )
+        self.__placeholders = {x: f"_{x}_" for x in self.fields}
+
+    def filter(self, event: str) -> str:
+        return self.__pattern.sub(self.__placeholder, event)
+
+    def __placeholder(self, match: re.Match) -> str:
+        field_name = match.lastgroup
+        assert field_name is not None  # Every alternative of the pattern is a named group
+        return self.__placeholders[field_name]
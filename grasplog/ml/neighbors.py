@@ -0,0 +1,124 @@
+"""
+Exact radius neighbor search for binary token rows. The Manhattan distance of two binary rows a and b is the size of
+their symmetric difference, |a| + |b| - 2 * |a & b|, so rows within max_distance have nearly equal lengths and share
+almost all of their tokens. Candidates are found in an inverted index of row prefixes instead of computing distances
+of all pairs, which is what DBSCAN does for the l1 metric on sparse matrices.
+"""
+import logging
+import math
+from typing import List, Tuple, Sequence, Union
+
+import numpy as np
+from scipy.sparse import csr_matrix, coo_matrix  # type:ignore
+from sklearn.cluster import DBSCAN  # type:ignore
+
+BLOCK_SIZE = 4096  # Number of rows whose candidates are generated at once
+PAIR_CHUNK_SIZE = 65536  # Number of candidate pairs verified at once
+LOGGER = logging.getLogger(__name__)
+
+
+def radius_neighbors_graph(features: csr_matrix, max_distance: float) -> csr_matrix:
+    """
+    Returns a sparse matrix with the distances of all pairs of distinct rows within max_distance, other pairs are not
+    stored. Values of features must be 0 or 1.
+
+    Tokens are ordered by the number of rows containing them, rarest first. Rows a and b within max_distance share at
+    least t = ceil((|a| + |b| - max_distance) / 2) tokens, so if t >= 1, the first |a| - t + 1 tokens of a and the
+    first |b| - t + 1 tokens of b have a token in common (prefix filtering). As |b| >= |a| - max_distance, t is at least
+    |a| - floor(max_distance) and prefixes of floor(max_distance) + 1 tokens suffice for any pair. Rows short enough
+    to be within max_distance without a common token are paired directly.
+    """
+    row_count = features.shape[0]
+    features = csr_matrix(features)
+    features.sort_indices()
+    lengths = np.diff(features.indptr)
+    prefix_length = math.floor(max_distance) + 1
+
+    # Rank of every token in the global order, rarest first
+    frequencies = np.bincount(features.indices, minlength=features.shape[1])
+    ranks = np.empty(features.shape[1], dtype=np.int64)
+    ranks[np.argsort(frequencies, kind="stable")] = np.arange(features.shape[1])
+    entry_rows = np.repeat(np.arange(row_count), lengths)
+    order = np.lexsort((ranks[features.indices], entry_rows))
+    in_prefix = np.arange(len(order)) - features.indptr[entry_rows] < prefix_length
+    prefix_indptr = np.zeros(row_count + 1, dtype=np.int64)
+    np.cumsum(np.minimum(lengths, prefix_length), out=prefix_indptr[1:])
+    prefixes = csr_matrix(
+        (np.ones(prefix_indptr[-1], dtype=np.float32), features.indices[order][in_prefix], prefix_indptr),
+        shape=features.shape,
+    )
+    prefixes_transposed = prefixes.T.tocsr()
+
+    row_ids: List[np.ndarray] = []
+    neighbor_ids: List[np.ndarray] = []
+    distances: List[np.ndarray] = []
+    candidate_count = 0
+    for start in range(0, row_count, BLOCK_SIZE):
+        # Only pairs with the neighbor after the row, the graph is symmetric. Pairs of short rows are added later.
+        candidates = (prefixes[start:start + BLOCK_SIZE] @ prefixes_transposed).tocoo()
+        left = candidates.row.astype(np.int64) + start
+        right = candidates.col.astype(np.int64)
+        keep = (right > left) & (np.abs(lengths[left] - lengths[right]) <= max_distance) & (
+            lengths[left] + lengths[right] > max_distance
+        )
+        left, right = left[keep], right[keep]
+        candidate_count += len(left)
+        block_distances = _distances(features, lengths, left, right)
+        within = block_distances <= max_distance
+        row_ids.append(left[within])
+        neighbor_ids.append(right[within])
+        distances.append(block_distances[within])
+    short_rows, short_neighbors = _short_pairs(lengths, max_distance)
+    row_ids.append(short_rows)
+    neighbor_ids.append(short_neighbors)
+    distances.append(_distances(features, lengths, short_rows, short_neighbors))
+
+    rows = np.concatenate(row_ids)
+    neighbors = np.concatenate(neighbor_ids)
+    data = np.concatenate(distances)
+    LOGGER.debug(f"Neighbor graph built rows={row_count} candidates={candidate_count + len(short_rows)} "
+                 f"pairs={len(rows)}")
+    graph = coo_matrix(
+        (np.concatenate([data, data]), (np.concatenate([rows, neighbors]), np.concatenate([neighbors, rows]))),
+        shape=(row_count, row_count),
+    ).tocsr()
+    graph.sort_indices()
+    return graph
+
+
+def _distances(features: csr_matrix, lengths: np.ndarray, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    # Rows of the pairs are copied, so pairs are verified in chunks to bound the memory
+    overlaps = [np.zeros(0)]
+    for start in range(0, len(left), PAIR_CHUNK_SIZE):
+        end = start + PAIR_CHUNK_SIZE
+        overlaps.append(np.asarray(features[left[start:end]].multiply(features[right[start:end]]).sum(axis=1)).ravel())
+    return (lengths[left] + lengths[right] - 2 * np.concatenate(overlaps)).astype(np.float64)
+
+
+def _short_pairs(lengths: np.ndarray, max_distance: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns pairs of rows (the first one lower) whose lengths add up to at most max_distance, they are within
+    max_distance even without any common token and can't be found through prefixes.
+    """
+    short_row_ids = np.flatnonzero(lengths <= max_distance)
+    rows: List[np.ndarray] = [np.zeros(0, dtype=np.int64)]
+    neighbors: List[np.ndarray] = [np.zeros(0, dtype=np.int64)]
+    for row_id in short_row_ids.tolist():
+        partners = short_row_ids[(short_row_ids > row_id) & (lengths[short_row_ids] + lengths[row_id] <= max_distance)]
+        rows.append(np.full(len(partners), row_id, dtype=np.int64))
+        neighbors.append(partners)
+    return np.concatenate(rows), np.concatenate(neighbors)
+
+
+def fit_dbscan(
+        features: csr_matrix,
+        counts: Union[Sequence[int], np.ndarray],
+        max_distance: float,
+        min_samples: int,
+) -> DBSCAN:
+    """
+    Runs DBSCAN with the Manhattan distance on binary rows, weighted by counts. The labels are the same as with
+    metric="l1", as DBSCAN only depends on the set of neighbors of every row.
+    """
+    graph = radius_neighbors_graph(features, max_distance)
+    return DBSCAN(min_samples=min_samples, eps=max_distance, metric="precomputed").fit(graph, sample_weight=counts)
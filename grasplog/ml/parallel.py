@@ -0,0 +1,153 @@
+import itertools
+import logging
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future
+from dataclasses import dataclass
+from typing import Iterator, List, Tuple, Dict, Deque, Optional, TYPE_CHECKING
+
+from grasplog.file_reader import (
+    find_readable_files, check_not_empty, DEFAULT_DECODE_ERRORS, InputFile, read_indexed_line_blocks, STDIN_PATH
+)
+from grasplog.line_filter import LineFilter
+from grasplog.timestamps import TimeWindow
+from grasplog.ml.text_processing import EventAnalyzer, AnalyzedEvent, COMPILED_DEFAULT_ANALYZER, CachingAnalyzer
+
+if TYPE_CHECKING:
+    from grasplog.feature_cache import FeatureCache
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class AnalyzedFile:
+    """
+    Result of reading and analyzing a single file in a worker process. Token lists are deduplicated within the file,
+    so that only one copy of each distinct token list has to be sent back to the parent process. The events themselves
+    are sent back only if they can't be read from the file again. Events are consecutive lines of the file, all of them
+    unless only a time window was read, or only the lines recorded in line_nrs if lines were filtered.
+    """
+    input_file: InputFile
+    unique_tokens: List[Tuple[str, ...]]
+    rows: array  # Index into unique_tokens for every event
+    events: Optional[List[str]] = None
+    first_line_nr: int = 1
+    line_nrs: Optional[array] = None  # Line number of every event, None if they are consecutive from first_line_nr
+
+    def iter_analyzed_events(self, file_id: int) -> Iterator[AnalyzedEvent]:
+        unique_tokens = [list(x) for x in self.unique_tokens]
+        events = self.events if self.events is not None else itertools.repeat(None)
+        line_nrs = self.line_nrs if self.line_nrs is not None else itertools.count(self.first_line_nr)
+        for line_nr, event, row in zip(line_nrs, events, self.rows):
+            yield file_id, line_nr, event, unique_tokens[row]
+
+
+def analyze_file(
+        path: str,
+        analyzer: EventAnalyzer = COMPILED_DEFAULT_ANALYZER,
+        decode_errors: str = DEFAULT_DECODE_ERRORS,
+        cache: Optional["FeatureCache"] = None,
+        time_window: Optional[TimeWindow] = None,
+        line_filter: Optional[LineFilter] = None,
+) -> AnalyzedFile:
+    """
+    Reads and analyzes the file at path, or loads the result of a previous run from the cache if there is one.
+    Files are never cached if only a time window or only lines accepted by a filter are read.
+    """
+    if time_window is not None or line_filter is not None:
+        cache = None
+    cache_key = cache.key(path, decode_errors) if cache is not None else None
+    if cache_key is not None:
+        assert cache is not None
+        cached_file = cache.load(cache_key, path, decode_errors)
+        if cached_file is not None:
+            return cached_file
+    input_file = InputFile(path, decode_errors)
+    events: Optional[List[str]] = None if input_file.is_rereadable() else []
+    row_ids: Dict[Tuple[str, ...], int] = {}
+    rows = array("I")
+    first_line_nr = None
+    line_nrs = array("Q") if line_filter is not None else None
+    for line_nr, lines in read_indexed_line_blocks(input_file, time_window, line_filter):
+        if first_line_nr is None:
+            first_line_nr = line_nr
+        if line_nrs is not None:
+            line_nrs.extend(range(line_nr, line_nr + len(lines)))
+        for line in lines:
+            event = line.strip()
+            if events is not None:
+                events.append(event)
+            tokens = tuple(analyzer.analyze(event))
+            row = row_ids.get(tokens)
+            if row is None:
+                row = row_ids[tokens] = len(row_ids)
+            rows.append(row)
+    if isinstance(analyzer, CachingAnalyzer):
+        analyzer.log_statistics()
+    analyzed_file = AnalyzedFile(input_file, list(row_ids), rows, events, first_line_nr or 1, line_nrs)
+    if cache_key is not None:
+        assert cache is not None
+        cache.store(cache_key, analyzed_file)
+    return analyzed_file
+
+
+def analyze_events_from_glob(
+        glob_path: str,
+        jobs: int,
+        input_files: List[InputFile],
+        analyzer: EventAnalyzer = COMPILED_DEFAULT_ANALYZER,
+        decode_errors: str = DEFAULT_DECODE_ERRORS,
+        cache: Optional["FeatureCache"] = None,
+        time_window: Optional[TimeWindow] = None,
+        line_filter: Optional[LineFilter] = None,
+) -> Iterator[AnalyzedEvent]:
+    """
+    Reads and analyzes matched files in a pool of `jobs` processes, or file by file in this process if jobs is 1 or
+    the standard input is read.
+    Results are yielded in the same order as with sequential reading, at most 2 * `jobs` files are processed ahead of
+    the consumer. Every read file is appended to input_files, so that the events which are not sent back from the
+    workers can be read again. Files found in the cache are not read at all, see grasplog.feature_cache.
+    """
+    paths = find_readable_files(glob_path)
+    line_count = 0
+    # Worker processes don't share the standard input of this process, it is always read here
+    if jobs > 1 and STDIN_PATH not in paths:
+        analyzed_files = _analyze_files_in_pool(paths, jobs, analyzer, decode_errors, cache, time_window, line_filter)
+    else:
+        analyzed_files = (analyze_file(x, analyzer, decode_errors, cache, time_window, line_filter) for x in paths)
+    for analyzed_file in analyzed_files:
+        LOGGER.debug(f"File analyzed path={analyzed_file.input_file.path} events={len(analyzed_file.rows)} "
+                     f"unique_rows={len(analyzed_file.unique_tokens)}")
+        line_count += len(analyzed_file.rows)
+        file_id = len(input_files)
+        input_files.append(analyzed_file.input_file)
+        yield from analyzed_file.iter_analyzed_events(file_id)
+    check_not_empty(line_count, time_window, line_filter)
+
+
+def _analyze_files_in_pool(
+        paths: List[str],
+        jobs: int,
+        analyzer: EventAnalyzer,
+        decode_errors: str,
+        cache: Optional["FeatureCache"],
+        time_window: Optional[TimeWindow],
+        line_filter: Optional[LineFilter],
+) -> Iterator[AnalyzedFile]:
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending: Deque[Future] = deque()
+        remaining_paths = iter(paths)
+
+        def submit_next() -> None:
+            path = next(remaining_paths, None)
+            if path is not None:
+                pending.append(executor.submit(
+                    analyze_file, path, analyzer, decode_errors, cache, time_window, line_filter
+                ))
+
+        for _ in range(2 * jobs):
+            submit_next()
+        while pending:
+            analyzed_file: AnalyzedFile = pending.popleft().result()
+            submit_next()
+            yield analyzed_file
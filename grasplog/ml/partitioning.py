@@ -0,0 +1,114 @@
+import logging
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import List, Optional, Sequence, Tuple, Dict, Hashable
+
+import numpy as np
+from scipy.sparse import csr_matrix  # type:ignore
+
+from grasplog import profiling
+from grasplog.options import Partitioning, DEFAULT_PARTITION_BAND_WIDTH
+from grasplog.ml.neighbors import fit_dbscan
+from grasplog.ml.vectorizer import TokenVectorizer
+
+LOGGER = logging.getLogger(__name__)
+
+
+def partition_keys(
+        vectorizer: TokenVectorizer,
+        row_ids: Optional[Sequence[int]],
+        partitioning: Partitioning,
+        max_distance: float,
+        band_width: int = DEFAULT_PARTITION_BAND_WIDTH,
+) -> List[Hashable]:
+    """
+    Returns the bucket of every row (all rows of the vectorizer if row_ids is None). Rows are binary, so the Manhattan
+    distance of two rows is at least the difference of their token counts. Exact partitioning therefore splits rows
+    only where the gap between two consecutive token counts is larger than max_distance and gives the same clusters
+    as clustering all rows at once. The other modes bound the bucket sizes instead, rows in different token count bands
+    of band_width (and with a different leading token) can't end up in the same cluster.
+    """
+    lengths = vectorizer.row_lengths()
+    leading_token_ids = vectorizer.leading_token_ids()
+    if row_ids is not None:
+        lengths = lengths[row_ids]
+        leading_token_ids = leading_token_ids[row_ids]
+    if partitioning == Partitioning.exact:
+        distinct_lengths = np.unique(lengths)
+        group_starts = np.concatenate([[True], np.diff(distinct_lengths) > max_distance])
+        groups = np.cumsum(group_starts)[np.searchsorted(distinct_lengths, lengths)]
+        return groups.tolist()
+    bands = (lengths // band_width).tolist()
+    if partitioning == Partitioning.leading_token:
+        return list(zip(bands, leading_token_ids.tolist()))
+    return bands
+
+
+def cluster_partitioned(
+        features: csr_matrix,
+        counts: Sequence[int],
+        keys: Sequence[Hashable],
+        max_distance: float,
+        min_samples: int,
+        jobs: int = 1,
+) -> Tuple[List[int], List[int]]:
+    """
+    Runs DBSCAN separately for rows with the same key, in a pool of `jobs` processes if jobs > 1. Clusters are
+    numbered by their first core sample, the same way DBSCAN numbers clusters of all rows at once. Returns the labels
+    of the rows and the sorted indices of the core samples.
+    """
+    buckets: Dict[Hashable, List[int]] = defaultdict(list)
+    for row_id, key in enumerate(keys):
+        buckets[key].append(row_id)
+    bucket_row_ids = list(buckets.values())
+    profiling.record("partitionBuckets", len(bucket_row_ids))
+    LOGGER.debug(f"Rows partitioned rows={len(keys)} buckets={len(bucket_row_ids)} "
+                 f"largest_bucket={max(len(x) for x in bucket_row_ids)}")
+
+    count_array = np.asarray(counts)
+    arguments = (
+        [features[x] for x in bucket_row_ids],
+        [count_array[x] for x in bucket_row_ids],
+        repeat(max_distance),
+        repeat(min_samples),
+    )
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            chunk_size = max(1, len(bucket_row_ids) // (4 * jobs))
+            results = list(executor.map(_cluster_bucket, *arguments, chunksize=chunk_size))
+    else:
+        results = list(map(_cluster_bucket, *arguments))
+
+    first_core_samples: Dict[Tuple[int, int], int] = {}  # First core sample by bucket and cluster in the bucket
+    core_samples: List[int] = []
+    for bucket_id, (row_ids, (bucket_labels, bucket_core_samples)) in enumerate(zip(bucket_row_ids, results)):
+        for core_sample in bucket_core_samples:
+            first_core_samples.setdefault((bucket_id, bucket_labels[core_sample]), row_ids[core_sample])
+            core_samples.append(row_ids[core_sample])
+    ordered_clusters = sorted(first_core_samples, key=lambda x: first_core_samples[x])
+    cluster_ids = {x: cluster_id for cluster_id, x in enumerate(ordered_clusters)}
+
+    labels = [-1] * len(keys)
+    for bucket_id, (row_ids, (bucket_labels, _)) in enumerate(zip(bucket_row_ids, results)):
+        for row_id, bucket_label in zip(row_ids, bucket_labels):
+            if bucket_label >= 0:
+                labels[row_id] = cluster_ids[bucket_id, bucket_label]
+    return labels, sorted(core_samples)
+
+
+def _cluster_bucket(
+        features: csr_matrix,
+        counts: np.ndarray,
+        max_distance: float,
+        min_samples: int,
+) -> Tuple[List[int], List[int]]:
+    """
+    Returns labels of the rows and the sorted indices of the core samples.
+    """
+    if features.shape[0] == 1:
+        # A single row is a cluster on its own if it represents enough events
+        is_core = bool(counts[0] >= min_samples)
+        return [0 if is_core else -1], [0] if is_core else []
+    clustering = fit_dbscan(features, counts, max_distance, min_samples)
+    return clustering.labels_.tolist(), clustering.core_sample_indices_.tolist()
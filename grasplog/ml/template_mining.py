@@ -0,0 +1,187 @@
+import logging
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Dict, Iterator, Sequence
+
+from grasplog import profiling
+from grasplog.datamodel import ClusteringAccumulator, LogEvent, MIN_SAMPLES
+from grasplog.event_store import load_missing_messages
+from grasplog.file_reader import InputFile
+from grasplog.ml.text_processing import AnalyzedEvent, analyze_events
+from grasplog.util import Timer
+
+DEFAULT_DEPTH = 3  # Root node, token count node and one level of leading tokens
+DEFAULT_MAX_CHILDREN = 100
+WILDCARD = None  # Template position matching any token
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class Template:
+    template_id: int
+    tokens: List[Optional[str]]
+
+
+class _Node:
+    def __init__(self) -> None:
+        self.children: Dict[Optional[str], "_Node"] = {}
+        self.templates: List[Template] = []
+
+
+class TemplateMiner:
+    """
+    Single pass log template miner based on the fixed depth parse tree of Drain:
+    https://jiemingzhu.github.io/pub/pjhe_icws2017.pdf
+
+    Events are first routed by their token count and then by their leading tokens, so the memory and the time per
+    event depend on the number of templates rather than on the number of processed events. An event matches a template
+    of the same token count if they differ in at most max_distance // 2 tokens, the same budget as the Manhattan
+    distance between the token vectors of the dbscan engine gives to replaced tokens. A differing leading token is
+    charged to that budget like any other one. Unlike dbscan, events of different token counts (e.g. a message with
+    and without an optional field) never share a template.
+
+    Templates created before their variable tokens were known converge later, like the clusters DBSCAN joins through
+    chains of neighbors. They are merged then, cluster_id maps the id of a merged template to the surviving one.
+    """
+
+    def __init__(self, max_distance: float, depth: int = DEFAULT_DEPTH, max_children: int = DEFAULT_MAX_CHILDREN):
+        # Replacing one token by another one corresponds to a Manhattan distance of 2 between the token vectors
+        self.__max_mismatches = int(max_distance // 2)
+        self.__prefix_length = depth - 2
+        self.__max_children = max_children
+        self.__length_nodes: Dict[int, _Node] = {}
+        self.__merged_into: Dict[int, int] = {}
+        self.templates: List[Template] = []
+
+    def add(self, tokens: List[str]) -> Template:
+        length_node = self.__length_nodes.get(len(tokens))
+        if length_node is None:
+            length_node = self.__length_nodes[len(tokens)] = _Node()
+        keys = [self.__key(x) for x in tokens[:self.__prefix_length]]
+        best_template = None
+        best_mismatches = self.__max_mismatches + 1
+        for leaf in self.__leaves(length_node, keys, self.__max_mismatches):
+            for template in leaf.templates:
+                mismatches = self.__count_mismatches(template, tokens, best_mismatches)
+                if mismatches < best_mismatches:
+                    best_template = template
+                    best_mismatches = mismatches
+            if best_mismatches == 0:
+                break
+        if best_template is None:
+            best_template = Template(len(self.templates), list(tokens))
+            self.templates.append(best_template)
+            self.__find_leaf(length_node, keys).templates.append(best_template)
+        elif best_mismatches > 0:
+            self.__generalize(best_template, tokens)
+            self.__merge_matching(best_template, length_node)
+        return best_template
+
+    def cluster_id(self, template_id: int) -> int:
+        """
+        Returns the id of the template the given one was merged into, or the id itself.
+        """
+        while template_id in self.__merged_into:
+            template_id = self.__merged_into[template_id]
+        return template_id
+
+    def __merge_matching(self, template: Template, length_node: _Node) -> None:
+        keys = [self.__key(x) for x in template.tokens[:self.__prefix_length]]
+        limit = self.__max_mismatches + 1
+        for leaf in self.__leaves(length_node, keys, self.__max_mismatches):
+            for other in list(leaf.templates):
+                if other is not template and self.__count_mismatches(other, template.tokens, limit) < limit:
+                    leaf.templates.remove(other)
+                    self.__merged_into[other.template_id] = template.template_id
+                    self.__generalize(template, other.tokens)
+
+    @staticmethod
+    def __generalize(template: Template, tokens: Sequence[Optional[str]]) -> None:
+        for i, token in enumerate(tokens):
+            if template.tokens[i] != token:
+                template.tokens[i] = WILDCARD
+
+    @staticmethod
+    def __key(token: Optional[str]) -> Optional[str]:
+        return WILDCARD if token is WILDCARD or any(c.isdigit() for c in token) else token
+
+    def __leaves(self, node: _Node, keys: List[Optional[str]], budget: int) -> Iterator[_Node]:
+        """
+        Yields the leaves reachable with at most budget differing keys, the leaf of the keys themselves first. The
+        wildcard child takes any key.
+        """
+        if not keys:
+            yield node
+            return
+        exact_child = node.children.get(keys[0])
+        if exact_child is not None:
+            yield from self.__leaves(exact_child, keys[1:], budget)
+        for key, child in node.children.items():
+            if child is exact_child:
+                continue
+            if key is WILDCARD:
+                yield from self.__leaves(child, keys[1:], budget)
+            elif budget > 0:
+                yield from self.__leaves(child, keys[1:], budget - 1)
+
+    def __find_leaf(self, node: _Node, keys: List[Optional[str]]) -> _Node:
+        for key in keys:
+            child = node.children.get(key)
+            if child is None:
+                if len(node.children) >= self.__max_children:
+                    key = WILDCARD
+                    child = node.children.get(key)
+                if child is None:
+                    child = node.children[key] = _Node()
+            node = child
+        return node
+
+    @staticmethod
+    def __count_mismatches(template: Template, tokens: Sequence[Optional[str]], limit: int) -> int:
+        # Wildcards of either side match any token
+        mismatches = 0
+        for template_token, token in zip(template.tokens, tokens):
+            if template_token is not WILDCARD and token is not WILDCARD and template_token != token:
+                mismatches += 1
+                if mismatches >= limit:
+                    break
+        return mismatches
+
+
+def process(
+        event_iterator: Iterable[str],
+        max_samples_per_cluster: int,
+        max_noisy_samples: int,
+        max_distance: float,
+) -> ClusteringAccumulator:
+    return process_analyzed(analyze_events(event_iterator), max_samples_per_cluster, max_noisy_samples, max_distance)
+
+
+def process_analyzed(
+        analyzed_events: Iterable[AnalyzedEvent],
+        max_samples_per_cluster: int,
+        max_noisy_samples: int,
+        max_distance: float,
+        input_files: Optional[List[InputFile]] = None,
+) -> ClusteringAccumulator:
+    template_miner = TemplateMiner(max_distance)
+    accumulator = ClusteringAccumulator(max_samples_per_cluster, max_noisy_samples)
+
+    mining_timer = Timer()
+    # Templates are mined while the events are read and analyzed, the analysis stage covers all of it
+    with profiling.stage("analysis"):
+        for file_id, line_nr, event, tokens in analyzed_events:
+            template = template_miner.add(tokens)
+            path = input_files[file_id].path if input_files is not None else None
+            accumulator.report_event(template.template_id, LogEvent(line_nr, event, path))
+    for template_id in list(accumulator.clusters):
+        cluster_id = template_miner.cluster_id(template_id)
+        if cluster_id != template_id:
+            accumulator.report_cluster(cluster_id, accumulator.clusters.pop(template_id))
+    profiling.record("templates", len(template_miner.templates))
+    accumulator.move_small_clusters_to_noise(MIN_SAMPLES)
+    if input_files is not None:
+        with profiling.stage("sampleReading"):
+            load_missing_messages(accumulator.iter_samples(), input_files)
+    LOGGER.debug(f"Template mining completed duration={mining_timer.elapsed_ms()}ms "
+                 f"templates={len(template_miner.templates)} clusters={len(accumulator.clusters)}")
+    return accumulator
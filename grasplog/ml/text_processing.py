@@ -1,13 +1,32 @@
+import functools
 import logging
 import re
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Protocol, List
+from types import ModuleType
+from typing import Protocol, List, Tuple, Iterable, Iterator, Optional
 
 from nltk.tokenize import wordpunct_tokenize  # type:ignore
 from nltk.util import ngrams  # type:ignore
 
+from grasplog.ml.masking import MASKED_FIELD_PATTERNS, MaskingCharFilter
+
+try:
+    import regex  # type:ignore
+except ImportError:
+    regex = None
+
 LOGGER = logging.getLogger(__name__)
 
+# File id, line number in the file, stripped original event and its tokens. The event is None if it was not sent
+# back from a worker process, it can be read from the file again.
+AnalyzedEvent = Tuple[int, int, Optional[str], List[str]]
+
+
+class EventAnalyzer(Protocol):
+    def analyze(self, event: str) -> List[str]:
+        ...
+
 
 class CharFilter(Protocol):
     def filter(self, event: str) -> str:
@@ -31,6 +50,9 @@ class LowerCasingFilter:
 
 
 class SimpleTokenizer:
+    # Same pattern as nltk's wordpunct_tokenize
+    PATTERN = "\\w+|[^\\w\\s]+"
+
     @staticmethod
     def tokenize(event: str) -> List[str]:
         tokens = wordpunct_tokenize(event)
@@ -38,16 +60,18 @@ class SimpleTokenizer:
 
 
 class NgramTokenStreamEnricher:
+    """
+    Appends n-grams of the tokens as joined strings. Clustering computes n-gram features from token ids without
+    creating any strings instead, see grasplog.ml.vectorizer.TokenVectorizer.
+    """
+
     def __init__(self, ns: List[int]):
         self.__ns = ns
 
     def filter(self, tokens: List[str]) -> List[str]:
         result = tokens.copy()
         for current_ngram in self.__ns:
-            for i in range(0, len(tokens) - current_ngram + 1):
-                format_string = "##___##".join(["%s" for _ in range(current_ngram)])
-                token = format_string % tuple(tokens[i:i + current_ngram])
-                result.append(token)
+            result.extend("##___##".join(tokens[i:i + current_ngram]) for i in range(len(tokens) - current_ngram + 1))
         return result
 
 
@@ -88,8 +112,172 @@ class Analyzer:
         # Token filtering (str[] -> str[])
         for token_filter in self.token_filters:
             tokens = token_filter.filter(tokens)
-        LOGGER.debug(f"EVENT={event} TOKENS={tokens}")
+        if LOGGER.isEnabledFor(logging.DEBUG):
+            LOGGER.debug(f"EVENT={event} TOKENS={tokens}")
+        return tokens
+
+    def compile(self) -> EventAnalyzer:
+        """
+        Fuses the tokenizer and the token filters into a single regex scan if all of them are known, otherwise
+        the analyzer itself is returned. The compiled analyzer produces exactly the same tokens.
+        """
+        if not isinstance(self.tokenizer, SimpleTokenizer):
+            return self
+        if not all(isinstance(x, (NumericTokenFilter, SingleCharTokenFilter)) for x in self.token_filters):
+            return self
+        regex_engine = _tokenizer_regex_engine()
+        if regex_engine is None:
+            return self
+        return CompiledAnalyzer(
+            regex_engine=regex_engine,
+            char_filters=self.char_filters,
+            drop_numeric=any(isinstance(x, NumericTokenFilter) for x in self.token_filters),
+            drop_single_char=any(isinstance(x, SingleCharTokenFilter) for x in self.token_filters),
+        )
+
+
+class CompiledAnalyzer:
+    """
+    Single pass equivalent of an Analyzer using SimpleTokenizer followed by any combination of NumericTokenFilter
+    and SingleCharTokenFilter. Both filters are plain predicates, so their order does not matter.
+    """
+
+    def __init__(
+            self,
+            regex_engine: ModuleType,
+            char_filters: List[CharFilter],
+            drop_numeric: bool,
+            drop_single_char: bool,
+    ):
+        self.__lower_case = len(char_filters) == 1 and isinstance(char_filters[0], LowerCasingFilter)
+        self.__char_filters = [] if self.__lower_case else char_filters
+        # Single punctuation characters are never alphabetic, so they can be skipped directly by the regex
+        self.__pattern = regex_engine.compile("\\w+|[^\\w\\s]{2,}" if drop_single_char else SimpleTokenizer.PATTERN)
+        self.__drop_numeric = drop_numeric
+        self.__drop_single_char = drop_single_char
+        # Digit runs that are not part of a longer word always form a numeric token on their own
+        self.__standalone_number_pattern = regex_engine.compile("(?<!\\w)\\d+(?!\\w)")
+
+    def shape(self, event: str) -> Optional[str]:
+        """
+        Returns a key shared by events producing the same tokens, or None if no such key can be computed cheaply.
+        Standalone numbers in the filtered event are collapsed to a single digit, because numeric tokens are dropped
+        anyway.
+        """
+        if not self.__drop_numeric:
+            return None
+        current_event = event.lower() if self.__lower_case else event
+        for char_filter in self.__char_filters:
+            current_event = char_filter.filter(current_event)
+        return self.__standalone_number_pattern.sub("0", current_event)
+
+    def analyze(self, event: str) -> List[str]:
+        current_event = event.lower() if self.__lower_case else event
+        for char_filter in self.__char_filters:
+            current_event = char_filter.filter(current_event)
+
+        tokens = self.__pattern.findall(current_event)
+        # str.isdecimal() accepts the same characters as the \d regex class used by NumericTokenFilter
+        if self.__drop_numeric and self.__drop_single_char:
+            tokens = [x for x in tokens if not x.isdecimal() and (len(x) > 1 or x.isalpha())]
+        elif self.__drop_numeric:
+            tokens = [x for x in tokens if not x.isdecimal()]
+        elif self.__drop_single_char:
+            tokens = [x for x in tokens if len(x) > 1 or x.isalpha()]
+        if LOGGER.isEnabledFor(logging.DEBUG):
+            LOGGER.debug(f"EVENT={event} TOKENS={tokens}")
         return tokens
 
 
-DEFAULT_ANALYZER = Analyzer([LowerCasingFilter()], SimpleTokenizer(), [NumericTokenFilter(), SingleCharTokenFilter()])
+class CachingAnalyzer:
+    """
+    Memoizes the output of a compiled analyzer, keyed on the shape of the event (see CompiledAnalyzer.shape). At most
+    max_entries shapes are kept, the least recently used one is evicted first. Events without a shape are always
+    fully analyzed.
+    """
+
+    def __init__(self, analyzer: CompiledAnalyzer, max_entries: int):
+        self.__analyzer = analyzer
+        self.__max_entries = max_entries
+        self.__cache: "OrderedDict[str, List[str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def analyze(self, event: str) -> List[str]:
+        key = self.__analyzer.shape(event)
+        if key is None:
+            self.misses += 1
+            return self.__analyzer.analyze(event)
+        tokens = self.__cache.get(key)
+        if tokens is not None:
+            self.hits += 1
+            self.__cache.move_to_end(key)
+            # Callers may modify the tokens, the cached list is shared by all events of the shape
+            return list(tokens)
+        self.misses += 1
+        tokens = self.__analyzer.analyze(event)
+        self.__cache[key] = tokens
+        if len(self.__cache) > self.__max_entries:
+            self.__cache.popitem(last=False)
+        return list(tokens)
+
+    def log_statistics(self) -> None:
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups * 100 if lookups > 0 else 0
+        LOGGER.debug(f"Analysis cache hits={self.hits} misses={self.misses} hit_rate={hit_rate:.2f}% "
+                     f"entries={len(self.__cache)}")
+
+
+@functools.lru_cache(maxsize=None)
+def _tokenizer_regex_engine() -> Optional[ModuleType]:
+    """
+    Depending on the version, nltk tokenizes either with the standard re module or with the regex module, which
+    differ in the Unicode definition of word and space characters. Returns the one nltk currently uses, if any.
+    """
+    probe = "a\u0307\x1cb\x85c"
+    expected = SimpleTokenizer.tokenize(probe)
+    for engine in [re, regex]:
+        if engine is not None and engine.findall(SimpleTokenizer.PATTERN, probe) == expected:
+            return engine
+    return None
+
+
+def create_default_analyzer(masked_fields: Iterable[str] = ()) -> Analyzer:
+    """
+    Returns the default analyzer, optionally masking the given variable field classes (see MASKED_FIELD_PATTERNS).
+    """
+    char_filters: List[CharFilter] = [LowerCasingFilter()]
+    masked_fields = list(masked_fields)
+    if masked_fields:
+        char_filters.append(MaskingCharFilter(masked_fields))
+    return Analyzer(char_filters, SimpleTokenizer(), [NumericTokenFilter(), SingleCharTokenFilter()])
+
+
+DEFAULT_ANALYZER = create_default_analyzer()
+COMPILED_DEFAULT_ANALYZER = DEFAULT_ANALYZER.compile()
+
+
+def analyze_events(
+        event_iterator: Iterable[str],
+        analyzer: EventAnalyzer = COMPILED_DEFAULT_ANALYZER,
+) -> Iterator[AnalyzedEvent]:
+    """
+    Analyzes events not coming from any file, they all get file id 0 and are numbered from 1.
+    """
+    for line_nr, event in enumerate(event_iterator, 1):
+        event = event.strip()
+        yield 0, line_nr, event, analyzer.analyze(event)
+
+
+def analyze_event_blocks(
+        event_blocks: Iterable[Tuple[int, int, List[str]]],
+        analyzer: EventAnalyzer = COMPILED_DEFAULT_ANALYZER,
+) -> Iterator[AnalyzedEvent]:
+    """
+    Analyzes blocks of events as returned by grasplog.file_reader.read_event_blocks_from_glob.
+    """
+    analyze = analyzer.analyze
+    for file_id, first_line_nr, events in event_blocks:
+        for line_nr, event in enumerate(events, first_line_nr):
+            event = event.strip()
+            yield file_id, line_nr, event, analyze(event)
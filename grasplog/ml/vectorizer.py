@@ -0,0 +1,122 @@
+from array import array
+from typing import Dict, List, Iterable, Tuple, Optional, Sequence
+
+import numpy as np
+from scipy.sparse import csr_matrix  # type:ignore
+
+
+NGRAM_ID_BITS = 32  # Token ids are stored as 32-bit integers, see TokenVectorizer.__indices
+
+
+class TokenVectorizer:
+    """
+    Builds a binary matrix of token occurrences with an exact vocabulary. Tokens are interned to integer ids and the
+    ids of every row are appended straight into the index buffers of a CSR matrix, so no hashing is involved and two
+    distinct tokens never share a column.
+
+    With ngram_sizes, every run of that many adjacent tokens gets a column as well. An n-gram is keyed by the ids of
+    its tokens packed into a single integer, which is looked up in a table of n-gram columns, no joined strings are
+    created. N-gram columns are shared with tokens, they just have no token.
+    """
+
+    def __init__(self, ngram_sizes: Sequence[int] = ()):
+        self.vocabulary: Dict[str, int] = {}
+        self.__tokens: List[Optional[str]] = []  # Token of every column, None for n-grams
+        self.__ngram_sizes = sorted(set(ngram_sizes))
+        self.__ngram_columns: Dict[int, int] = {}
+        self.__indptr = array("q", [0])
+        self.__indices = array("i")  # Token ids of every row in the order of their first occurrence, then n-grams
+
+    def token_ids(self, tokens: Iterable[str]) -> Tuple[int, ...]:
+        """
+        Returns distinct ids of the tokens in the order of their first occurrence, followed by distinct ids of their
+        n-grams if enabled. New tokens and n-grams are added to the vocabulary.
+        """
+        vocabulary = self.vocabulary
+        token_ids = []
+        for token in tokens:
+            token_id = vocabulary.get(token)
+            if token_id is None:
+                token_id = vocabulary[token] = len(self.__tokens)
+                self.__tokens.append(token)
+            token_ids.append(token_id)
+        if self.__ngram_sizes:
+            token_ids.extend(self.__ngram_ids(token_ids))
+        return tuple(dict.fromkeys(token_ids))
+
+    def __ngram_ids(self, token_ids: List[int]) -> List[int]:
+        # The key of an n-gram packs the ids of its tokens plus one, so keys of n-grams of different sizes never
+        # collide: a key of an n-gram is at least 2 ** (NGRAM_ID_BITS * (n - 1)) and less than 2 ** (NGRAM_ID_BITS * n)
+        columns = self.__ngram_columns
+        ngram_ids = []
+        unigram_keys = [x + 1 for x in token_ids]
+        keys = unigram_keys
+        for n in range(2, self.__ngram_sizes[-1] + 1):
+            keys = [(key << NGRAM_ID_BITS) | x for key, x in zip(keys, unigram_keys[n - 1:])]
+            if n not in self.__ngram_sizes:
+                continue
+            for key in keys:
+                ngram_id = columns.get(key)
+                if ngram_id is None:
+                    ngram_id = columns[key] = len(self.__tokens)
+                    self.__tokens.append(None)
+                ngram_ids.append(ngram_id)
+        return ngram_ids
+
+    def append(self, token_ids: Tuple[int, ...]) -> int:
+        self.__indices.extend(token_ids)
+        self.__indptr.append(len(self.__indices))
+        return len(self.__indptr) - 2
+
+    def tokens(self, row_id: int) -> List[str]:
+        start, end = self.__indptr[row_id], self.__indptr[row_id + 1]
+        tokens = [self.__tokens[x] for x in self.__indices[start:end]]
+        return [x for x in tokens if x is not None] if self.__ngram_sizes else tokens  # type:ignore
+
+    def row_lengths(self) -> np.ndarray:
+        """
+        Returns the number of distinct tokens of every row.
+        """
+        return np.diff(np.frombuffer(self.__indptr, dtype=np.int64))
+
+    def leading_token_ids(self) -> np.ndarray:
+        """
+        Returns the id of the first token of every row, -1 for rows without tokens.
+        """
+        indptr = np.frombuffer(self.__indptr, dtype=np.int64)
+        indices = np.frombuffer(self.__indices, dtype=np.int32)
+        non_empty = indptr[1:] > indptr[:-1]
+        result = np.full(len(indptr) - 1, -1, dtype=np.int64)
+        result[non_empty] = indices[indptr[:-1][non_empty]]
+        return result
+
+    def to_csr(self, row_ids: Optional[Sequence[int]] = None) -> csr_matrix:
+        """
+        Returns a matrix of all rows, or only of the given rows in the given order. Values are 1 for every present
+        token and 0 otherwise.
+        """
+        indptr = np.frombuffer(self.__indptr, dtype=np.int64)
+        indices = np.frombuffer(self.__indices, dtype=np.int32)
+        if row_ids is not None:
+            selected_rows = np.asarray(row_ids, dtype=np.int64)
+            starts = indptr[selected_rows]
+            lengths = indptr[selected_rows + 1] - starts
+            indptr = np.zeros(len(selected_rows) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=indptr[1:])
+            # Position of every selected index in the original buffer
+            positions = np.repeat(starts - indptr[:-1], lengths) + np.arange(indptr[-1])
+            indices = indices[positions]
+        else:
+            indices = indices.copy()
+        # Indices are copied, so sorting them does not change the token order kept for tokens()
+        index_dtype = np.int32 if len(indices) < 2 ** 31 else np.int64
+        matrix = csr_matrix(
+            (np.ones(len(indices), dtype=np.float32), indices.astype(index_dtype, copy=False),
+             indptr.astype(index_dtype)),
+            shape=(len(indptr) - 1, max(len(self.__tokens), 1)),
+        )
+        matrix.sort_indices()
+        return matrix
+
+    def __len__(self) -> int:
+        return len(self.__indptr) - 1
@@ -0,0 +1,77 @@
+"""
+Cluster models (--save-model) used to label new events with known clusters without clustering them again
+(grasplog classify). A model consists of the analyzer configuration, MAX_DISTANCE and the id, prototype, event count
+and core samples of every cluster. An event belongs to the cluster of a core sample within MAX_DISTANCE, the same rule
+DBSCAN applies, so classifying the events a model was created from gives their clusters again. Tokens of the core
+samples are stored as indices into a vocabulary shared by all clusters.
+"""
+import json
+from dataclasses import dataclass
+from typing import List, Dict
+
+from grasplog.datamodel import ClusteringAccumulator, ClusterInfo
+from grasplog.exception import GraspLogException, GraspLogIOException
+
+MODEL_VERSION = 2
+
+
+@dataclass
+class ClusterModel:
+    max_distance: float
+    masked_fields: List[str]  # Configuration of the analyzer, see grasplog.ml.text_processing.create_default_analyzer
+    clusters: List[ClusterInfo]
+
+
+def create_model(accumulator: ClusteringAccumulator, max_distance: float, masked_fields: List[str]) -> ClusterModel:
+    clusters = [
+        ClusterInfo(x.cluster_id, x.total_event_count, [], x.prototype, x.core_samples)
+        for x in accumulator.clusters.values()
+    ]
+    return ClusterModel(max_distance, masked_fields, clusters)
+
+
+def save_model(path: str, model: ClusterModel) -> None:
+    vocabulary: Dict[str, int] = {}
+    clusters = [
+        {
+            "clusterId": x.cluster_id,
+            "prototype": x.prototype,
+            "totalCount": x.total_event_count,
+            "coreSamples": [[vocabulary.setdefault(y, len(vocabulary)) for y in row] for row in x.core_samples],
+        }
+        for x in model.clusters
+    ]
+    model_dict = {
+        "version": MODEL_VERSION,
+        "maxDistance": model.max_distance,
+        "maskedFields": model.masked_fields,
+        "vocabulary": list(vocabulary),
+        "clusters": clusters,
+    }
+    try:
+        with open(path, "wt") as handle:
+            json.dump(model_dict, handle)
+    except OSError as e:
+        raise GraspLogIOException(f"Cannot write model file {path}: {e}")
+
+
+def load_model(path: str) -> ClusterModel:
+    try:
+        with open(path, "rt") as handle:
+            model_dict = json.load(handle)
+        if model_dict.get("version") != MODEL_VERSION:
+            raise GraspLogException(f"Model file {path} was created by an incompatible version")
+        vocabulary = model_dict["vocabulary"]
+        return ClusterModel(
+            max_distance=model_dict["maxDistance"],
+            masked_fields=model_dict["maskedFields"],
+            clusters=[
+                ClusterInfo(x["clusterId"], x["totalCount"], [], x["prototype"],
+                            [[vocabulary[y] for y in row] for row in x["coreSamples"]])
+                for x in model_dict["clusters"]
+            ],
+        )
+    except OSError as e:
+        raise GraspLogIOException(f"Cannot read model file {path}: {e}")
+    except (ValueError, KeyError, TypeError, AttributeError, IndexError):
+        raise GraspLogException(f"Model file {path} is corrupted")
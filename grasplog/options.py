@@ -0,0 +1,42 @@
+"""
+Choices and default values of the command line options. The module depends only on the standard library, so that
+building the argument parser doesn't import the processing modules and runs that exit early (--help, --version,
+invalid arguments) start fast. The modules using these values import them from here.
+"""
+from enum import Enum
+
+
+class OutputFormat(Enum):
+    pretty_format = "pretty"
+    json_format = "json"
+    ndjson_format = "ndjson"
+
+    def __str__(self) -> str:
+        return self.value
+
+
+class Engine(Enum):
+    dbscan = "dbscan"
+    stream = "stream"
+
+    def __str__(self) -> str:
+        return self.value
+
+
+class Partitioning(Enum):
+    exact = "exact"
+    token_count = "token-count"
+    leading_token = "leading-token"
+
+    def __str__(self) -> str:
+        return self.value
+
+
+DEFAULT_MAX_DISTANCE = 2.1
+DEFAULT_PARTITION_BAND_WIDTH = 4
+DEFAULT_CACHE_SIZE_MB = 1024
+DEFAULT_DECODE_ERRORS = "replace"
+DECODE_ERRORS = ["strict", "replace", "ignore", "backslashreplace"]
+AUTO_FORMAT = "auto"  # Timestamp format detected from the lines of every file
+# Stages whose cProfile stats can be dumped. The analysis stage includes reading, which is also reported separately.
+PROFILED_STAGES = ["analysis", "clustering", "output"]
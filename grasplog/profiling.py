@@ -0,0 +1,163 @@
+"""
+Machine readable report of a single run (--profile): duration of every stage, throughput per input file, peak RSS
+and the size of the clustering problem. Stages and metrics are recorded through the module level functions, which
+do nothing unless a profile was started, so that the processing code doesn't need to pass the profile around.
+"""
+import cProfile
+import json
+import os
+import sys
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Iterator, Iterable, List, TypeVar, Tuple, Sequence, TYPE_CHECKING
+
+from grasplog.exception import GraspLogIOException
+from grasplog.options import PROFILED_STAGES
+from grasplog.util import Timer
+
+if TYPE_CHECKING:
+    from grasplog.file_reader import InputFile
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None  # type:ignore
+
+T = TypeVar("T")
+_END = object()
+
+
+class Profile:
+    def __init__(self, profiled_stage: Optional[str] = None):
+        self.stages: Dict[str, float] = {}  # Duration in milliseconds
+        self.metrics: Dict[str, Any] = {}
+        self.files: List[Dict[str, Any]] = []
+        self.profiled_stage = profiled_stage
+        self.profiler: Optional[cProfile.Profile] = None
+
+    def add_duration(self, stage: str, duration_ms: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0) + duration_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "stagesMs": {x: round(y, 3) for x, y in self.stages.items()},
+            "files": self.files,
+            "peakRssMb": _peak_rss_mb(),
+            **self.metrics,
+        }
+
+
+_active_profile: Optional[Profile] = None
+
+
+def start(profiled_stage: Optional[str] = None) -> None:
+    global _active_profile
+    _active_profile = Profile(profiled_stage)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Measures the duration of the enclosed code as the given stage, under cProfile if it is the profiled stage.
+    """
+    profile = _active_profile
+    if profile is None:
+        yield
+        return
+    if profile.profiled_stage == name:
+        profile.profiler = profile.profiler or cProfile.Profile()
+        profile.profiler.enable()
+    timer = Timer()
+    try:
+        yield
+    finally:
+        profile.add_duration(name, timer.elapsed_s() * 1000)
+        if profile.profiled_stage == name and profile.profiler is not None:
+            profile.profiler.disable()
+
+
+def timed_iterator(name: str, iterable: Iterable[T]) -> Iterator[T]:
+    """
+    Adds the time spent in producing items of the iterable to the given stage.
+    """
+    profile = _active_profile
+    if profile is None:
+        yield from iterable
+        return
+    iterator = iter(iterable)
+    while True:
+        timer = Timer()
+        item = next(iterator, _END)
+        profile.add_duration(name, timer.elapsed_s() * 1000)
+        if item is _END:
+            return
+        yield item  # type:ignore
+
+
+def record(name: str, value: Any) -> None:
+    if _active_profile is not None:
+        _active_profile.metrics[name] = value
+
+
+def timed_files(items: Iterable[Tuple], input_files: Sequence["InputFile"]) -> Iterator[Tuple]:
+    """
+    Records the number of items (events) of every file and the time from its first to its last item, which includes
+    the processing done by the consumer. The first value of every item is the file id, an index into input_files.
+    """
+    if _active_profile is None:
+        yield from items
+        return
+    file_id = None
+    line_count = 0
+    timer = Timer()
+    for item in items:
+        if item[0] != file_id:
+            if file_id is not None:
+                _record_file(input_files[file_id].path, line_count, timer.elapsed_s())
+            file_id = item[0]
+            line_count = 0
+            timer = Timer()
+        line_count += 1
+        yield item
+    if file_id is not None:
+        _record_file(input_files[file_id].path, line_count, timer.elapsed_s())
+
+
+def _record_file(path: str, line_count: int, duration_s: float) -> None:
+    # Bytes are counted as stored on the disk
+    assert _active_profile is not None
+    size = os.path.getsize(path) if os.path.isfile(path) else None
+    duration_s = max(duration_s, 1e-6)
+    _active_profile.files.append({
+        "path": path,
+        "lines": line_count,
+        "bytes": size,
+        "durationMs": round(duration_s * 1000, 3),
+        "linesPerS": round(line_count / duration_s),
+        "bytesPerS": round(size / duration_s) if size is not None else None,
+    })
+
+
+def write(path: str) -> None:
+    """
+    Writes the report of the active profile as JSON, the cProfile stats of the profiled stage next to it as
+    <path>.pstats.
+    """
+    assert _active_profile is not None
+    try:
+        with open(path, "wt") as handle:
+            json.dump(_active_profile.to_dict(), handle, indent=2)
+        if _active_profile.profiler is not None:
+            _active_profile.profiler.dump_stats(f"{path}.pstats")
+    except OSError as e:
+        raise GraspLogIOException(f"Cannot write profile {path}: {e}")
+
+
+def _peak_rss_mb() -> Optional[Dict[str, float]]:
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / divisor, 1),
+    }
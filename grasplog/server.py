@@ -0,0 +1,171 @@
+"""
+Long running daemon (grasplog serve) for frequent small batches, e.g. from log shipping hooks. The analyzer, the
+clustering modules and the model (if any) are loaded once by a pool of worker processes, so a batch doesn't pay for
+the startup of the command line. Connections are accepted on a Unix domain socket by an asyncio loop, which hands the
+batches over to the workers, so that several clients are served concurrently.
+
+Protocol, one request per connection: the client sends a header line with a JSON object, then the batch of log lines
+and shuts down its side of the connection. A header with {"pathGlob": PATH} makes the server read the files matching
+the glob instead, the batch is empty then. The response is a status line, {"status": "ok"} or {"error": MESSAGE},
+followed by the same JSON output as written by the json output format, after which the connection is closed. See
+grasplog.client for a client.
+"""
+import asyncio
+import io
+import json
+import logging
+import os
+import signal
+import socket
+from concurrent.futures import ProcessPoolExecutor, Executor
+from functools import partial
+from typing import Optional, Dict, Any, List
+
+from grasplog.cli import build_analyzer, setup_loging
+from grasplog.datamodel import ServeContext, ClusteringAccumulator, OutputFormat
+from grasplog.exception import GraspLogException
+from grasplog.file_reader import InputFile, read_event_blocks_from_glob, read_event_blocks_from_content
+from grasplog.ml.classification import classify_analyzed
+from grasplog.ml.clustering import process_analyzed
+from grasplog.ml.text_processing import EventAnalyzer, analyze_event_blocks
+from grasplog.model import ClusterModel, load_model
+
+WARM_UP_BATCH = b"Server started\nServer started\n"
+LOGGER = logging.getLogger(__name__)
+
+# State of a worker process, set up once by _init_worker
+_config: Optional[ServeContext] = None
+_analyzer: Optional[EventAnalyzer] = None
+_model: Optional[ClusterModel] = None
+
+
+def serve(serve_config: ServeContext) -> None:
+    """
+    Serves requests on the socket until the process is interrupted or terminated, the socket is removed then.
+    """
+    # The model is loaded here, so that an invalid one is reported before any worker starts
+    model = load_model(serve_config.model_file) if serve_config.model_file is not None else None
+    _remove_stale_socket(serve_config.socket_path)
+    with ProcessPoolExecutor(serve_config.jobs, initializer=_init_worker, initargs=(serve_config, model)) as executor:
+        # Workers are started and warmed up before the first request is accepted
+        for future in [executor.submit(os.getpid) for _ in range(serve_config.jobs)]:
+            future.result()
+        try:
+            asyncio.run(_serve_socket(serve_config.socket_path, executor))
+        finally:
+            if os.path.exists(serve_config.socket_path):
+                os.unlink(serve_config.socket_path)
+
+
+def _remove_stale_socket(socket_path: str) -> None:
+    if not os.path.exists(socket_path):
+        return
+    # A socket left behind by a server that was killed refuses connections
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            connection.connect(socket_path)
+        except OSError:
+            os.unlink(socket_path)
+            return
+    raise GraspLogException(f"Another server is already listening on {socket_path}")
+
+
+async def _serve_socket(socket_path: str, executor: Executor) -> None:
+    loop = asyncio.get_running_loop()
+    stopped = asyncio.Event()
+    for signal_number in [signal.SIGINT, signal.SIGTERM]:
+        loop.add_signal_handler(signal_number, stopped.set)
+    server = await asyncio.start_unix_server(partial(_handle_connection, executor=executor), path=socket_path)
+    LOGGER.info(f"Listening on {socket_path}")
+    async with server:
+        await stopped.wait()
+    LOGGER.info("Server stopped")
+
+
+async def _handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, executor: Executor) -> None:
+    try:
+        try:
+            header = json.loads(await reader.readline())
+            if not isinstance(header, dict):
+                raise ValueError("header is not an object")
+        except ValueError as e:
+            response = _error_response(f"Invalid request header: {e}")
+        else:
+            batch = await reader.read()
+            response = await asyncio.get_running_loop().run_in_executor(executor, process_request, header, batch)
+        writer.write(response.encode())
+        await writer.drain()
+    except ConnectionError as e:
+        LOGGER.debug(f"Client disconnected error={e}")
+    except Exception as e:
+        # Any other error (e.g. a worker that died) fails the single request, not the whole server
+        LOGGER.exception("Request failed")
+        writer.write(_error_response(f"Request failed: {e}").encode())
+    finally:
+        writer.close()
+
+
+def _init_worker(serve_config: ServeContext, model: Optional[ClusterModel]) -> None:
+    global _config, _analyzer, _model
+    # Interrupting the server (Ctrl+C is sent to all processes) stops the workers through the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    setup_loging(serve_config.debug_mode)
+    _config = serve_config
+    _model = model
+    # Events have to be analyzed exactly the same way as the events the model was created from
+    _analyzer = build_analyzer(_model.masked_fields if _model is not None else [], serve_config.analysis_cache_size)
+    # The first batch imports what the clustering imports lazily
+    _process_batch({}, WARM_UP_BATCH)
+
+
+def process_request(header: Dict[str, Any], batch: bytes) -> str:
+    """
+    Clusters (or classifies with the model) a batch in a worker process and returns the whole response.
+    """
+    try:
+        accumulator = _process_batch(header, batch)
+    except GraspLogException as e:
+        return _error_response(str(e))
+    response = io.StringIO()
+    response.write(json.dumps({"status": "ok"}) + "\n")
+    accumulator.output(OutputFormat.json_format, response)
+    return response.getvalue()
+
+
+def _process_batch(header: Dict[str, Any], batch: bytes) -> ClusteringAccumulator:
+    assert _config is not None and _analyzer is not None
+    input_files: List[InputFile] = []
+    path_glob = header.get("pathGlob")
+    if path_glob is not None and not isinstance(path_glob, str):
+        raise GraspLogException("pathGlob of the request header must be a string")
+    if path_glob is not None:
+        event_blocks = read_event_blocks_from_glob(path_glob, input_files, _config.decode_errors,
+                                                   line_filter=_config.line_filter)
+    else:
+        event_blocks = read_event_blocks_from_content(batch, input_files, _config.decode_errors, _config.line_filter)
+    analyzed_events = analyze_event_blocks(event_blocks, _analyzer)
+    if _model is not None:
+        accumulator = classify_analyzed(
+            analyzed_events=analyzed_events,
+            clusters=_model.clusters,
+            max_distance=_model.max_distance,
+            max_samples_per_cluster=_config.max_samples_per_cluster,
+            max_noisy_samples=_config.max_noisy_samples,
+            input_files=input_files,
+        )
+    else:
+        accumulator = process_analyzed(
+            analyzed_events=analyzed_events,
+            max_samples_per_cluster=_config.max_samples_per_cluster,
+            max_noisy_samples=_config.max_noisy_samples,
+            max_distance=_config.max_distance,
+            input_files=input_files,
+        )
+    accumulator.skipped_line_count = sum(x.skipped_line_count for x in input_files)
+    LOGGER.debug(f"Request processed pid={os.getpid()} events={accumulator.total_event_count()} "
+                 f"clusters={len(accumulator.clusters)}")
+    return accumulator
+
+
+def _error_response(message: str) -> str:
+    return json.dumps({"error": message}) + "\n"
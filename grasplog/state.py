@@ -0,0 +1,184 @@
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import List, Optional, Dict, Any, Tuple
+
+from grasplog import profiling
+from grasplog.datamodel import AppContext, ClusteringAccumulator, ClusterInfo, LogEvent
+from grasplog.exception import GraspLogException, GraspLogIOException
+from grasplog.file_reader import FileState, InputFile, read_new_event_blocks_from_glob
+from grasplog.ml.clustering import process_analyzed
+from grasplog.ml.text_processing import EventAnalyzer, analyze_event_blocks
+
+STATE_VERSION = 3
+# Noisy rows kept for later runs, the state would otherwise grow with every distinct noisy event ever seen
+MAX_STATE_NOISY_ROWS = 10000
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class RunState:
+    """
+    Everything needed to continue with the next run: read positions of all files and the clusters found so far,
+    each of them represented by its prototype and event count. Only the MAX_STATE_NOISY_ROWS most frequent noisy
+    rows are kept, without samples, events of the dropped ones are only counted in dropped_noisy_count.
+    """
+    max_distance: float
+    event_count: int
+    files: List[FileState]
+    clusters: List[ClusterInfo]
+    noisy_rows: List[ClusterInfo]
+    dropped_noisy_count: int = 0
+
+
+def cluster_to_dict(cluster: ClusterInfo) -> Dict[str, Any]:
+    return {
+        "prototype": cluster.prototype,
+        "totalCount": cluster.total_event_count,
+        "samples": [{"path": x.path, "lineNumber": x.line_nr, "event": x.message} for x in cluster.samples],
+    }
+
+
+def cluster_from_dict(cluster_dict: Dict[str, Any]) -> ClusterInfo:
+    samples = [LogEvent(x["lineNumber"], x["event"], x.get("path")) for x in cluster_dict["samples"]]
+    return ClusterInfo(-1, cluster_dict["totalCount"], samples, cluster_dict["prototype"])
+
+
+def _noisy_row_to_dict(noisy_row: ClusterInfo) -> Dict[str, Any]:
+    return {"prototype": noisy_row.prototype, "totalCount": noisy_row.total_event_count}
+
+
+def _noisy_row_from_dict(noisy_row_dict: Dict[str, Any]) -> ClusterInfo:
+    return ClusterInfo(-1, noisy_row_dict["totalCount"], [], noisy_row_dict["prototype"])
+
+
+def _file_to_dict(file_state: FileState) -> Dict[str, Any]:
+    return {
+        "path": file_state.path,
+        "inode": file_state.inode,
+        "headLength": file_state.head_length,
+        "headChecksum": file_state.head_checksum,
+        "offset": file_state.offset,
+        "lineCount": file_state.line_count,
+    }
+
+
+def _file_from_dict(file_dict: Dict[str, Any]) -> FileState:
+    return FileState(
+        path=file_dict["path"],
+        inode=file_dict["inode"],
+        head_length=file_dict["headLength"],
+        head_checksum=file_dict["headChecksum"],
+        offset=file_dict["offset"],
+        line_count=file_dict["lineCount"],
+    )
+
+
+def save_state(path: str, state: RunState) -> None:
+    state_dict = {
+        "version": STATE_VERSION,
+        "maxDistance": state.max_distance,
+        "eventCount": state.event_count,
+        "files": [_file_to_dict(x) for x in state.files],
+        "clusters": [cluster_to_dict(x) for x in state.clusters],
+        "noisyRows": [_noisy_row_to_dict(x) for x in state.noisy_rows],
+        "droppedNoisyCount": state.dropped_noisy_count,
+    }
+    # Replacing the file at once, so that an interrupted run never leaves a partially written state behind
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "wt") as handle:
+            json.dump(state_dict, handle)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        raise GraspLogIOException(f"Cannot write state file {path}: {e}")
+
+
+def load_state(path: str) -> Optional[RunState]:
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rt") as handle:
+            state_dict = json.load(handle)
+        if state_dict.get("version") != STATE_VERSION:
+            LOGGER.warning(f"Ignoring state file {path} created by an incompatible version")
+            return None
+        return RunState(
+            max_distance=state_dict["maxDistance"],
+            event_count=state_dict["eventCount"],
+            files=[_file_from_dict(x) for x in state_dict["files"]],
+            clusters=[cluster_from_dict(x) for x in state_dict["clusters"]],
+            noisy_rows=[_noisy_row_from_dict(x) for x in state_dict["noisyRows"]],
+            dropped_noisy_count=state_dict["droppedNoisyCount"],
+        )
+    except OSError as e:
+        raise GraspLogIOException(f"Cannot read state file {path}: {e}")
+    except (ValueError, KeyError, TypeError):
+        raise GraspLogException(f"State file {path} is corrupted, remove it to start from scratch")
+
+
+def limit_noisy_rows(noisy_rows: List[ClusterInfo], max_rows: int) -> Tuple[List[ClusterInfo], int]:
+    """
+    Returns the max_rows most frequent noisy rows and the number of events of the other ones. Rows of new events
+    come after the rows of previous runs, so among rows with equal counts the oldest ones are dropped.
+    """
+    if len(noisy_rows) <= max_rows:
+        return noisy_rows, 0
+    order = sorted(range(len(noisy_rows)), key=lambda x: (noisy_rows[x].total_event_count, x), reverse=True)
+    kept_rows = [noisy_rows[x] for x in sorted(order[:max_rows])]
+    return kept_rows, sum(noisy_rows[x].total_event_count for x in order[max_rows:])
+
+
+def process_incrementally(app_config: AppContext, analyzer: EventAnalyzer) -> Tuple[ClusteringAccumulator, RunState]:
+    """
+    Reads only events appended since the run that saved the state file and merges them into the clusters stored
+    in it. Returns the clusters together with the state for the next run, which the caller saves once the output
+    was written, see save_state.
+    """
+    assert app_config.state_file is not None
+    state = load_state(app_config.state_file)
+    if state is not None and state.max_distance != app_config.max_distance:
+        LOGGER.warning(f"State file {app_config.state_file} was created with a different MAX_DISTANCE, "
+                       f"starting from scratch")
+        state = None
+    if state is None:
+        state = RunState(app_config.max_distance, 0, [], [], [])
+
+    current_files: List[FileState] = []
+    input_files: List[InputFile] = []
+    event_blocks = read_new_event_blocks_from_glob(
+        app_config.path_glob, state.files, current_files, input_files, app_config.decode_errors, app_config.line_filter
+    )
+    analyzed_events = analyze_event_blocks(profiling.timed_iterator("read", event_blocks), analyzer)
+    accumulator = process_analyzed(
+        analyzed_events=profiling.timed_files(analyzed_events, input_files),
+        max_samples_per_cluster=app_config.max_samples_per_cluster,
+        max_noisy_samples=app_config.max_noisy_samples,
+        max_distance=app_config.max_distance,
+        previous_clusters=state.clusters + state.noisy_rows,
+        input_files=input_files,
+        sample_size=app_config.sample_size,
+        partitioning=app_config.partitioning,
+        partition_band_width=app_config.partition_band_width,
+        labels_path=app_config.labels_dir,
+        keep_core_samples=app_config.model_file is not None,
+    )
+    # Events of noisy rows dropped from the state are still noise, only their tokens are no longer known
+    accumulator.report_noisy_cluster(ClusterInfo(-1, state.dropped_noisy_count, []))
+    accumulator.skipped_line_count = sum(x.skipped_line_count for x in input_files)
+    event_count = accumulator.total_event_count()
+    if event_count == 0:
+        raise GraspLogException("All files are empty")
+    LOGGER.debug(f"Incremental run completed new_events={event_count - state.event_count}")
+
+    noisy_rows, dropped_noisy_count = limit_noisy_rows(accumulator.noisy_rows, MAX_STATE_NOISY_ROWS)
+    next_state = RunState(
+        max_distance=app_config.max_distance,
+        event_count=event_count,
+        files=current_files,
+        clusters=list(accumulator.clusters.values()),
+        noisy_rows=noisy_rows,
+        dropped_noisy_count=state.dropped_noisy_count + dropped_noisy_count,
+    )
+    return accumulator, next_state
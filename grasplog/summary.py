@@ -0,0 +1,111 @@
+"""
+Summaries of clustering runs (--emit-summary) that can be merged later (grasplog merge), e.g. runs over logs of
+different hosts. A summary keeps only the prototype, event count and bounded samples of every cluster, and of the
+MAX_SUMMARY_NOISY_ROWS most frequent noisy rows. Events of the other noisy rows are only counted, they can't form
+a cluster with events of other summaries anymore. Merging costs roughly the number of clusters instead of the number
+of events.
+"""
+import gzip
+import json
+import logging
+from dataclasses import dataclass
+from typing import List, Sequence
+
+from grasplog.datamodel import ClusteringAccumulator, ClusterInfo
+from grasplog.exception import GraspLogException, GraspLogIOException
+from grasplog.ml.clustering import process_analyzed
+from grasplog.state import cluster_to_dict, cluster_from_dict, limit_noisy_rows
+
+SUMMARY_VERSION = 2
+MAX_SUMMARY_NOISY_ROWS = 10000
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class RunSummary:
+    max_distance: float
+    event_count: int
+    clusters: List[ClusterInfo]
+    # Distinct noisy events, they can still form a cluster together with noisy events of other summaries
+    noisy_rows: List[ClusterInfo]
+    # Events of noisy rows left out of the summary
+    dropped_noisy_count: int
+
+
+def summarize(accumulator: ClusteringAccumulator, max_distance: float) -> RunSummary:
+    noisy_rows, dropped_noisy_count = limit_noisy_rows(accumulator.noisy_rows, MAX_SUMMARY_NOISY_ROWS)
+    return RunSummary(
+        max_distance=max_distance,
+        event_count=accumulator.total_event_count(),
+        clusters=list(accumulator.clusters.values()),
+        noisy_rows=noisy_rows,
+        dropped_noisy_count=dropped_noisy_count,
+    )
+
+
+def _open(path: str, mode: str):
+    # Summaries are shipped between hosts, compressing them is worth it for large ones
+    return gzip.open(path, mode) if path.endswith(".gz") else open(path, mode)
+
+
+def save_summary(path: str, summary: RunSummary) -> None:
+    summary_dict = {
+        "version": SUMMARY_VERSION,
+        "maxDistance": summary.max_distance,
+        "eventCount": summary.event_count,
+        "clusters": [cluster_to_dict(x) for x in summary.clusters],
+        "noisyRows": [cluster_to_dict(x) for x in summary.noisy_rows],
+        "droppedNoisyCount": summary.dropped_noisy_count,
+    }
+    try:
+        with _open(path, "wt") as handle:
+            json.dump(summary_dict, handle, separators=(",", ":"))
+    except OSError as e:
+        raise GraspLogIOException(f"Cannot write summary file {path}: {e}")
+
+
+def load_summary(path: str) -> RunSummary:
+    try:
+        with _open(path, "rt") as handle:
+            summary_dict = json.load(handle)
+        if summary_dict.get("version") != SUMMARY_VERSION:
+            raise GraspLogException(f"Summary file {path} was created by an incompatible version")
+        return RunSummary(
+            max_distance=summary_dict["maxDistance"],
+            event_count=summary_dict["eventCount"],
+            clusters=[cluster_from_dict(x) for x in summary_dict["clusters"]],
+            noisy_rows=[cluster_from_dict(x) for x in summary_dict["noisyRows"]],
+            dropped_noisy_count=summary_dict["droppedNoisyCount"],
+        )
+    except OSError as e:
+        raise GraspLogIOException(f"Cannot read summary file {path}: {e}")
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise GraspLogException(f"Summary file {path} is corrupted")
+
+
+def merge_summaries(
+        summaries: Sequence[RunSummary],
+        max_samples_per_cluster: int,
+        max_noisy_samples: int,
+        max_distance: float,
+) -> ClusteringAccumulator:
+    """
+    Clusters prototypes of all clusters and noisy rows of the summaries, weighted by the number of events they
+    represent, the same way a run with a state file merges clusters of the previous run with new events. Noisy rows
+    left out of the summaries are only added to the noisy event count.
+    """
+    for summary in summaries:
+        if summary.max_distance != max_distance:
+            LOGGER.warning(f"Merging a summary created with MAX_DISTANCE {summary.max_distance} using {max_distance}")
+    previous_clusters = [x for summary in summaries for x in summary.clusters + summary.noisy_rows]
+    accumulator = process_analyzed(
+        analyzed_events=(),
+        max_samples_per_cluster=max_samples_per_cluster,
+        max_noisy_samples=max_noisy_samples,
+        max_distance=max_distance,
+        previous_clusters=previous_clusters,
+    )
+    accumulator.report_noisy_cluster(ClusterInfo(-1, sum(x.dropped_noisy_count for x in summaries), []))
+    LOGGER.debug(f"Summaries merged summaries={len(summaries)} rows={len(previous_clusters)} "
+                 f"clusters={len(accumulator.clusters)}")
+    return accumulator
@@ -0,0 +1,198 @@
+"""
+Timestamps at the beginning of log lines, used to read only the events of a time window (--since, --until). Parsers
+return seconds since the epoch, times without a time zone are local times. Further formats can be added with
+register_timestamp_parser.
+
+Lines of a file are assumed to be ordered by time, a line without a timestamp (e.g. a line of a stack trace) belongs
+to the closest previous line with one. So the lines of a file within the window are a contiguous range, which is found
+by checking the first and last timestamp of whole blocks of lines, only the blocks at the edges of the window are
+checked line by line.
+"""
+import re
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, Optional, List, Iterator, Tuple, Iterable
+
+from grasplog.options import AUTO_FORMAT
+
+# Parser of a timestamp at the beginning of a line, returns None if the line does not start with one
+TimestampParser = Callable[[str], Optional[float]]
+
+# Patterns are compiled on first use, which keeps them out of the startup of the command line
+_PATTERNS = {
+    "iso8601": r"\[?(\d{4})-(\d\d)-(\d\d)[T ](\d\d):(\d\d):(\d\d)(?:[.,](\d+))?(Z|[+-]\d\d:?\d\d)?(?![\d:])",
+    "syslog": r"([A-Z][a-z]{2}) {1,2}(\d{1,2}) (\d\d):(\d\d):(\d\d)(?![\d:])",
+    "epoch": r"\[?(\d{10})(\d{3})?(?:\.(\d+))?(?![\d:])",
+}
+_MONTHS = {x: i for i, x in enumerate(["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov",
+                                       "Dec"], 1)}
+_MAX_FUTURE_S = 86400  # Syslog timestamps further in the future are from the previous year
+
+
+@lru_cache(maxsize=None)
+def _pattern(name: str) -> re.Pattern:
+    return re.compile(_PATTERNS[name])
+
+
+def _to_epoch(year: int, month: int, day: int, hour: int, minute: int, second: int) -> float:
+    # mktime interprets the time as a local time, -1 lets it find out whether daylight saving time applies
+    return time.mktime((year, month, day, hour, minute, second, 0, 0, -1))
+
+
+def parse_iso8601(line: str) -> Optional[float]:
+    match = _pattern("iso8601").match(line)
+    if match is None:
+        return None
+    year, month, day, hour, minute, second, fraction, zone = match.groups()
+    try:
+        if zone is None:
+            result = _to_epoch(int(year), int(month), int(day), int(hour), int(minute), int(second))
+        else:
+            from datetime import datetime
+            result = datetime.fromisoformat(f"{year}-{month}-{day}T{hour}:{minute}:{second}{zone}").timestamp()
+    except (ValueError, OverflowError):
+        return None
+    return result + float(f"0.{fraction}") if fraction else result
+
+
+def parse_syslog(line: str) -> Optional[float]:
+    """
+    Parses the timestamp of the traditional syslog format (e.g. "Oct 18 12:34:56"), which has no year. The current
+    year is assumed, or the previous one if the time would be in the future.
+    """
+    match = _pattern("syslog").match(line)
+    if match is None or match.group(1) not in _MONTHS:
+        return None
+    month, day, hour, minute, second = _MONTHS[match.group(1)], *(int(x) for x in match.groups()[1:])
+    now = time.time()
+    year = time.localtime(now).tm_year
+    try:
+        result = _to_epoch(year, month, day, hour, minute, second)
+        if result > now + _MAX_FUTURE_S:
+            result = _to_epoch(year - 1, month, day, hour, minute, second)
+    except (ValueError, OverflowError):
+        return None
+    return result
+
+
+def parse_epoch(line: str) -> Optional[float]:
+    """
+    Parses seconds (10 digits) or milliseconds (13 digits) since the epoch, optionally with a fraction.
+    """
+    match = _pattern("epoch").match(line)
+    if match is None:
+        return None
+    seconds, milliseconds, fraction = match.groups()
+    if milliseconds is not None:
+        return int(seconds) + int(milliseconds) / 1000
+    return int(seconds) + float(f"0.{fraction}") if fraction else float(seconds)
+
+
+# Parsers by format name, tried in this order by the auto detection
+TIMESTAMP_PARSERS: Dict[str, TimestampParser] = {
+    "iso8601": parse_iso8601,
+    "syslog": parse_syslog,
+    "epoch": parse_epoch,
+}
+
+
+def register_timestamp_parser(name: str, parser: TimestampParser) -> None:
+    TIMESTAMP_PARSERS[name] = parser
+
+
+def parse_time_argument(value: str) -> Optional[float]:
+    """
+    Parses a time given on the command line, either in ISO 8601 format or as seconds since the epoch. Returns None if
+    it is neither.
+    """
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    from datetime import datetime
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return None
+
+
+@dataclass
+class TimeWindow:
+    since: Optional[float]
+    until: Optional[float]
+    timestamp_format: str = AUTO_FORMAT  # Name of a parser in TIMESTAMP_PARSERS or AUTO_FORMAT
+
+    def parser_for(self, lines: List[str]) -> Optional[TimestampParser]:
+        """
+        Returns the parser of the window's format, or with the auto format the first parser accepting any of the
+        given lines (the beginning of a file). None if no parser accepts any of them.
+        """
+        if self.timestamp_format != AUTO_FORMAT:
+            return TIMESTAMP_PARSERS[self.timestamp_format]
+        for parser in TIMESTAMP_PARSERS.values():
+            if any(parser(x) is not None for x in lines):
+                return parser
+        return None
+
+    def filter_blocks(
+            self,
+            blocks: Iterator[Tuple[int, List[str]]],
+            parser: TimestampParser,
+    ) -> Iterator[Tuple[int, List[str]]]:
+        """
+        Yields the parts of blocks of lines (number of the first line, lines) within the window. Blocks entirely
+        before the window are skipped after parsing just their last timestamp, the iteration stops at the first line
+        after the window.
+        """
+        since, until = self.since, self.until
+        started = since is None
+        for first_line_nr, lines in blocks:
+            if since is not None and not started:
+                end_timestamp = last_timestamp(lines, parser)
+                if end_timestamp is None or end_timestamp < since:
+                    continue
+                start = _first_index(lines, parser, lambda x: x >= since)
+                first_line_nr += start
+                lines = lines[start:]
+                started = True
+            if until is not None:
+                end_timestamp = last_timestamp(lines, parser)
+                if end_timestamp is not None and end_timestamp > until:
+                    end = _first_index(lines, parser, lambda x: x > until)
+                    if end > 0:
+                        yield first_line_nr, lines[:end]
+                    return
+            yield first_line_nr, lines
+
+    def excludes(self, start: Optional[float], end: Optional[float]) -> bool:
+        """
+        Returns True if a file with the given first and last timestamp (None if unknown) has no line in the window.
+        """
+        if start is not None and self.until is not None and start > self.until:
+            return True
+        return end is not None and self.since is not None and end < self.since
+
+
+def first_timestamp(lines: Iterable[str], parser: TimestampParser) -> Optional[float]:
+    for line in lines:
+        timestamp = parser(line)
+        if timestamp is not None:
+            return timestamp
+    return None
+
+
+def last_timestamp(lines: List[str], parser: TimestampParser) -> Optional[float]:
+    return first_timestamp(reversed(lines), parser)
+
+
+def _first_index(lines: List[str], parser: TimestampParser, condition: Callable[[float], bool]) -> int:
+    """
+    Returns the index of the first line with a timestamp meeting the condition, lines without a timestamp before it
+    are included with the previous line.
+    """
+    for i, line in enumerate(lines):
+        timestamp = parser(line)
+        if timestamp is not None and condition(timestamp):
+            return i
+    return len(lines)
@@ -8,3 +8,6 @@ class Timer:
     def elapsed_ms(self) -> int:
         now = time.perf_counter()
         return int((now - self.start_time) * 1000)
+
+    def elapsed_s(self) -> float:
+        return time.perf_counter() - self.start_time
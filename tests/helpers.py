@@ -0,0 +1,35 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from typing import Iterable
+
+
+class TempDirTestCase(unittest.TestCase):
+    """
+    Test case with a temporary directory for the files a test writes, removed after every test.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_lines(self, name: str, lines: Iterable[str], mode: str = "wt") -> str:
+        """
+        Writes lines to a file of the temporary directory, gzip compressed if the name ends with .gz.
+        Returns the path of the file.
+        """
+        path = os.path.join(self.tmp_dir, name)
+        open_function = gzip.open if name.endswith(".gz") else open
+        with open_function(path, mode) as handle:  # type:ignore
+            handle.writelines(f"{x}\n" for x in lines)
+        return path
+
+    def write_bytes(self, name: str, content: bytes, open_function=open) -> str:
+        path = os.path.join(self.tmp_dir, name)
+        with open_function(path, "wb") as handle:
+            handle.write(content)
+        return path
@@ -0,0 +1,73 @@
+import os
+import random
+
+from sklearn.metrics import pairwise_distances  # type:ignore
+
+from grasplog.ml.classification import PrototypeIndex, classify_analyzed
+from grasplog.ml.clustering import process, process_analyzed
+from grasplog.ml.text_processing import analyze_events
+from grasplog.ml.vectorizer import TokenVectorizer
+from grasplog.model import create_model, save_model, load_model
+from tests.helpers import TempDirTestCase
+
+
+def _labels(accumulator):
+    labels = {x.line_nr: -1 for x in accumulator.noisy_events.samples}
+    for cluster in accumulator.clusters.values():
+        labels.update((x.line_nr, cluster.cluster_id) for x in cluster.samples)
+    return labels
+
+
+class ClassificationTestCase(TempDirTestCase):
+    def test_nearest_prototype_matches_brute_force(self):
+        random_generator = random.Random(42)
+        alphabet = "abcdefghij"
+
+        def random_row():
+            return [random_generator.choice(alphabet) for _ in range(random_generator.randint(0, 6))]
+
+        prototypes = [random_row() for _ in range(20)]
+        rows = [random_row() for _ in range(500)] + [["unknown", "tokens"]]
+        nearest, distances = PrototypeIndex(prototypes).nearest(rows)
+
+        vectorizer = TokenVectorizer()
+        for tokens in prototypes + rows:
+            vectorizer.append(vectorizer.token_ids(tokens))
+        all_distances = pairwise_distances(
+            vectorizer.to_csr(range(len(prototypes), len(prototypes) + len(rows))),
+            vectorizer.to_csr(range(len(prototypes))),
+            metric="manhattan",
+        )
+        self.assertEqual(all_distances.argmin(axis=1).tolist(), nearest.tolist())
+        self.assertEqual(all_distances.min(axis=1).tolist(), distances.tolist())
+
+    def test_no_prototypes(self):
+        nearest, _ = PrototypeIndex([]).nearest([["foo"]])
+        self.assertEqual([-1], nearest.tolist())
+
+    def test_classify_with_saved_model(self):
+        training_events = ["Disk is full"] * 3 + ["User alice logged in", "User bob logged in", "User eve logged in"]
+        model_path = os.path.join(self.tmp_dir, "model.json")
+        save_model(model_path, create_model(process(training_events, 5, 5, 2.1), 2.1, []))
+        model = load_model(model_path)
+
+        events = ["User carol logged in", "Disk is full", "Something else happened", "User dave logged in"]
+        accumulator = classify_analyzed(analyze_events(events), model.clusters, model.max_distance, 5, 5)
+        disk_cluster_id = [x.cluster_id for x in model.clusters if x.prototype == ["disk", "is", "full"]][0]
+        self.assertEqual(["Disk is full"], [x.message for x in accumulator.clusters[disk_cluster_id].samples])
+        self.assertEqual(2, accumulator.clusters[1 - disk_cluster_id].total_event_count)
+        self.assertEqual([3], [x.line_nr for x in accumulator.noisy_events.samples])
+
+    def test_classifying_training_events_reproduces_clusters(self):
+        # A chain of events, neighbors differ in a single token, while both ends are far from the prototype
+        words = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india"]
+        lines = [f"Task {words[i]} {words[i + 1]} finished" for i in range(len(words) - 1) for _ in range(3)]
+        lines += ["Disk is full"] * 3 + ["Something else happened", "Task alpha india finished"]
+        clustered = process_analyzed(analyze_events(lines), 100, 100, 2.1, keep_core_samples=True)
+        self.assertEqual(2, len(clustered.clusters))
+        model_path = os.path.join(self.tmp_dir, "model.json")
+        save_model(model_path, create_model(clustered, 2.1, []))
+        model = load_model(model_path)
+
+        classified = classify_analyzed(analyze_events(lines), model.clusters, model.max_distance, 100, 100)
+        self.assertEqual(_labels(clustered), _labels(classified))
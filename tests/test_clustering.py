@@ -1,5 +1,10 @@
 import unittest
-from grasplog.ml.clustering import process
+
+from sklearn.cluster import DBSCAN  # type:ignore
+
+from grasplog.ml.clustering import process, process_analyzed, UniqueRows, MIN_SAMPLES
+from grasplog.ml.text_processing import DEFAULT_ANALYZER, analyze_events
+from grasplog.ml.vectorizer import TokenVectorizer
 
 
 class ClusteringTestCase(unittest.TestCase):
@@ -34,3 +39,47 @@ class ClusteringTestCase(unittest.TestCase):
         self.assertEqual(["DEBUG something else"], [x.message for x in accumulator.noisy_events.samples])
         self.assertEqual([7], [x.line_nr for x in accumulator.noisy_events.samples])
         self.assertEqual(1, accumulator.noisy_events.total_event_count)
+
+    def test_duplicates_collapsed_into_weighted_rows(self):
+        rows = UniqueRows()
+        self.assertEqual(0, rows.add(["error", "foo"]))
+        self.assertEqual(1, rows.add(["info", "bar"]))
+        self.assertEqual(0, rows.add(["error", "foo"]))
+        self.assertEqual(2, rows.add(["bar", "info", "bar"]))
+        self.assertEqual([["error", "foo"], ["info", "bar"], ["bar", "info"]], [rows.tokens(x) for x in range(3)])
+        self.assertEqual([2, 1, 1], rows.counts)
+
+    def test_ngrams_separate_events_with_reordered_tokens(self):
+        lines = ["Connection to db closed by server"] * 3 + ["Server closed by db connection to"] * 3
+        analyzed_events = list(analyze_events(lines))
+        self.assertEqual(1, len(process_analyzed(analyzed_events, 5, 5, 2.1).clusters))
+        accumulator = process_analyzed(analyzed_events, 5, 5, 2.1, ngram_sizes=[2])
+        self.assertEqual([3, 3], [x.total_event_count for x in accumulator.clusters.values()])
+        self.assertEqual(["server", "closed", "by", "db", "connection", "to"], accumulator.clusters[1].prototype)
+
+    def test_deduplication_matches_clustering_of_all_events(self):
+        lines = [f"User {name} logged in from {host}" for name in ["alice", "bob"] for host in ["a1", "b2"]] * 3
+        lines += ["Disk is full", "Disk is full", "Something unusual", "Disk full again"]
+
+        vectorizer = TokenVectorizer()
+        for line in lines:
+            vectorizer.append(vectorizer.token_ids(DEFAULT_ANALYZER.analyze(line)))
+        expected = DBSCAN(min_samples=MIN_SAMPLES, eps=2.1, metric="l1").fit(vectorizer.to_csr()).labels_
+
+        accumulator = process(lines, 100, 100, 2.1)
+        actual = {}
+        for cluster_id, cluster_info in accumulator.clusters.items():
+            for sample in cluster_info.samples:
+                actual[sample.line_nr] = cluster_id
+        for sample in accumulator.noisy_events.samples:
+            actual[sample.line_nr] = -1
+        self.assertEqual(list(expected), [actual.get(x) for x in range(1, len(lines) + 1)])
+
+    def test_sample_then_assign(self):
+        lines = [f"User {name} logged in" for name in ["alice", "bob", "carol", "dave"]] * 50
+        lines += ["Disk is full"] * 100 + ["Something unusual", "User eve logged in"]
+
+        accumulator = process_analyzed(analyze_events(lines), 100, 100, 2.1, sample_size=50)
+        self.assertEqual(len(lines), accumulator.total_event_count())
+        self.assertEqual([100, 201], sorted(x.total_event_count for x in accumulator.clusters.values()))
+        self.assertEqual(["Something unusual"], [x.message for x in accumulator.noisy_events.samples])
@@ -1,6 +1,6 @@
 import unittest
 
-from grasplog.datamodel import OutputFormat
+from grasplog.datamodel import OutputFormat, Engine
 from grasplog.exception import InvalidCmdLineArgException
 from grasplog.cli import create_app_config
 
@@ -14,6 +14,11 @@ class CmdLineParserTestCase(unittest.TestCase):
         self.assertEqual("path1", app_config.path_glob)
         self.assertEqual(3, app_config.max_samples_per_cluster)
         self.assertEqual(5, app_config.max_noisy_samples)
+        self.assertEqual(Engine.dbscan, app_config.engine)
+
+    def test_engine_selection(self):
+        app_config = create_app_config(args=["--engine", "stream", "path1"])
+        self.assertEqual(Engine.stream, app_config.engine)
 
     def test_custom_validation(self):
         with self.assertRaises(InvalidCmdLineArgException) as context:
@@ -31,6 +36,44 @@ class CmdLineParserTestCase(unittest.TestCase):
             str(context.exception)
         )
 
+    def test_mask_validation(self):
+        self.assertEqual([], create_app_config(["path1"]).masked_fields)
+        self.assertEqual(["ip", "uuid"], create_app_config(["--mask", "ip,uuid", "path1"]).masked_fields)
+        self.assertIn("path", create_app_config(["--mask", "all", "path1"]).masked_fields)
+        with self.assertRaises(InvalidCmdLineArgException) as context:
+            create_app_config(["--mask", "ip,foo", "path1"])
+        self.assertEqual("FIELDS argument contains unknown classes: foo", str(context.exception))
+
+    def test_ngrams_validation(self):
+        self.assertEqual([], create_app_config(["path1"]).ngram_sizes)
+        self.assertEqual([2, 3], create_app_config(["--ngrams", "2,3", "path1"]).ngram_sizes)
+        for ngrams in ["1", "2,x"]:
+            with self.assertRaises(InvalidCmdLineArgException):
+                create_app_config(["--ngrams", ngrams, "path1"])
+        with self.assertRaises(InvalidCmdLineArgException):
+            create_app_config(["--ngrams", "2", "--engine", "stream", "path1"])
+        with self.assertRaises(InvalidCmdLineArgException):
+            create_app_config(["--ngrams", "2", "--state-file", "state.json", "path1"])
+
+    def test_line_filter_validation(self):
+        self.assertIsNone(create_app_config(["path1"]).line_filter)
+        self.assertIsNotNone(create_app_config(["--include", "ERROR|WARN", "--exclude", "health", "path1"]).line_filter)
+        with self.assertRaises(InvalidCmdLineArgException) as context:
+            create_app_config(["--exclude", "(health", "path1"])
+        self.assertTrue(str(context.exception).startswith("EXCLUDE argument must be a valid regular expression"))
+
+    def test_state_file_validation(self):
+        self.assertEqual("state.json", create_app_config(["--state-file", "state.json", "path1"]).state_file)
+        with self.assertRaises(InvalidCmdLineArgException):
+            create_app_config(["--state-file", "state.json", "--jobs", "2", "path1"])
+        with self.assertRaises(InvalidCmdLineArgException):
+            create_app_config(["--state-file", "state.json", "--save-model", "model.json", "path1"])
+
+    def test_sample_validation(self):
+        self.assertEqual(1000, create_app_config(["--sample", "1000", "path1"]).sample_size)
+        with self.assertRaises(InvalidCmdLineArgException):
+            create_app_config(["--sample", "1000", "--engine", "stream", "path1"])
+
     def test_noisy_count_taken_from_cluster_size(self):
         app_config = create_app_config(
             args=["--max-samples-per-cluster", "11", "path1"]
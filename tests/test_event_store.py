@@ -0,0 +1,22 @@
+from grasplog.datamodel import LogEvent
+from grasplog.event_store import load_missing_messages, MISSING_LINE_MESSAGE
+from grasplog.file_reader import InputFile
+from tests.helpers import TempDirTestCase
+
+
+class LoadMissingMessagesTestCase(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = self.write_lines("app.log", [f"event {x}" for x in range(1, 6)])
+
+    def test_messages_are_read_again(self):
+        events = [LogEvent(4, None, self.path), LogEvent(2, None, self.path), LogEvent(3, "kept", None)]
+        load_missing_messages(events, [InputFile(self.path)])
+        self.assertEqual(["event 4", "event 2", "kept"], [x.message for x in events])
+
+    def test_lines_of_truncated_file_are_replaced(self):
+        with open(self.path, "w") as handle:
+            handle.write("rotated 1\n")
+        events = [LogEvent(1, None, self.path), LogEvent(4, None, self.path)]
+        load_missing_messages(events, [InputFile(self.path)])
+        self.assertEqual(["rotated 1", MISSING_LINE_MESSAGE], [x.message for x in events])
@@ -0,0 +1,61 @@
+import os
+import time
+from typing import List
+
+from grasplog.feature_cache import FeatureCache, MIN_FILE_AGE_S
+from grasplog.file_reader import InputFile
+from grasplog.ml.parallel import analyze_events_from_glob, analyze_file
+from tests.helpers import TempDirTestCase
+
+
+class FeatureCacheTestCase(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = os.path.join(self.tmp_dir, "cache")
+        os.makedirs(self.cache_dir)
+        self.cache = FeatureCache(self.cache_dir, 1024 * 1024, "test")
+
+    def __write(self, name: str, lines: List[str], age_s: float = 2 * MIN_FILE_AGE_S) -> str:
+        path = self.write_lines(name, lines)
+        modification_time = time.time() - age_s
+        os.utime(path, (modification_time, modification_time))
+        return path
+
+    def test_cached_files_are_analyzed_the_same_way(self):
+        self.__write("app.log.1.gz", ["Disk is full", "User alice logged in", "Disk is full", "", "Done"])
+        self.__write("app.log", ["User bob logged in"], age_s=0)
+        glob_path = os.path.join(self.tmp_dir, "app.log*")
+        expected_input_files: List[InputFile] = []
+        expected = list(analyze_events_from_glob(glob_path, 1, expected_input_files))
+
+        for _ in range(2):
+            input_files: List[InputFile] = []
+            self.assertEqual(expected, list(analyze_events_from_glob(glob_path, 1, input_files, cache=self.cache)))
+            self.assertEqual(expected_input_files, input_files)
+        # Only the archive is cached, the live file was modified recently
+        self.assertEqual(1, len(os.listdir(self.cache_dir)))
+
+    def test_entries_are_keyed_on_content(self):
+        path = self.__write("app.log.1", ["Disk is full"])
+        key = self.cache.key(path, "replace")
+        self.cache.store(key, analyze_file(path))
+        renamed_path = self.__write("app.log.2", ["Disk is full"])
+        self.assertEqual(key, self.cache.key(renamed_path, "replace"))
+        self.assertEqual(renamed_path, self.cache.load(key, renamed_path, "replace").input_file.path)
+        self.assertNotEqual(key, self.cache.key(self.__write("app.log.3", ["Disk is empty"]), "replace"))
+        self.assertNotEqual(key, self.cache.key(path, "strict"))
+        self.assertNotEqual(key, FeatureCache(self.cache_dir, 1024 * 1024, "other").key(path, "replace"))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        keys = []
+        for i in range(3):
+            path = self.__write(f"app.log.{i}", [f"Event {i} number {x}" for x in range(1000)])
+            keys.append(self.cache.key(path, "replace"))
+            self.cache.store(keys[-1], analyze_file(path))
+            entry_time = time.time() - 100 + i
+            os.utime(os.path.join(self.cache_dir, keys[-1]), (entry_time, entry_time))
+        self.assertIsNotNone(self.cache.load(keys[0], path, "replace"))
+
+        entry_size = sum(x.stat().st_size for x in os.scandir(os.path.join(self.cache_dir, keys[0])))
+        FeatureCache(self.cache_dir, 2 * entry_size, "test").evict()
+        self.assertEqual(sorted([keys[0], keys[2]]), sorted(os.listdir(self.cache_dir)))
@@ -0,0 +1,77 @@
+import bz2
+import gzip
+import lzma
+import os
+from unittest import mock
+
+import grasplog.file_reader
+from grasplog.exception import GraspLogException, GraspLogIOException
+from grasplog.file_reader import read_lines, read_line_blocks, read_events_from_glob, read_event_blocks_from_glob
+from tests.helpers import TempDirTestCase
+
+
+class FileReaderTestCase(TempDirTestCase):
+    def test_plain_and_gzip_files(self):
+        expected = [x.rstrip("\n") for x in open("test_data/simple1.log")]
+        self.assertEqual(expected, list(read_lines("test_data/simple1.log")))
+        self.assertEqual(8, len(list(read_lines("test_data/simple2.log.gz"))))
+        self.assertEqual(16, len(list(read_events_from_glob("test_data/*"))))
+
+    def test_compressed_files(self):
+        content = b"first line\nsecond line\nlast line without line end"
+        expected = ["first line", "second line", "last line without line end"]
+        for name, open_function in [("a.log.gz", gzip.open), ("a.log.bz2", bz2.open), ("a.log.xz", lzma.open)]:
+            self.assertEqual(expected, list(read_lines(self.write_bytes(name, content, open_function))))
+
+        # Concatenated gzip members are read as a single file
+        path = self.write_bytes("b.log.gz", gzip.compress(b"first\n") + gzip.compress(b"second\n"))
+        self.assertEqual(["first", "second"], list(read_lines(path)))
+
+    def test_invalid_archive(self):
+        path = self.write_bytes("invalid.gz", b"not a gzip file")
+        with self.assertRaises(GraspLogException):
+            list(read_lines(path))
+        path = self.write_bytes("truncated.gz", gzip.compress(b"first\n" * 1000)[:-20])
+        with self.assertRaises(GraspLogException):
+            list(read_lines(path))
+
+    def test_decode_errors(self):
+        path = self.write_bytes("invalid.log", "ok\nbad \udcff byte\n".encode("utf-8", "surrogateescape"))
+        self.assertEqual(["ok", "bad � byte"], list(read_lines(path)))
+        self.assertEqual(["ok", "bad  byte"], list(read_lines(path, "ignore")))
+        with self.assertRaises(GraspLogIOException):
+            list(read_lines(path, "strict"))
+
+    def test_empty_file(self):
+        path = self.write_bytes("empty.log", b"")
+        self.assertEqual([], list(read_lines(path)))
+        with self.assertRaises(GraspLogException):
+            list(read_events_from_glob(path))
+
+    def test_read_selected_lines(self):
+        content = "".join(f"line {x}\n" for x in range(1, 101)).encode()
+        paths = [self.write_bytes("c.log", content), self.write_bytes("c.log.gz", content, gzip.open)]
+        input_files = []
+        with mock.patch.object(grasplog.file_reader, "CHUNK_SIZE", 64), \
+                mock.patch.object(grasplog.file_reader, "COMPRESSED_CHUNK_SIZE", 64):
+            blocks = list(read_event_blocks_from_glob(os.path.join(self.tmp_dir, "c.*"), input_files))
+            self.assertEqual([0] * 100 + [1] * 100, [file_id for file_id, _, lines in blocks for _ in lines])
+            self.assertEqual(paths, [x.path for x in input_files])
+            self.assertGreater(len(input_files[0].block_offsets), 1)
+            for input_file in input_files:
+                self.assertEqual({3: "line 3", 57: "line 57", 100: "line 100"},
+                                 input_file.read_selected_lines([100, 3, 57]))
+
+    def test_long_lines_and_truncated_file(self):
+        lines = ["short", "x" * 300, "", "y" * 70, "last line without line end"]
+        path = self.write_bytes("d.log", "\n".join(lines).encode())
+        with mock.patch.object(grasplog.file_reader, "CHUNK_SIZE", 64):
+            self.assertEqual(lines, list(read_lines(path)))
+
+            # A file truncated while it is read just ends early
+            path = self.write_bytes("e.log", "".join(f"line {x}\n" for x in range(10000)).encode())
+            line_blocks = read_line_blocks(path)
+            first_lines = next(line_blocks)
+            self.assertEqual("line 0", first_lines[0])
+            os.truncate(path, 0)
+            self.assertLess(len(first_lines) + sum(len(x) for x in line_blocks), 10000)
@@ -1,6 +1,8 @@
+import io
 import unittest
 
-from grasplog.json_output import ClusterInfoJson, ClusteringJson, serialize, LogEventJson, NoisyEventsJson
+from grasplog.json_output import ClusterInfoJson, ClusteringJson, serialize, LogEventJson, NoisyEventsJson, \
+    write_ndjson
 
 
 class TestJsonSerialization(unittest.TestCase):
@@ -64,3 +66,13 @@ class TestJsonSerialization(unittest.TestCase):
     "totalCount": 0
   }
 }""")
+
+    def test_ndjson_output(self):
+        buffer = io.StringIO()
+        write_ndjson(buffer, iter([ClusterInfoJson(1, [LogEventJson(1, "foo", "a.log")], 3)]),
+                     NoisyEventsJson([LogEventJson(4, "abc")], 1))
+        self.assertEqual(
+            '{"id": 1, "samples": [{"lineNumber": 1, "event": "foo", "path": "a.log"}], "totalCount": 3}\n'
+            '{"noisySamples": {"samples": [{"lineNumber": 4, "event": "abc"}], "totalCount": 1}}\n',
+            buffer.getvalue()
+        )
@@ -0,0 +1,59 @@
+import json
+import os
+from unittest import mock
+
+import numpy as np
+
+import grasplog.file_reader
+
+from grasplog.cli import create_app_config, create_analyzer, process
+from grasplog.exception import InvalidCmdLineArgException
+from tests.helpers import TempDirTestCase
+
+
+class LabelsTestCase(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.labels_dir = os.path.join(self.tmp_dir, "labels")
+
+    def test_labels_of_all_events_are_written(self):
+        self.write_lines("a.log", ["Disk is full", "User alice logged in", "Disk is full"])
+        self.write_lines("b.log", ["Unexpected failure", "Disk is full", "User bob logged in", "User carol logged in"])
+        app_config = create_app_config([os.path.join(self.tmp_dir, "*.log"), "--labels-out", self.labels_dir])
+        accumulator = process(app_config, create_analyzer(app_config))
+
+        labels = np.load(os.path.join(self.labels_dir, "labels.npy"), mmap_mode="r")
+        file_ids = np.load(os.path.join(self.labels_dir, "file_ids.npy"), mmap_mode="r")
+        line_nrs = np.load(os.path.join(self.labels_dir, "line_numbers.npy"), mmap_mode="r")
+        with open(os.path.join(self.labels_dir, "files.json"), "rt") as handle:
+            files = json.load(handle)["files"]
+        self.assertEqual((np.int32, np.uint32, np.uint64), (labels.dtype, file_ids.dtype, line_nrs.dtype))
+        self.assertEqual(["a.log", "b.log"], sorted(os.path.basename(x) for x in files))
+        self.assertEqual(7, len(labels))
+
+        disk_cluster = [x for x in accumulator.clusters.values() if x.prototype == ["disk", "is", "full"]][0]
+        user_cluster = [x for x in accumulator.clusters.values() if x.prototype != ["disk", "is", "full"]][0]
+        disk_id, user_id = disk_cluster.cluster_id, user_cluster.cluster_id
+        labeled_lines = {
+            (os.path.basename(files[file_id]), line_nr): label
+            for file_id, line_nr, label in zip(file_ids.tolist(), line_nrs.tolist(), labels.tolist())
+        }
+        self.assertEqual({
+            ("a.log", 1): disk_id, ("a.log", 2): user_id, ("a.log", 3): disk_id,
+            ("b.log", 1): -1, ("b.log", 2): disk_id, ("b.log", 3): user_id, ("b.log", 4): user_id,
+        }, labeled_lines)
+
+    def test_line_numbers_of_time_window_are_absolute(self):
+        self.write_lines("app.log", [f"2022-05-01T12:{x // 60:02d}:{x % 60:02d}Z Disk is full" for x in range(1000)])
+        app_config = create_app_config([
+            os.path.join(self.tmp_dir, "*.log"), "--labels-out", self.labels_dir, "--since", "2022-05-01T12:11:40Z",
+        ])
+        with mock.patch.object(grasplog.file_reader, "CHUNK_SIZE", 1024):
+            process(app_config, create_analyzer(app_config))
+
+        line_nrs = np.load(os.path.join(self.labels_dir, "line_numbers.npy"))
+        self.assertEqual(list(range(701, 1001)), line_nrs.tolist())
+
+    def test_labels_require_dbscan(self):
+        with self.assertRaises(InvalidCmdLineArgException):
+            create_app_config(["*.log", "--engine", "stream", "--labels-out", self.labels_dir])
@@ -0,0 +1,82 @@
+import gzip
+import os
+import unittest
+from typing import List
+
+from grasplog.file_reader import read_event_blocks_from_glob, InputFile, read_new_event_blocks_from_glob, FileState
+from grasplog.line_filter import LineFilter
+from grasplog.ml.parallel import analyze_events_from_glob
+from tests.helpers import TempDirTestCase
+
+
+def _accepted_lines(line_filter: LineFilter, data: bytes) -> List[bytes]:
+    return [x for start, end in line_filter.accepted_runs(data) for x in data[start:end].splitlines()]
+
+
+class LineFilterTestCase(unittest.TestCase):
+    data = b"INFO started\nERROR disk full\nWARN slow health check\nINFO health check\nERROR timeout"
+
+    def test_plain_text_patterns(self):
+        self.assertEqual([b"ERROR disk full", b"WARN slow health check", b"ERROR timeout"],
+                         _accepted_lines(LineFilter(["ERROR|WARN"], []), self.data))
+        self.assertEqual([b"INFO started", b"ERROR disk full", b"ERROR timeout"],
+                         _accepted_lines(LineFilter([], ["health check"]), self.data))
+        self.assertEqual([b"ERROR disk full", b"ERROR timeout"],
+                         _accepted_lines(LineFilter(["ERROR", "WARN"], ["health"]), self.data))
+
+    def test_consecutive_lines_form_a_run(self):
+        runs = list(LineFilter(["ERROR|WARN"], []).accepted_runs(self.data))
+        self.assertEqual([b"ERROR disk full\nWARN slow health check\n", b"ERROR timeout"],
+                         [self.data[start:end] for start, end in runs])
+
+    def test_regular_expressions_match_single_lines(self):
+        self.assertEqual([b"INFO started", b"INFO health check"],
+                         _accepted_lines(LineFilter(["^INFO"], []), self.data))
+        self.assertEqual([b"WARN slow health check", b"INFO health check"],
+                         _accepted_lines(LineFilter(["check$"], []), self.data))
+        # A match across the line ending is not a match of either line
+        self.assertEqual([b"INFO health check"],
+                         _accepted_lines(LineFilter(["health check\\sERROR|INFO h"], []), self.data + b"\n"))
+        self.assertEqual([b"INFO started", b"ERROR timeout"],
+                         _accepted_lines(LineFilter([], ["[A-Z]{4,} [a-z]{4,} "]), self.data))
+
+
+class LineFilterReadingTestCase(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        lines = [f"INFO request {x} served" if x % 10 else f"ERROR request {x} failed" for x in range(1, 101)]
+        # Rejected lines are never decoded, even strict decoding does not fail on invalid characters in them
+        lines[1] = "INFO invalid \udcff character"
+        content = "".join(f"{x}\n" for x in lines).encode("utf-8", "surrogateescape")
+        for name, open_function in [("app.log", open), ("app.log.gz", gzip.open)]:
+            self.write_bytes(name, content, open_function)
+
+    def test_accepted_lines_keep_their_line_numbers(self):
+        line_filter = LineFilter(["ERROR"], [])
+        expected = [(x, f"ERROR request {x} failed") for x in range(10, 101, 10)]
+        for name in ["app.log", "app.log.gz"]:
+            input_files: List[InputFile] = []
+            blocks = read_event_blocks_from_glob(os.path.join(self.tmp_dir, name), input_files, "strict",
+                                                 line_filter=line_filter)
+            events = [(line_nr, line) for _, first_line_nr, lines in blocks
+                      for line_nr, line in enumerate(lines, first_line_nr)]
+            self.assertEqual(expected, events)
+            self.assertEqual(90, input_files[0].skipped_line_count)
+            self.assertEqual(dict(expected[3:5]), input_files[0].read_selected_lines([40, 50]))
+
+    def test_analyzed_events_keep_their_line_numbers(self):
+        input_files: List[InputFile] = []
+        analyzed_events = list(analyze_events_from_glob(os.path.join(self.tmp_dir, "app.log"), 1, input_files,
+                                                        decode_errors="strict", line_filter=LineFilter([], ["INFO"])))
+        self.assertEqual(list(range(10, 101, 10)), [x[1] for x in analyzed_events])
+        self.assertEqual(90, input_files[0].skipped_line_count)
+
+    def test_incremental_reading_counts_all_lines(self):
+        path = os.path.join(self.tmp_dir, "app.log")
+        current_files: List[FileState] = []
+        input_files: List[InputFile] = []
+        blocks = list(read_new_event_blocks_from_glob(path, [], current_files, input_files, "strict",
+                                                      LineFilter(["ERROR"], [])))
+        self.assertEqual(10, sum(len(x[2]) for x in blocks))
+        self.assertEqual(100, current_files[0].line_count)
+        self.assertEqual(os.path.getsize(path), current_files[0].offset)
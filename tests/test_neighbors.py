@@ -0,0 +1,37 @@
+import random
+import unittest
+
+import numpy as np
+from sklearn.cluster import DBSCAN  # type:ignore
+from sklearn.metrics import pairwise_distances  # type:ignore
+
+from grasplog.ml.neighbors import radius_neighbors_graph, fit_dbscan
+from grasplog.ml.vectorizer import TokenVectorizer
+
+
+class NeighborsTestCase(unittest.TestCase):
+    def setUp(self):
+        random_generator = random.Random(42)
+        self.vectorizer = TokenVectorizer()
+        # Short rows, empty rows and rows with the same tokens in a different order included
+        for _ in range(300):
+            tokens = [random_generator.choice("abcdefghijkl") for _ in range(random_generator.randint(0, 7))]
+            self.vectorizer.append(self.vectorizer.token_ids(tokens))
+        self.counts = [random_generator.randint(1, 4) for _ in range(len(self.vectorizer))]
+
+    def test_graph_contains_exactly_pairs_within_distance(self):
+        features = self.vectorizer.to_csr()
+        distances = pairwise_distances(features, metric="manhattan")
+        np.fill_diagonal(distances, np.inf)
+        for max_distance in [0.5, 1, 2.1, 4.5]:
+            graph = radius_neighbors_graph(features, max_distance).tocoo()
+            expected = {(x, y): distances[x, y] for x, y in zip(*np.nonzero(distances <= max_distance))}
+            self.assertEqual(expected, dict(zip(zip(graph.row.tolist(), graph.col.tolist()), graph.data.tolist())))
+
+    def test_labels_match_l1_dbscan(self):
+        features = self.vectorizer.to_csr()
+        for max_distance in [1, 2.1, 3]:
+            expected = DBSCAN(min_samples=3, eps=max_distance, metric="l1").fit(features, sample_weight=self.counts)
+            self.assertEqual(
+                expected.labels_.tolist(), fit_dbscan(features, self.counts, max_distance, 3).labels_.tolist()
+            )
@@ -0,0 +1,38 @@
+import subprocess
+import sys
+import unittest
+from typing import List
+
+from grasplog.file_reader import read_event_blocks_from_glob, InputFile
+from grasplog.ml.parallel import analyze_events_from_glob, analyze_file
+from grasplog.ml.text_processing import analyze_event_blocks
+
+
+def _without_events(analyzed_events):
+    return [(file_id, line_nr, None, tokens) for file_id, line_nr, _, tokens in analyzed_events]
+
+
+class ParallelAnalysisTestCase(unittest.TestCase):
+    def test_analyze_file(self):
+        analyzed_file = analyze_file("test_data/simple1.log")
+        self.assertIsNone(analyzed_file.events)
+        self.assertEqual(8, len(analyzed_file.rows))
+        self.assertEqual(5, len(analyzed_file.unique_tokens))
+        expected = analyze_event_blocks(read_event_blocks_from_glob("test_data/simple1.log", []))
+        self.assertEqual(_without_events(expected), list(analyzed_file.iter_analyzed_events(0)))
+
+    def test_parallel_analysis_keeps_file_order(self):
+        expected_input_files: List[InputFile] = []
+        expected = analyze_event_blocks(read_event_blocks_from_glob("test_data/*", expected_input_files))
+        input_files: List[InputFile] = []
+        self.assertEqual(_without_events(expected), list(analyze_events_from_glob("test_data/*", 2, input_files)))
+        self.assertEqual(expected_input_files, input_files)
+
+    def test_standard_input_with_jobs(self):
+        with open("test_data/simple1.log", "rb") as handle:
+            content = handle.read()
+        command = [sys.executable, "-c", "from grasplog.cli import main; main()", "--output-format", "json", "-"]
+        expected = subprocess.run(command, input=content, capture_output=True, check=True).stdout
+        result = subprocess.run(command + ["--jobs", "2"], input=content, capture_output=True)
+        self.assertEqual(0, result.returncode, result.stderr)
+        self.assertEqual(expected, result.stdout)
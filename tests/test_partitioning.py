@@ -0,0 +1,30 @@
+import unittest
+
+from grasplog.datamodel import Partitioning
+from grasplog.ml.clustering import process_analyzed, UniqueRows
+from grasplog.ml.partitioning import partition_keys
+from grasplog.ml.text_processing import analyze_events
+
+
+class PartitioningTestCase(unittest.TestCase):
+    LINES = (
+        [f"User {name} logged in" for name in ["alice", "bob", "carol"]] * 3
+        + [f"Connection to host {host} closed by remote peer" for host in ["a1", "b2", "c3"]] * 2
+        + ["Disk is full", "Disk is nearly full", "Disk is full", "Disk is full", "Unexpected"]
+    )
+
+    def test_partition_keys(self):
+        rows = UniqueRows()
+        for tokens in [["a", "b"], ["a", "b", "c"], ["b", "c", "d", "e", "f", "g"], ["c"]]:
+            rows.add(tokens)
+        self.assertEqual([1, 1, 2, 1], partition_keys(rows.vectorizer, None, Partitioning.exact, 2.1))
+        self.assertEqual([0, 0, 1, 0], partition_keys(rows.vectorizer, None, Partitioning.token_count, 2.1))
+        self.assertEqual([(2, 1)], partition_keys(rows.vectorizer, [2], Partitioning.leading_token, 2.1, 3))
+
+    def test_exact_partitioning_gives_same_clusters(self):
+        expected = process_analyzed(analyze_events(self.LINES), 100, 100, 2.1)
+        for jobs in [1, 2]:
+            actual = process_analyzed(analyze_events(self.LINES), 100, 100, 2.1,
+                                      partitioning=Partitioning.exact, jobs=jobs)
+            self.assertEqual(expected.clusters, actual.clusters)
+            self.assertEqual(expected.noisy_events, actual.noisy_events)
@@ -0,0 +1,39 @@
+import json
+import os
+
+from grasplog import profiling
+from grasplog.file_reader import read_event_blocks_from_glob
+from grasplog.ml.clustering import process_analyzed
+from grasplog.ml.text_processing import analyze_event_blocks
+from tests.helpers import TempDirTestCase
+
+
+class ProfilingTestCase(TempDirTestCase):
+    def tearDown(self):
+        profiling._active_profile = None
+        super().tearDown()
+
+    def test_profile_report(self):
+        profiling.start("clustering")
+        input_files = []
+        event_blocks = profiling.timed_iterator("read", read_event_blocks_from_glob("test_data/*", input_files))
+        analyzed_events = profiling.timed_files(analyze_event_blocks(event_blocks), input_files)
+        process_analyzed(analyzed_events, 5, 5, 2.1, input_files=input_files)
+        path = os.path.join(self.tmp_dir, "profile.json")
+        profiling.write(path)
+
+        with open(path) as handle:
+            report = json.load(handle)
+        self.assertEqual(["read", "analysis", "vectorization", "clustering", "accumulation", "sampleReading"],
+                         list(report["stagesMs"]))
+        self.assertEqual([("test_data/simple1.log", 8), ("test_data/simple2.log.gz", 8)],
+                         [(x["path"], x["lines"]) for x in report["files"]])
+        self.assertEqual(5, report["uniqueRows"])
+        self.assertEqual([5, report["uniqueTokens"]], report["matrixShape"])
+        self.assertTrue(os.path.exists(f"{path}.pstats"))
+
+    def test_disabled_profile(self):
+        with profiling.stage("analysis"):
+            profiling.record("events", 1)
+        self.assertEqual([1, 2], list(profiling.timed_iterator("read", [1, 2])))
+        self.assertIsNone(profiling._active_profile)
@@ -0,0 +1,67 @@
+import io
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from grasplog.cli import create_app_config, create_analyzer, process
+from grasplog.datamodel import OutputFormat
+
+SERVER_START_TIMEOUT_S = 30
+
+
+class ServerTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.socket_path = os.path.join(cls.tmp_dir, "grasplog.sock")
+        cls.server = subprocess.Popen(
+            [sys.executable, "-c", "from grasplog.cli import main; main()", "serve", "--socket", cls.socket_path,
+             "--jobs", "2"],
+            stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + SERVER_START_TIMEOUT_S
+        while not os.path.exists(cls.socket_path) and time.monotonic() < deadline:
+            time.sleep(0.1)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.send_signal(signal.SIGTERM)
+        cls.server.wait(SERVER_START_TIMEOUT_S)
+        shutil.rmtree(cls.tmp_dir)
+
+    def __send(self, *args: str, batch: bytes = b"") -> subprocess.CompletedProcess:
+        return subprocess.run([sys.executable, "-m", "grasplog.client", "--socket", self.socket_path, *args],
+                              input=batch, capture_output=True)
+
+    def test_output_is_the_same_as_of_a_run(self):
+        path = os.path.abspath("test_data/simple1.log")
+        app_config = create_app_config(["--output-format", "json", path])
+        expected = io.StringIO()
+        process(app_config, create_analyzer(app_config)).output(OutputFormat.json_format, expected)
+
+        result = self.__send(path)
+        self.assertEqual(0, result.returncode)
+        self.assertEqual(expected.getvalue(), result.stdout.decode())
+        # Lines of a batch are numbered the same way as lines of the standard input
+        with open(path, "rb") as handle:
+            result = self.__send(batch=handle.read())
+        self.assertEqual(expected.getvalue().replace(path, "-"), result.stdout.decode())
+
+    def test_concurrent_batches(self):
+        batches = [f"Disk {x} is full\nDisk {x} is full\nUser {x} logged in\n".encode() for x in range(4)]
+        clients = [subprocess.Popen([sys.executable, "-m", "grasplog.client", "--socket", self.socket_path],
+                                    stdin=subprocess.PIPE, stdout=subprocess.PIPE) for _ in batches]
+        outputs = [client.communicate(batch)[0].decode() for client, batch in zip(clients, batches)]
+        for i, output in enumerate(outputs):
+            self.assertIn(f"User {i} logged in", output)
+            self.assertNotIn(f"User {(i + 1) % 4} logged in", output)
+
+    def test_errors_are_reported_by_the_client(self):
+        result = self.__send(os.path.join(self.tmp_dir, "missing*.log"))
+        self.assertEqual(1, result.returncode)
+        self.assertTrue(result.stderr.decode().startswith("Error: No readable files detected"))
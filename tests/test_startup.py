@@ -0,0 +1,23 @@
+import subprocess
+import sys
+import unittest
+
+
+class StartupTestCase(unittest.TestCase):
+    def test_cli_does_not_import_heavy_modules(self):
+        # The data model and file reading modules are only needed once the arguments are parsed
+        heavy_modules = ["sklearn", "scipy", "numpy", "nltk", "grasplog.datamodel", "grasplog.file_reader"]
+        probe = f"import sys, grasplog.cli; print(*[x for x in {heavy_modules} if x in sys.modules])"
+        output = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True).stdout
+        self.assertEqual("", output.strip())
+
+    def test_engines_are_loaded_on_selection(self):
+        from grasplog.datamodel import Engine
+        from grasplog.engines import load_engine
+        for engine in Engine:
+            self.assertTrue(callable(load_engine(engine).process_analyzed))
+
+    def test_version_matches_package_metadata(self):
+        import grasplog
+        from importlib.metadata import version
+        self.assertEqual(version("grasplog"), grasplog.__version__)
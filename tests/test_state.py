@@ -0,0 +1,88 @@
+import os
+from unittest import mock
+
+import grasplog.state
+from grasplog.cli import create_app_config, create_analyzer
+from grasplog.state import process_incrementally, load_state, save_state
+from tests.helpers import TempDirTestCase
+
+
+class IncrementalProcessingTestCase(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.log_path = os.path.join(self.tmp_dir, "app.log")
+        self.state_path = os.path.join(self.tmp_dir, "state.json")
+
+    def __run(self, save: bool = True):
+        app_config = create_app_config([f"{self.log_path}*", "--state-file", self.state_path])
+        accumulator, state = process_incrementally(app_config, create_analyzer(app_config))
+        if save:
+            save_state(self.state_path, state)
+        return accumulator
+
+    def test_only_appended_events_are_read(self):
+        self.write_lines("app.log", ["Disk is full", "Disk is full", "User alice logged in"], mode="at")
+        accumulator = self.__run()
+        self.assertEqual(0, len(accumulator.clusters))
+        self.assertEqual(3, accumulator.noisy_events.total_event_count)
+
+        # Previously noisy events form a cluster together with the new ones
+        self.write_lines("app.log", ["Disk is full", "User bob logged in", "User carol logged in"], mode="at")
+        with open(self.log_path, "at") as handle:
+            handle.write("Incomplete line")
+        accumulator = self.__run()
+        self.assertEqual(2, len(accumulator.clusters))
+        self.assertEqual(0, accumulator.noisy_events.total_event_count)
+        self.assertEqual([3, 3], sorted(x.total_event_count for x in accumulator.clusters.values()))
+        disk_cluster = [x for x in accumulator.clusters.values() if x.prototype == ["disk", "is", "full"]][0]
+        # Samples of noisy events are not kept in the state
+        self.assertEqual([4], [x.line_nr for x in disk_cluster.samples])
+
+        state = load_state(self.state_path)
+        self.assertEqual(6, state.event_count)
+        self.assertEqual(os.path.getsize(self.log_path) - len("Incomplete line"), state.files[0].offset)
+
+    def test_rotated_and_truncated_files(self):
+        self.write_lines("app.log", ["Disk is full"] * 3, mode="at")
+        self.__run()
+
+        # The rotated file continues from the recorded position, the new file is read from the beginning
+        self.write_lines("app.log", ["Disk is full"], mode="at")
+        os.rename(self.log_path, f"{self.log_path}.1")
+        self.write_lines("app.log", ["User alice logged in"], mode="at")
+        accumulator = self.__run()
+        self.assertEqual(4, accumulator.clusters[0].total_event_count)
+        self.assertEqual(1, accumulator.noisy_events.total_event_count)
+
+        os.remove(f"{self.log_path}.1")
+        with open(self.log_path, "wt") as handle:
+            handle.write("User alice\n")
+        accumulator = self.__run()
+        self.assertEqual(6, accumulator.total_event_count())
+
+    def test_state_is_saved_by_the_caller(self):
+        self.write_lines("app.log", ["Disk is full"] * 3, mode="at")
+        self.__run(save=False)
+        self.assertIsNone(load_state(self.state_path))
+
+        # Events of a run whose state was not saved are read again
+        accumulator = self.__run()
+        self.assertEqual(3, accumulator.total_event_count())
+        accumulator = self.__run()
+        self.assertEqual(3, accumulator.total_event_count())
+
+    def test_noisy_rows_are_limited(self):
+        self.write_lines("app.log", ["Disk is full", "Disk is full", "User alice logged in", "Cache miss"], mode="at")
+        with mock.patch.object(grasplog.state, "MAX_STATE_NOISY_ROWS", 1):
+            self.__run()
+        state = load_state(self.state_path)
+        self.assertEqual([["disk", "is", "full"]], [x.prototype for x in state.noisy_rows])
+        self.assertEqual([], state.noisy_rows[0].samples)
+        self.assertEqual(2, state.dropped_noisy_count)
+
+        # Dropped events are still counted as noise
+        self.write_lines("app.log", ["Disk is full"], mode="at")
+        accumulator = self.__run()
+        self.assertEqual(3, accumulator.clusters[0].total_event_count)
+        self.assertEqual(2, accumulator.noisy_events.total_event_count)
+        self.assertEqual(5, load_state(self.state_path).event_count)
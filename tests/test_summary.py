@@ -0,0 +1,57 @@
+import os
+from unittest import mock
+
+import grasplog.summary
+from grasplog.cli import create_merge_config
+from grasplog.ml.clustering import process
+from grasplog.summary import summarize, save_summary, load_summary, merge_summaries
+from tests.helpers import TempDirTestCase
+
+
+class SummaryTestCase(TempDirTestCase):
+    def test_merged_summaries_match_single_run(self):
+        host1 = ["Disk is full"] * 4 + ["User alice logged in", "Cache cleared"]
+        host2 = ["User bob logged in", "User carol logged in", "Cache cleared", "Unexpected failure"]
+        summaries = []
+        for i, events in enumerate([host1, host2]):
+            path = os.path.join(self.tmp_dir, f"summary{i}.json" + (".gz" if i else ""))
+            save_summary(path, summarize(process(events, 5, 5, 2.1), 2.1))
+            summaries.append(load_summary(path))
+        self.assertEqual([6, 4], [x.event_count for x in summaries])
+
+        merged = merge_summaries(summaries, 5, 5, 2.1)
+        single_run = process(host1 + host2, 5, 5, 2.1)
+        self.assertEqual(
+            sorted(x.total_event_count for x in single_run.clusters.values()),
+            sorted(x.total_event_count for x in merged.clusters.values()),
+        )
+        self.assertEqual(single_run.noisy_events.total_event_count, merged.noisy_events.total_event_count)
+        user_cluster = [x for x in merged.clusters.values() if x.total_event_count == 3][0]
+        self.assertEqual(
+            ["User alice logged in", "User bob logged in", "User carol logged in"],
+            [x.message for x in user_cluster.samples],
+        )
+
+        # Merged summaries can be merged again
+        merged_path = os.path.join(self.tmp_dir, "merged.json")
+        save_summary(merged_path, summarize(merged, 2.1))
+        self.assertEqual(10, load_summary(merged_path).event_count)
+
+    def test_noisy_rows_are_limited(self):
+        events = ["Disk is full", "Disk is full", "User alice logged in", "Cache cleared"]
+        with mock.patch.object(grasplog.summary, "MAX_SUMMARY_NOISY_ROWS", 1):
+            summary = summarize(process(events, 5, 5, 2.1), 2.1)
+        self.assertEqual([["disk", "is", "full"]], [x.prototype for x in summary.noisy_rows])
+        self.assertEqual(2, summary.dropped_noisy_count)
+
+        path = os.path.join(self.tmp_dir, "summary.json")
+        save_summary(path, summary)
+        merged = merge_summaries([load_summary(path), summarize(process(["Disk is full"], 5, 5, 2.1), 2.1)], 5, 5, 2.1)
+        self.assertEqual([3], [x.total_event_count for x in merged.clusters.values()])
+        self.assertEqual(2, merged.noisy_events.total_event_count)
+
+    def test_merge_config(self):
+        merge_config = create_merge_config(["a.json", "b.json.gz", "--max-distance", "3", "--emit-summary", "c.json"])
+        self.assertEqual(["a.json", "b.json.gz"], merge_config.summary_paths)
+        self.assertEqual(3, merge_config.max_distance)
+        self.assertEqual("c.json", merge_config.summary_file)
@@ -0,0 +1,64 @@
+import unittest
+
+from grasplog.ml.template_mining import TemplateMiner, WILDCARD, process
+
+
+class TemplateMiningTestCase(unittest.TestCase):
+    def test_variable_tokens_replaced_by_wildcard(self):
+        miner = TemplateMiner(max_distance=2.1)
+        first = miner.add(["user", "alice", "logged", "in"])
+        second = miner.add(["user", "bob", "logged", "in"])
+        self.assertEqual(first.template_id, second.template_id)
+        self.assertEqual(["user", WILDCARD, "logged", "in"], second.tokens)
+        self.assertEqual(first.template_id, miner.add(["user", "carol", "logged", "in"]).template_id)
+        self.assertNotEqual(first.template_id, miner.add(["user", "dave", "logged", "out", "now"]).template_id)
+        self.assertEqual(2, len(miner.templates))
+
+    def test_too_many_mismatches_create_new_template(self):
+        miner = TemplateMiner(max_distance=2.1)
+        first = miner.add(["disk", "is", "full", "on", "sda"])
+        second = miner.add(["disk", "is", "empty", "at", "sdb"])
+        self.assertNotEqual(first.template_id, second.template_id)
+
+    def test_leading_token_mismatch_is_within_budget(self):
+        miner = TemplateMiner(max_distance=2.1)
+        first = miner.add(["info", "disk", "is", "full"])
+        self.assertEqual(first.template_id, miner.add(["warn", "disk", "is", "full"]).template_id)
+        self.assertEqual([WILDCARD, "disk", "is", "full"], first.tokens)
+        self.assertNotEqual(first.template_id, miner.add(["warn", "disk", "was", "empty"]).template_id)
+
+    def test_converged_templates_are_merged(self):
+        miner = TemplateMiner(max_distance=2.1)
+        first = miner.add(["user", "alice", "from", "paris", "ok"])
+        second = miner.add(["user", "bob", "from", "rome", "ok"])
+        self.assertNotEqual(first.template_id, second.template_id)
+        # Generalizing the first template makes it match the second one
+        self.assertEqual(first.template_id, miner.add(["user", "carol", "from", "paris", "ok"]).template_id)
+        self.assertEqual(first.template_id, miner.cluster_id(second.template_id))
+        self.assertEqual(["user", WILDCARD, "from", WILDCARD, "ok"], first.tokens)
+        self.assertEqual(first.template_id, miner.add(["user", "dave", "from", "rome", "ok"]).template_id)
+
+        accumulator = process(["user alice from paris", "user bob from rome", "user carol from paris"], 3, 3, 2.1)
+        self.assertEqual(1, len(accumulator.clusters))
+        self.assertEqual(3, accumulator.clusters[0].total_event_count)
+
+    def test_stream_processing(self):
+        lines = [
+            "Error foo bar",
+            "INFO all good",
+            "Error foo bar",
+            "Error foo baz",
+            "INFO all good",
+            "INFO all good",
+            "DEBUG something else",
+            "Error foo bar",
+        ]
+
+        accumulator = process(lines, 3, 3, 2.1)
+        self.assertEqual(2, len(accumulator.clusters))
+        self.assertEqual([1, 3, 4], [x.line_nr for x in accumulator.clusters[0].samples])
+        self.assertEqual(4, accumulator.clusters[0].total_event_count)
+        self.assertEqual([2, 5, 6], [x.line_nr for x in accumulator.clusters[1].samples])
+        self.assertEqual(3, accumulator.clusters[1].total_event_count)
+        self.assertEqual(["DEBUG something else"], [x.message for x in accumulator.noisy_events.samples])
+        self.assertEqual(1, accumulator.noisy_events.total_event_count)
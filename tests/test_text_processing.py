@@ -1,3 +1,4 @@
+import random
 import unittest
 
 from grasplog.ml import text_processing
@@ -35,3 +36,90 @@ class TextAnalyzersTestCase(unittest.TestCase):
             ],
             text_processing.NgramTokenStreamEnricher([2, 3]).filter(base_tokens),
         )
+
+    def test_compiled_analyzer_matches_declared_chain(self):
+        events = [
+            "User 'alice' successfully logged in",
+            "Error received while calling the external system 'foo' - 500 Internal Server Error",
+            "a.b-c_1 __ 12:30:01 /var/log/syslog.4.gz x=1,y=2 -> [OK] ... ŘEŽ ² ½ ٣٤ İstanbul",
+            "",
+            "   ",
+            "č / * */ a1 1a 011",
+        ]
+        random_generator = random.Random(42)
+        alphabet = "aZ09_ -./:*'\t\"[]()=čŘ²½٣İ̇"
+        events += ["".join(random_generator.choice(alphabet) for _ in range(30)) for _ in range(500)]
+
+        analyzers = [
+            text_processing.DEFAULT_ANALYZER,
+            text_processing.Analyzer([], text_processing.SimpleTokenizer(), []),
+            text_processing.Analyzer([], text_processing.SimpleTokenizer(), [text_processing.NumericTokenFilter()]),
+            text_processing.Analyzer(
+                [text_processing.LowerCasingFilter()],
+                text_processing.SimpleTokenizer(),
+                [text_processing.SingleCharTokenFilter()],
+            ),
+        ]
+        for analyzer in analyzers:
+            compiled_analyzer = analyzer.compile()
+            self.assertIsInstance(compiled_analyzer, text_processing.CompiledAnalyzer)
+            for event in events:
+                self.assertEqual(analyzer.analyze(event), compiled_analyzer.analyze(event))
+
+    def test_masking_char_filter(self):
+        f = text_processing.MaskingCharFilter()
+        self.assertEqual(
+            "at _timestamp_ request _uuid_ from _ip_ and _ip_ read _path_ at _hex_ (abcdefgh, 2022)",
+            f.filter("at 2022-05-01T12:30:01.123Z request 123e4567-e89b-12d3-a456-426614174000 from 10.0.0.1 "
+                     "and ::1 read /var/log/syslog at 0x7f3a (abcdefgh, 2022)"),
+        )
+        self.assertEqual("host _ip_ and foo.10.0.0.1", text_processing.MaskingCharFilter(["ip"]).filter(
+            "host 10.0.0.1 and foo.10.0.0.1"))
+        with self.assertRaises(ValueError):
+            text_processing.MaskingCharFilter(["ip", "foo"])
+
+    def test_masking_analyzer(self):
+        analyzer = text_processing.create_default_analyzer(text_processing.MASKED_FIELD_PATTERNS)
+        compiled_analyzer = text_processing.CachingAnalyzer(analyzer.compile(), max_entries=10)
+        events = [
+            "Connection from 10.0.0.1 to /srv/data/a.bin failed",
+            "Connection from fe80::1ff:fe23:4567:890a to /srv/data/b.bin failed",
+        ]
+        for event in events:
+            self.assertEqual(["connection", "from", "_ip_", "to", "_path_", "failed"], analyzer.analyze(event))
+            self.assertEqual(analyzer.analyze(event), compiled_analyzer.analyze(event))
+        self.assertEqual(1, compiled_analyzer.hits)
+
+    def test_analyzer_with_custom_filter_not_compiled(self):
+        analyzer = text_processing.Analyzer(
+            [text_processing.LowerCasingFilter()],
+            text_processing.SimpleTokenizer(),
+            [text_processing.NgramTokenStreamEnricher([2])],
+        )
+        self.assertIs(analyzer, analyzer.compile())
+
+    def test_caching_analyzer(self):
+        compiled_analyzer = text_processing.DEFAULT_ANALYZER.compile()
+        analyzer = text_processing.CachingAnalyzer(compiled_analyzer, max_entries=2)
+        events = [
+            "Request 1234 took 15 ms",
+            "Request 77 took 3 ms",
+            "Request a11 took 3 ms",
+            "Request a12 took 3 ms",
+            "request_12 took 3ms",
+            "Request 5 took 1 ms",
+        ]
+        for event in events:
+            self.assertEqual(compiled_analyzer.analyze(event), analyzer.analyze(event))
+        self.assertEqual(1, analyzer.hits)
+        self.assertEqual(5, analyzer.misses)
+
+        # Only the two most recently used shapes are kept
+        analyzer.analyze(events[4])
+        self.assertEqual(2, analyzer.hits)
+        analyzer.analyze(events[2])
+        self.assertEqual(6, analyzer.misses)
+
+        # Changing returned tokens doesn't change later hits
+        analyzer.analyze(events[2]).append("changed")
+        self.assertEqual(compiled_analyzer.analyze(events[2]), analyzer.analyze(events[2]))
@@ -0,0 +1,110 @@
+import gzip
+import os
+import time
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+
+import grasplog.file_reader
+from grasplog.datamodel import LogEvent
+from grasplog.event_store import load_missing_messages
+from grasplog.exception import GraspLogException
+from grasplog.file_reader import read_event_blocks_from_glob, DEFAULT_DECODE_ERRORS
+from grasplog.timestamps import parse_iso8601, parse_syslog, parse_epoch, TimeWindow, parse_time_argument
+from tests.helpers import TempDirTestCase
+
+START = datetime(2022, 5, 1, 12, 0, tzinfo=timezone.utc).timestamp()
+
+
+def _iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class TimestampParserTestCase(unittest.TestCase):
+    def test_iso8601(self):
+        self.assertEqual(START, parse_iso8601("2022-05-01T12:00:00Z INFO Started"))
+        self.assertEqual(START + 0.25, parse_iso8601("[2022-05-01 14:00:00,250+02:00] INFO Started"))
+        local_time = time.mktime((2022, 5, 1, 12, 0, 0, 0, 0, -1))
+        self.assertEqual(local_time, parse_iso8601("2022-05-01 12:00:00 INFO Started"))
+        self.assertIsNone(parse_iso8601("INFO 2022-05-01 12:00:00"))
+
+    def test_syslog(self):
+        timestamp = parse_syslog("Jan  2 03:04:05 host sshd[42]: Accepted")
+        self.assertIsNotNone(timestamp)
+        self.assertLessEqual(timestamp, time.time() + 86400)
+        self.assertEqual((1, 2, 3, 4, 5), time.localtime(timestamp)[1:6])
+        self.assertIsNone(parse_syslog("Foo  2 03:04:05 host"))
+
+    def test_epoch(self):
+        self.assertEqual(START, parse_epoch(f"{START:.0f} INFO Started"))
+        self.assertEqual(START + 0.5, parse_epoch(f"{START * 1000 + 500:.0f} INFO Started"))
+        self.assertEqual(START + 0.5, parse_epoch(f"[{START:.0f}.5] INFO Started"))
+        self.assertIsNone(parse_epoch("12345 INFO Started"))
+
+    def test_time_argument(self):
+        self.assertEqual(START, parse_time_argument("2022-05-01T12:00:00+00:00"))
+        self.assertEqual(START, parse_time_argument(f"{START:.0f}"))
+        self.assertIsNone(parse_time_argument("yesterday"))
+
+    def test_lines_without_timestamp_belong_to_previous_line(self):
+        lines = [f"{_iso(START + x * 60)} event {x}" for x in range(10)]
+        lines.insert(6, "  at Stacktrace.line")
+        blocks = [(1, lines[:4]), (5, lines[4:8]), (9, lines[8:])]
+        window = TimeWindow(START + 4 * 60, START + 6 * 60)
+        self.assertEqual(
+            [(5, lines[4:8])],
+            list(window.filter_blocks(iter(blocks), parse_iso8601)),
+        )
+
+
+class TimeWindowReadingTestCase(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.lines = [f"{_iso(START + x)} event {x}" for x in range(1000)]
+        content = "".join(f"{x}\n" for x in self.lines).encode()
+        for name, open_function in [("app.log", open), ("app.log.gz", gzip.open)]:
+            self.write_bytes(name, content, open_function)
+
+    def __read(self, name: str, window: TimeWindow):
+        input_files = []
+        with mock.patch.object(grasplog.file_reader, "CHUNK_SIZE", 1024), \
+                mock.patch.object(grasplog.file_reader, "PROBE_SIZE", 256):
+            path_glob = os.path.join(self.tmp_dir, name)
+            blocks = list(read_event_blocks_from_glob(path_glob, input_files, DEFAULT_DECODE_ERRORS, window))
+        return [(line_nr, line) for _, first_line_nr, lines in blocks for line_nr, line in
+                enumerate(lines, first_line_nr)], input_files
+
+    def test_window_is_read_with_exact_line_numbers(self):
+        expected = [(x + 1, self.lines[x]) for x in range(700, 751)]
+        for name in ["app.log", "app.log.gz"]:
+            events, input_files = self.__read(name, TimeWindow(START + 700, START + 750))
+            input_file = input_files[0]
+            self.assertEqual(expected, [(input_file.absolute_line_nr(x), line) for x, line in events])
+            first_line_nr, last_line_nr = events[0][0], events[-1][0]
+            self.assertEqual({first_line_nr: self.lines[700], last_line_nr: self.lines[750]},
+                             input_file.read_selected_lines([first_line_nr, last_line_nr]))
+            if name == "app.log":
+                # The plain file is read from close to the start of the window, not from its beginning, and its
+                # lines are numbered from there
+                self.assertGreater(input_file.block_offsets[0], 20 * 1024)
+                self.assertLess(first_line_nr, 701)
+
+    def test_samples_get_absolute_line_numbers(self):
+        events, input_files = self.__read("app.log", TimeWindow(START + 700, START + 750))
+        samples = [LogEvent(events[0][0], None, input_files[0].path), LogEvent(events[-1][0], "kept", None)]
+        self.assertIsNone(input_files[0].window_line_count)
+        load_missing_messages(samples, input_files)
+        self.assertEqual([(701, self.lines[700]), (events[-1][0], "kept")], [(x.line_nr, x.message) for x in samples])
+
+    def test_files_outside_of_window_are_skipped(self):
+        with self.assertRaises(GraspLogException):
+            self.__read("app.log", TimeWindow(START + 2000, None))
+        with self.assertRaises(GraspLogException):
+            self.__read("app.log.gz", TimeWindow(None, START - 1))
+        # Archives last modified long before the window are not even decompressed
+        path = os.path.join(self.tmp_dir, "app.log.gz")
+        os.utime(path, (START + 1000, START + 1000))
+        with mock.patch.object(grasplog.file_reader, "_read_indexed_blocks_from") as read_blocks:
+            with self.assertRaises(GraspLogException):
+                self.__read("app.log.gz", TimeWindow(START + 1000 + 2 * 86400, None))
+            read_blocks.assert_not_called()
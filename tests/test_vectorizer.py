@@ -0,0 +1,26 @@
+import unittest
+
+from grasplog.ml.vectorizer import TokenVectorizer
+
+
+class TokenVectorizerTestCase(unittest.TestCase):
+    def test_binary_matrix_with_exact_vocabulary(self):
+        vectorizer = TokenVectorizer()
+        for tokens in [["error", "foo", "error"], ["info"], ["foo", "info", "bar"]]:
+            vectorizer.append(vectorizer.token_ids(tokens))
+        self.assertEqual({"error": 0, "foo": 1, "info": 2, "bar": 3}, vectorizer.vocabulary)
+        self.assertEqual(["foo", "info", "bar"], vectorizer.tokens(2))
+        self.assertEqual([[1, 1, 0, 0], [0, 0, 1, 0], [0, 1, 1, 1]], vectorizer.to_csr().toarray().tolist())
+        self.assertEqual([[0, 1, 1, 1], [1, 1, 0, 0]], vectorizer.to_csr([2, 0]).toarray().tolist())
+
+    def test_ngram_columns(self):
+        vectorizer = TokenVectorizer(ngram_sizes=[2, 3])
+        for tokens in [["disk", "is", "full"], ["is", "disk", "full"], ["disk", "is", "full", "disk", "is"]]:
+            vectorizer.append(vectorizer.token_ids(tokens))
+        self.assertEqual({"disk": 0, "is": 1, "full": 2}, vectorizer.vocabulary)
+        # Columns 3, 4: bigrams of the first row, 5: its trigram, 6, 7: bigrams of the second row, 8: its trigram
+        self.assertEqual([[1, 1, 1, 1, 1, 1, 0, 0, 0], [1, 1, 1, 0, 0, 0, 1, 1, 1]],
+                         vectorizer.to_csr([0, 1]).toarray()[:, :9].tolist())
+        # Repeated n-grams share their column
+        self.assertEqual([0, 1, 2, 3, 4, 5, 9, 10, 11], vectorizer.to_csr([2]).indices.tolist())
+        self.assertEqual(["disk", "is", "full"], vectorizer.tokens(2))